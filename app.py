@@ -6,8 +6,6 @@ from routes import *
 # from services.customer_journey_processor_old import process_journey_metrics
 from services.process_journeys import process_journey_metrics
 
-from utils.classify_click_events import classify_button
-
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
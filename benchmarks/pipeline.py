@@ -0,0 +1,209 @@
+# benchmarks/pipeline.py
+# End-to-end benchmark of the processing pipeline on a synthetic workload
+# (benchmarks/synthetic_events.py). Each day of events is ingested as one batch, then every
+# run_jobs stage runs on it; per stage we report wall time, throughput (events of the batch per
+# second), peak Python memory (tracemalloc) and the number of SQL statements and their time.
+#
+#   python -m benchmarks.pipeline --persons 5000 --days 3 --seed 1
+#   python -m benchmarks.pipeline --database postgresql://localhost/suggesty_bench --persons 50000
+#
+# Runs against a throwaway database: the schema is created if missing and a new account is made
+# for each run. SQLite in memory is the default.
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from flask import Flask
+from sqlalchemy import event
+from config import Config
+from db import db
+from models import Account
+from services.event_processor import process_raw_events
+from services.event_processor_failed import evaluate_journey_failures
+from services.page_usage import process_page_usage
+from services.event_usage import process_event_usage
+from services.form_usage import detect_and_save_form_usage
+from services.process_friction import process_friction
+from services.process_journeys import process_journey_metrics
+from services.summary_cache import invalidate_account_summary, refresh_account_summary
+from services.raw_event_archive import archive_raw_events
+from services.raw_event_partitions import add_months, ensure_partitions, maintain_raw_event_partitions, month_start
+from benchmarks.synthetic_events import Workload, WorkloadConfig, insert_events
+
+# The stages of services.job_runner.run_jobs for one account, in its order
+STAGES: List[Tuple[str, Callable]] = [
+    ("invalidate_account_summary", lambda session, account_id: invalidate_account_summary(session, account_id)),
+    ("process_raw_events", lambda session, account_id: process_raw_events(session, account_id=account_id)),
+    ("evaluate_journey_failures", lambda session, account_id: evaluate_journey_failures(session, account_id=account_id, timeout_minutes=30)),
+    ("process_page_usage", lambda session, account_id: process_page_usage(session, account_id=account_id)),
+    ("process_event_usage", lambda session, account_id: process_event_usage(session, account_id=account_id)),
+    ("detect_and_save_form_usage", lambda session, account_id: detect_and_save_form_usage(session, account_id=account_id)),
+    ("process_friction", lambda session, account_id: process_friction(session, account_id=account_id)),
+    ("process_journey_metrics", lambda session, account_id: process_journey_metrics(session, account_id=account_id)),
+    ("refresh_account_summary", lambda session, account_id: refresh_account_summary(session, account_id)),
+    ("archive_raw_events", lambda session, account_id: archive_raw_events(session, [account_id])),
+    ("maintain_raw_event_partitions", lambda session, account_id: maintain_raw_event_partitions(session)),
+]
+
+
+class QueryCounter:
+    """Counts the SQL statements an engine executes, and the time spent in them."""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.seconds = 0.0
+        self._started = []
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started.append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.seconds += time.perf_counter() - self._started.pop()
+
+
+class Stats:
+    def __init__(self):
+        self.runs = 0
+        self.seconds = 0.0
+        self.events = 0
+        self.peak_bytes = 0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.error = None  # the last failure, if the stage failed on this database
+
+    def to_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "seconds": round(self.seconds, 3),
+            "events_per_second": round(self.events / self.seconds, 1) if self.seconds else None,
+            "peak_mib": round(self.peak_bytes / 2 ** 20, 1) if self.peak_bytes else None,
+            "statements": self.statements,
+            "sql_seconds": round(self.sql_seconds, 3),
+            "error": self.error,
+        }
+
+
+def measure(stats: Stats, queries: QueryCounter, events: int, trace_memory: bool, quiet: bool, fn, *args):
+    """Run fn(*args), adding its time, memory peak and statements to `stats`."""
+    statements, sql_seconds = queries.statements, queries.seconds
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+            return fn(*args)
+    finally:
+        stats.seconds += time.perf_counter() - started
+        if trace_memory:
+            stats.peak_bytes = max(stats.peak_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        stats.runs += 1
+        stats.events += events
+        stats.statements += queries.statements - statements
+        stats.sql_seconds += queries.seconds - sql_seconds
+
+
+def run_benchmark(database: str, config: WorkloadConfig, trace_memory: bool = True,
+                  quiet: bool = True, workers: int = None) -> Dict[str, dict]:
+    """Generate, ingest and process the workload day by day. Returns {stage: stats} ("ingest" first)."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    if workers is not None:
+        Config.EVENT_MATCHING_WORKERS = workers
+
+    results: Dict[str, Stats] = defaultdict(Stats)
+    with app.app_context(), tempfile.TemporaryDirectory() as archive_dir:
+        Config.RAW_EVENT_ARCHIVE_DIR = archive_dir
+        session = db.session
+        db.create_all()
+        queries = QueryCounter(db.engine)
+
+        # Partitioned RawEvent (Postgres): the workload's months must exist before inserting
+        month = month_start(config.start)
+        while month <= config.start + timedelta(days=config.days + 1):
+            ensure_partitions(session, now=month, ahead=0)
+            month = add_months(month, 1)
+
+        name = f"benchmark-{uuid.uuid4().hex[:12]}"
+        account = Account(name=name, api_key=name)
+        session.add(account)
+        session.flush()
+        account_id = account.id
+        workload = Workload(config)
+        workload.create_journeys(session, account_id)
+        session.commit()
+
+        for day in range(config.days):
+            count = measure(results["ingest"], queries, 0, trace_memory, quiet,
+                            insert_events, session, account_id, workload.iter_day(day))
+            results["ingest"].events += count
+            for stage, fn in STAGES:
+                try:
+                    measure(results[stage], queries, count, trace_memory, quiet, fn, session, account_id)
+                except Exception as e:
+                    # e.g. Postgres-only SQL on SQLite: report it and carry on with the next stage
+                    session.rollback()
+                    results[stage].error = f"{type(e).__name__}: {str(e).splitlines()[0]}"
+            print(f"day {day + 1}/{config.days}: {count} events", file=sys.stderr)
+
+    return {stage: stats.to_dict() for stage, stats in results.items()}
+
+
+def print_report(results: Dict[str, dict]):
+    header = f"{'stage':<30} {'runs':>4} {'seconds':>9} {'events/s':>11} {'peak MiB':>9} {'statements':>11} {'sql s':>8}"
+    print(header)
+    print("-" * len(header))
+    total = 0.0
+    for stage, stats in results.items():
+        total += stats["seconds"]
+        print(f"{stage:<30} {stats['runs']:>4} {stats['seconds']:>9.2f} "
+              f"{stats['events_per_second'] if stats['events_per_second'] is not None else '-':>11} "
+              f"{stats['peak_mib'] if stats['peak_mib'] is not None else '-':>9} "
+              f"{stats['statements']:>11} {stats['sql_seconds']:>8.2f}")
+    print("-" * len(header))
+    print(f"{'total':<30} {'':>4} {total:>9.2f}")
+    for stage, stats in results.items():
+        if stats["error"]:
+            print(f"{stage} failed: {stats['error']}")
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic workload")
+    parser.add_argument("--database", default="sqlite://", help="SQLAlchemy URL of a throwaway database")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1, help="days of events, ingested and processed one at a time")
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--extra-pages", type=int, default=0)
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="first day of events (default: the days just before today)")
+    parser.add_argument("--workers", type=int, default=None, help="EVENT_MATCHING_WORKERS for the run")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the stages down)")
+    parser.add_argument("--verbose", action="store_true", help="keep the stages' output")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    config = WorkloadConfig(seed=args.seed, persons=args.persons, days=args.days, templates=args.templates,
+                            extra_pages=args.extra_pages, start=args.start or today - timedelta(days=args.days + 1))
+    results = run_benchmark(args.database, config, trace_memory=not args.no_memory, quiet=not args.verbose,
+                            workers=args.workers)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": {**vars(config), "start": config.start.isoformat()}, "results": results}, f, indent=2)
@@ -0,0 +1,359 @@
+# benchmarks/synthetic_events.py
+# Synthetic PostHog workload for benchmarks: a made-up shop (pages, clickable elements, forms),
+# journey templates recorded on it, and the RawEvents of persons using it. Each active person-day
+# has sessions of one behavior: the ideal path of a template, an indirect one (detours, skipped
+# steps), a failed one (abandoned half way), repeated clicks, backtracking to an earlier page,
+# filling a form, or plain browsing.
+#
+# Everything is derived from the seed: the site and templates from (seed, "site"), a person's day
+# from (seed, day, person), so a workload is reproducible and any day can be generated on its own.
+# Events are yielded one person-day at a time, so millions of events never sit in memory.
+import json
+import random
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import Journey, JourneyLiveStatus, RawEvent, RawEventId, Step
+from utils.element_chain_utils import elements_chain_to_xpath
+from utils.url_utils import normalize_url_for_matching
+
+BASE_URL = "https://shop.example.com"
+
+# Share of sessions per behavior
+DEFAULT_BEHAVIORS = {
+    "ideal": 0.25,
+    "indirect": 0.2,
+    "failed": 0.2,
+    "repeated": 0.1,
+    "backtrack": 0.1,
+    "form": 0.1,
+    "browse": 0.05,
+}
+
+# (path, title, has a form); "{id}" parts get a random id in each visit's url
+PAGES = [
+    ("/", "Home", False),
+    ("/products", "Products", False),
+    ("/products/{id}", "Product", False),
+    ("/cart", "Cart", False),
+    ("/checkout", "Checkout", True),
+    ("/account", "Account", False),
+    ("/orders/{id}", "Order", False),
+    ("/search", "Search", False),
+    ("/settings", "Settings", True),
+    ("/support", "Support", True),
+    ("/signup", "Sign up", True),
+    ("/login", "Log in", True),
+]
+LABELS = ["Add to cart", "Buy now", "Continue", "Details", "Next", "Back", "Save", "Open", "Compare",
+          "Apply", "Show more", "Filter", "Sort", "Help", "Share", "Remove", "Edit", "View all"]
+FIELDS = ["email", "name", "address", "city", "zip", "phone", "card", "message", "password", "company"]
+STEP_SECONDS = 5  # ideal time between two template steps (Step.createdAt spacing)
+
+
+@dataclass(frozen=True)
+class Element:
+    elements_chain: str
+    x_path: str
+
+
+@dataclass(frozen=True)
+class Page:
+    path: str
+    title: str
+    elements: Tuple[Element, ...]
+    form_fields: Tuple[Element, ...] = ()  # inputs of the page's form, if it has one
+    submit: Optional[Element] = None        # and its submit button
+
+    def url(self, rng: random.Random) -> str:
+        return BASE_URL + self.path.replace("{id}", str(rng.randint(1, 99999)))
+
+    @property
+    def pattern_url(self) -> str:
+        """The url as journey steps store it (dynamic parts normalized)."""
+        return normalize_url_for_matching(BASE_URL + self.path.replace("{id}", "1"))
+
+
+@dataclass(frozen=True)
+class Template:
+    name: str
+    steps: Tuple[Tuple[Page, Element], ...]
+
+
+@dataclass
+class WorkloadConfig:
+    seed: int = 0
+    persons: int = 1000
+    days: int = 1
+    start: datetime = datetime(2025, 1, 6)
+    active_share: float = 0.6       # persons active on a given day
+    sessions_per_day: float = 1.5   # mean sessions of an active person
+    extra_pages: int = 0            # pages beyond PAGES ("/section-<n>")
+    templates: int = 3
+    behaviors: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_BEHAVIORS))
+    late_share: float = 0.02        # events ingested minutes, not seconds, after they happened
+
+
+def _segment(tag: str, classes=(), nth: int = 1, text: Optional[str] = None, **attrs) -> str:
+    """One element of a PostHog elements chain."""
+    selector = tag + "".join(f".{c}" for c in classes)
+    parts = [f'attr__class="{" ".join(classes)}"'] if classes else []
+    parts += [f'attr__{name.replace("_", "-")}="{value}"' for name, value in attrs.items()]
+    parts += [f'nth-child="{nth}"', f'nth-of-type="{nth}"']
+    if text:
+        parts.append(f'text="{text}"')
+    return f"{selector}:{''.join(parts)}"
+
+
+def _element(*segments: str) -> Element:
+    chain = ";".join(segments + ("body:nth-child=\"2\"nth-of-type=\"1\"",))
+    return Element(chain, elements_chain_to_xpath(chain))
+
+
+def build_site(seed: int, extra_pages: int = 0) -> List[Page]:
+    rng = random.Random(f"{seed}:site")
+    specs = PAGES + [(f"/section-{n}", f"Section {n}", rng.random() < 0.2) for n in range(extra_pages)]
+    pages = []
+    for path, title, has_form in specs:
+        slug = re.sub(r"[^a-z0-9]+", "-", path.replace("{id}", "item")).strip("-") or "home"
+        container = _segment("div", ("container", slug), nth=1)
+        elements = []
+        for nth, label in enumerate(rng.sample(LABELS, rng.randint(4, 9)), start=1):
+            tag = rng.choice(("button", "a"))
+            attrs = {"data_testid": f"{slug}-{label.lower().replace(' ', '-')}"} if rng.random() < 0.7 else {}
+            elements.append(_element(_segment(tag, ("btn",), nth=nth, text=label, **attrs), container))
+        form_fields, submit = (), None
+        if has_form:
+            form = _segment("form", (f"{slug}-form",), nth=2)
+            form_fields = tuple(
+                _element(_segment("input", ("input",), nth=nth, id=f"{slug}-{name}", name=name, type="text"), form, container)
+                for nth, name in enumerate(rng.sample(FIELDS, rng.randint(2, 6)), start=1))
+            submit = _element(_segment("button", ("btn", "btn-primary"), nth=len(form_fields) + 1, text="Submit",
+                                       type="submit", data_testid=f"{slug}-submit"), form, container)
+        pages.append(Page(path, title, tuple(elements), form_fields, submit))
+    return pages
+
+
+def build_templates(seed: int, pages: List[Page], count: int) -> List[Template]:
+    rng = random.Random(f"{seed}:templates")
+    templates = []
+    for n in range(count):
+        route = rng.sample(pages, min(len(pages), rng.randint(3, 5)))
+        steps = [(page, rng.choice(page.elements)) for page in route]
+        last = route[-1]
+        if last.submit is not None and rng.random() < 0.5:
+            steps[-1] = (last, last.submit)  # ends with a form submission
+        templates.append(Template(f"Journey {n + 1}", tuple(steps)))
+    return templates
+
+
+class _Session:
+    """Emits one session's events, keeping its clock and current page."""
+
+    def __init__(self, rng: random.Random, config: WorkloadConfig, person_id: str, start: datetime, out: list):
+        self.rng = rng
+        self.config = config
+        self.person_id = person_id
+        self.session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        self.t = start
+        self.page: Optional[Page] = None
+        self.url = None
+        self.out = out
+
+    def _emit(self, event: str, event_type: str, element: Optional[Element] = None):
+        rng = self.rng
+        lag = rng.uniform(60, 7200) if rng.random() < self.config.late_share else rng.uniform(0.5, 10)
+        self.out.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "distinct_id": self.person_id,
+            "session_id": self.session_id,
+            "event": event,
+            "event_type": event_type,
+            "pathname": re.sub(r"/\d+", "/#", self.url[len(BASE_URL):] or "/"),
+            "current_url": normalize_url_for_matching(self.url),
+            "elements_chain": element.elements_chain if element else "",
+            "x_path": element.x_path if element else "",
+            "timestamp": self.t,
+            "ingested_at": self.t + timedelta(seconds=lag),
+        })
+
+    def wait(self, mean: float = 4.0):
+        self.t += timedelta(seconds=max(0.2, self.rng.lognormvariate(0, 0.6) * mean))
+
+    def visit(self, page: Page):
+        if self.page is page:
+            return
+        if self.page is not None:
+            self._emit("$pageleave", "pageleave")
+            self.wait(0.5)
+        self.page, self.url = page, page.url(self.rng)
+        self._emit("$pageview", "pageview")
+        self.wait()
+
+    def click(self, page: Page, element: Element, times: int = 1, fill: bool = True):
+        self.visit(page)
+        if element is page.submit and fill:
+            self.fill_form(page)
+        for _ in range(times):
+            self._emit("$autocapture", "click", element)
+            self.wait(0.3 if times > 1 else 4.0)
+        if element is page.submit:
+            self._emit("$autocapture", "submit", element)
+            self.wait()
+
+    def fill_form(self, page: Page, share: float = 1.0):
+        for element in page.form_fields:
+            if self.rng.random() <= share:
+                for _ in range(2 if self.rng.random() < 0.15 else 1):  # corrected a field
+                    self._emit("$autocapture", "change", element)
+                    self.wait(6.0)
+
+    def detour(self, pages: List[Page], clicks: int):
+        for _ in range(clicks):
+            page = self.page if self.page is not None and self.rng.random() < 0.5 else self.rng.choice(pages)
+            self.click(page, self.rng.choice(page.elements))
+
+    def end(self):
+        if self.page is not None:
+            self._emit("$pageleave", "pageleave")
+
+
+def _play(session: _Session, behavior: str, template: Template, pages: List[Page]):
+    rng, steps = session.rng, template.steps
+    if behavior == "browse":
+        session.detour(pages, rng.randint(3, 12))
+    elif behavior == "form":
+        page = rng.choice([p for p in pages if p.form_fields])
+        session.visit(page)
+        session.fill_form(page, share=rng.uniform(0.3, 1.0))
+        if rng.random() < 0.7:
+            session.click(page, page.submit, fill=False)
+    elif behavior == "failed":
+        for page, element in steps[:rng.randint(1, len(steps) - 1)]:
+            session.click(page, element)
+        session.detour(pages, rng.randint(0, 3))
+    else:
+        skipped = rng.randrange(1, len(steps) - 1) if behavior == "indirect" and rng.random() < 0.3 else None
+        repeated = rng.randrange(len(steps)) if behavior == "repeated" else None
+        for i, (page, element) in enumerate(steps):
+            if i == skipped:
+                continue
+            if behavior == "indirect" and i > 0 and rng.random() < 0.5:
+                session.detour(pages, rng.randint(1, 3))
+            if behavior == "backtrack" and i > 1 and rng.random() < 0.4:
+                back_page, back_element = steps[i - 2]
+                session.visit(back_page)
+                if rng.random() < 0.5:
+                    session.click(back_page, back_element)
+            session.click(page, element, times=rng.randint(2, 4) if i == repeated else 1)
+    session.end()
+
+
+def person_id(seed: int, person: int) -> str:
+    return str(uuid.UUID(int=random.Random(f"{seed}:person:{person}").getrandbits(128), version=4))
+
+
+class Workload:
+    """A reproducible synthetic workload (see WorkloadConfig)."""
+
+    def __init__(self, config: WorkloadConfig):
+        self.config = config
+        self.pages = build_site(config.seed, config.extra_pages)
+        self.templates = build_templates(config.seed, self.pages, config.templates)
+        names, weights = zip(*config.behaviors.items())
+        self._behaviors, self._weights = list(names), list(weights)
+
+    def person_day(self, day: int, person: int) -> List[dict]:
+        """One person's events on one day (RawEvent attribute names, without account_id)."""
+        config = self.config
+        rng = random.Random(f"{config.seed}:{day}:{person}")
+        events = []
+        if rng.random() >= config.active_share:
+            return events
+        day_start = config.start + timedelta(days=day)
+        for _ in range(max(1, round(rng.expovariate(1 / config.sessions_per_day)))):
+            start = day_start + timedelta(seconds=rng.uniform(0, 86400 - 3600))
+            session = _Session(rng, config, person_id(config.seed, person), start, events)
+            behavior = rng.choices(self._behaviors, self._weights)[0]
+            _play(session, behavior, rng.choice(self.templates), self.pages)
+        return events
+
+    def iter_day(self, day: int) -> Iterator[dict]:
+        for person in range(self.config.persons):
+            yield from self.person_day(day, person)
+
+    def iter_events(self) -> Iterator[dict]:
+        for day in range(self.config.days):
+            yield from self.iter_day(day)
+
+    def create_journeys(self, session: Session, account_id: int, user_id: int = 1) -> List[int]:
+        """Save the templates as active Journeys with their Steps (does not commit). Returns their ids."""
+        journey_ids = []
+        recorded_at = self.config.start - timedelta(days=1)
+        for template in self.templates:
+            def step_data(page, element):
+                return json.dumps({"url": page.pattern_url, "eventType": "click", "xpath": element.x_path,
+                                   "elementsChain": element.elements_chain})
+
+            journey = Journey(account_id=account_id, name=template.name, user_id=user_id,
+                              start_url=template.steps[0][0].pattern_url, status=JourneyLiveStatus.ACTIVE,
+                              first_step=step_data(*template.steps[0]), last_step=step_data(*template.steps[-1]))
+            session.add(journey)
+            session.flush()
+            for index, (page, element) in enumerate(template.steps):
+                step = Step(account_id=account_id, journey_id=journey.id, url=page.pattern_url,
+                            page_title=page.title, event_type="click", name=f"Step {index + 1}",
+                            element=element.elements_chain.split(":")[0].split(".")[0],
+                            elements_chain=element.elements_chain[:255], x_path=element.x_path,
+                            screen_path=None, index=index)
+                step.created_at = recorded_at + timedelta(seconds=STEP_SECONDS * index)
+                session.add(step)
+            journey_ids.append(journey.id)
+        return journey_ids
+
+
+def insert_events(session: Session, account_id: int, events: Iterator[dict], chunk_size: int = 5000) -> int:
+    """Bulk insert the events as RawEvents of the account, committing a chunk at a time. Returns the count."""
+    count = 0
+    chunk = []
+
+    def flush():
+        # as routes/events.py: every event's uuid is claimed in RawEventId too
+        session.execute(insert(RawEventId), [{"id": e["id"], "account_id": account_id,
+                                              "ingested_at": e["ingested_at"]} for e in chunk])
+        session.execute(insert(RawEvent), chunk)
+        session.commit()
+
+    for event in events:
+        chunk.append(dict(event, account_id=account_id))
+        if len(chunk) >= chunk_size:
+            flush()
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        flush()
+        count += len(chunk)
+    return count
+
+
+if __name__ == "__main__":
+    # Write a workload as JSON lines (one RawEvent per line), e.g. to replay it against the API
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic PostHog event stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--templates", type=int, default=3)
+    parser.add_argument("--start", type=datetime.fromisoformat, default=WorkloadConfig.start)
+    args = parser.parse_args()
+
+    workload = Workload(WorkloadConfig(seed=args.seed, persons=args.persons, days=args.days,
+                                       templates=args.templates, start=args.start))
+    for event in workload.iter_events():
+        sys.stdout.write(json.dumps(event, default=datetime.isoformat) + "\n")
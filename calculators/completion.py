@@ -3,23 +3,21 @@ from datetime import datetime
 from models.customer_journey import JourneyStatusEnum
 # from models import CustomerJourney  # if you want to annotate element type
 
-def calculate_completion_rate(journey_groups: Dict[int, List]) -> Dict[int, float]:
-    """Return {journey_id: completion_rate_percent}."""
-    rates: Dict[int, float] = {}
-    for journey_id, journeys in journey_groups.items():
-        total = len(journeys)
-        completed = sum(1 for j in journeys if j.status == JourneyStatusEnum.COMPLETED)
-        rate = (completed / total * 100) if total else 0.0
-        rates[journey_id] = round(rate, 2)
-    return rates
-
-
-def calculate_completed_journeys(journey_groups: Dict[int, List]) -> Dict[int, int]:
-    """Return {journey_id: total_completed_count}."""
-    totals: Dict[int, int] = {}
-    for journey_id, journeys in journey_groups.items():
-        totals[journey_id] = sum(1 for j in journeys if j.status == JourneyStatusEnum.COMPLETED)
-    return totals
+def calculate_completion_metrics_from_stats(completion_stats: Dict[int, Dict[str, int]]):
+    """
+    Completion rate (percent), completed count and indirect rate (percent of the completions)
+    per journey, from the counts of repositories.journeys.fetch_completion_stats.
+    Returns (completion_rates, total_completed, indirect_rates).
+    """
+    completion_rates: Dict[int, float] = {}
+    total_completed: Dict[int, int] = {}
+    indirect_rates: Dict[int, float] = {}
+    for journey_id, stats in completion_stats.items():
+        total, completed = stats["total"], stats["completed"]
+        completion_rates[journey_id] = round((completed / total * 100) if total else 0.0, 2)
+        total_completed[journey_id] = completed
+        indirect_rates[journey_id] = round((stats["indirect"] / completed * 100) if completed else 0.0, 2)
+    return completion_rates, total_completed, indirect_rates
 
 
 import numpy as np
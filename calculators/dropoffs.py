@@ -1,12 +1,18 @@
 from collections import defaultdict
 from typing import Any, Dict, Iterable, List, Tuple
 
-from calculators.repeats import detect_repeated_behavior
+import numpy as np
+
+from calculators.event_frame import NO_CODE
+from calculators.repeats import detect_repeated_behavior, detect_repeated_behavior_from_frame
 from models.customer_journey import JourneyStatusEnum
+from repositories.dropoffs import fetch_drop_off_counts, fetch_drop_off_reasons
 
 DropOffDistribution = Dict[int, int]
 DropOffReasons = Dict[int, List[Tuple[str, str, str, int]]]  # (element, url, session_id, repeat_count)
 DropOffEvents = List[Tuple[str, str, str]]  # (element, url, session_id)
+DropOffCounts = Dict[Tuple[str, str, str], int]  # (element, url, session_id) -> failed journeys
+DropOffAttribution = Tuple[int, int, List[Tuple[str, str, str, int]]]  # (frame row, step index, reasons)
 
 def calculate_drop_off_distribution(
     journey_group: Iterable[Any],
@@ -71,3 +77,56 @@ def calculate_drop_off_distribution(
         drop_off_events.append((last_ideal["element"], last_ideal["url"], journey.session_id))
 
     return dict(distribution), drop_off_reasons, drop_off_events
+
+
+def calculate_drop_off_attribution(
+    frame,
+    total_steps: np.ndarray,
+    *,
+    repeats_threshold: int = 3,
+    assume_current_step_is_next_to_attempt: bool = True,
+) -> List[DropOffAttribution]:
+    """
+    Step index and repeat reasons of every journey in `frame`, as calculate_drop_off_distribution
+    attributes a failed journey; `total_steps` is the ideal path length of each journey's template.
+    Journeys without a current step or without ideal steps are left out.
+    """
+    total_steps = np.asarray(total_steps, dtype=np.int64)
+    rows = np.flatnonzero((frame.current_step_index != NO_CODE) & (total_steps > 0))
+    step_idx = frame.current_step_index[rows] - (1 if assume_current_step_is_next_to_attempt else 0)
+    clamped = np.clip(step_idx, 0, total_steps[rows] - 1)
+
+    repeated = detect_repeated_behavior_from_frame(frame, rows, last_ideal_steps=clamped,
+                                                   threshold=repeats_threshold)
+    return [(int(row), int(clamped_idx), list(dict.fromkeys(repeated.get(int(row), []))))
+            for row, clamped_idx in zip(rows, clamped)]
+
+
+def calculate_drop_off_distribution_from_table(
+    session,
+    journey_id: int,
+    ideal_path_steps: List[Dict[str, Any]],
+) -> Tuple[DropOffDistribution, DropOffReasons, DropOffCounts]:
+    """
+    calculate_drop_off_distribution from the JourneyDropOff rows recorded when the journey's
+    customer journeys failed. Returns per-(element, url, session_id) counts instead of one
+    drop_off_events entry per failed journey.
+    """
+    drop_off_reasons: DropOffReasons = defaultdict(list)
+    total_steps = len(ideal_path_steps)
+    if total_steps == 0:
+        return {}, drop_off_reasons, {}
+
+    distribution: DropOffDistribution = defaultdict(int)
+    drop_off_counts: DropOffCounts = defaultdict(int)
+    for step_index, session_id, count in fetch_drop_off_counts(session, journey_id):
+        # the ideal path may have been shortened since the row was recorded
+        clamped_idx = min(step_index, total_steps - 1)
+        distribution[clamped_idx] += count
+        last_ideal = ideal_path_steps[clamped_idx]
+        drop_off_counts[(last_ideal["element"], last_ideal["url"], session_id)] += count
+
+    for step_index, reasons in fetch_drop_off_reasons(session, journey_id):
+        drop_off_reasons[min(step_index, total_steps - 1)].extend(tuple(r) for r in reasons)
+
+    return dict(distribution), drop_off_reasons, dict(drop_off_counts)
@@ -0,0 +1,211 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+from models.customer_journey import CompletionType, Event, JourneyStatusEnum
+from repositories.interning import load_strings
+
+STATUS_CODES = {status: code for code, status in enumerate(JourneyStatusEnum)}
+COMPLETION_TYPE_CODES = {completion_type: code for code, completion_type in enumerate(CompletionType)}
+NO_CODE = -1
+
+_ID_CHUNK = 5000  # customer journey ids per IN (...) query
+
+
+class StringPool:
+    """
+    Dense int ids for strings (urls, xpaths, session ids); id -> string via lookup().
+    Values already interned in the database (InternedString ids) are taken by id and their
+    text loaded once per distinct id by resolve().
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[Optional[str]] = []
+        self._db_ids: Dict[int, int] = {}  # InternedString id -> dense id
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value: Optional[str]) -> int:
+        value = value or ""
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def intern_many(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        return np.fromiter((self.intern(v) for v in values), dtype=np.int32)
+
+    def intern_ref(self, db_id: Optional[int], value: Optional[str]) -> int:
+        """Dense id for an InternedString id, or for the plain value of rows without one."""
+        if db_id is None:
+            return self.intern(value)
+        idx = self._db_ids.get(db_id)
+        if idx is None:
+            idx = self._db_ids[db_id] = len(self.values)
+            self.values.append(None)  # filled in by resolve()
+        return idx
+
+    def resolve(self, session: Session) -> np.ndarray:
+        """
+        Load the text of every pending InternedString id. Returns the dense id remap to apply
+        to arrays built with intern_ref (a string seen both by id and by value keeps one id).
+        """
+        remap = np.arange(len(self.values), dtype=np.int32)
+        pending = {db_id: idx for db_id, idx in self._db_ids.items() if self.values[idx] is None}
+        for db_id, value in load_strings(session, pending).items():
+            idx = pending[db_id]
+            existing = self.ids.get(value)
+            if existing is None:
+                self.ids[value] = idx
+                self.values[idx] = value
+            else:
+                remap[idx] = existing
+                self.values[idx] = value
+        return remap
+
+    def lookup(self, idx: int) -> str:
+        return self.values[idx]
+
+    def match_table(self, ids: np.ndarray, predicates: Sequence) -> np.ndarray:
+        """
+        Boolean table [string id, predicate] evaluated once per distinct id in `ids`
+        (rows of ids not in `ids` stay False).
+        """
+        table = np.zeros((len(self.values), len(predicates)), dtype=bool)
+        for idx in np.unique(ids):
+            value = self.values[idx]
+            table[idx] = [predicate(value) for predicate in predicates]
+        return table
+
+
+class JourneyEventFrame:
+    """
+    Columnar events of many CustomerJourneys, for the vectorized calculators.
+
+    Journey-level arrays (length n_journeys) follow the order of the journeys passed in;
+    the events of journey i are rows offsets[i]:offsets[i + 1] of the event arrays,
+    in timestamp order. Strings are stored as ids into `strings`.
+    """
+
+    def __init__(self, journeys: Sequence, offsets: np.ndarray, timestamp_ms: np.ndarray,
+                 url_id: np.ndarray, xpath_id: np.ndarray, session_id: np.ndarray,
+                 is_match: np.ndarray, strings: StringPool):
+        self.journeys = list(journeys)
+        self.cj_ids = np.array([j.id for j in self.journeys], dtype=np.int64)
+        self.template_ids = np.array([j.journey_id for j in self.journeys], dtype=np.int64)
+        self.status = np.array([STATUS_CODES.get(j.status, NO_CODE) for j in self.journeys], dtype=np.int8)
+        self.completion_type = np.array([COMPLETION_TYPE_CODES.get(j.completion_type, NO_CODE)
+                                         for j in self.journeys], dtype=np.int8)
+        self.current_step_index = np.array([NO_CODE if j.current_step_index is None else j.current_step_index
+                                            for j in self.journeys], dtype=np.int64)
+        self.start_ms = _datetimes_to_ms([getattr(j, "start_time", None) for j in self.journeys])
+        self.end_ms = _datetimes_to_ms([getattr(j, "end_time", None) for j in self.journeys])
+
+        self.offsets = offsets
+        self.timestamp_ms = timestamp_ms
+        self.url_id = url_id
+        self.xpath_id = xpath_id
+        self.session_id = session_id
+        self.is_match = is_match
+        self.strings = strings
+
+    @property
+    def n_journeys(self) -> int:
+        return len(self.journeys)
+
+    @property
+    def n_events(self) -> int:
+        return len(self.timestamp_ms)
+
+    def event_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def journey_index(self) -> np.ndarray:
+        """Row -> position of its journey."""
+        return np.repeat(np.arange(self.n_journeys), self.event_counts())
+
+    def journey_mask(self, template_id: Optional[int] = None, status: Optional[JourneyStatusEnum] = None,
+                     completion_type: Optional[CompletionType] = None) -> np.ndarray:
+        mask = np.ones(self.n_journeys, dtype=bool)
+        if template_id is not None:
+            mask &= self.template_ids == template_id
+        if status is not None:
+            mask &= self.status == STATUS_CODES[status]
+        if completion_type is not None:
+            mask &= self.completion_type == COMPLETION_TYPE_CODES[completion_type]
+        return mask
+
+    def consecutive_pairs(self, journey_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices (prev, curr) of consecutive events within the same (selected) journey."""
+        if self.n_events < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        journey_index = self.journey_index()
+        prev = np.arange(self.n_events - 1)
+        keep = journey_index[:-1] == journey_index[1:]
+        if journey_mask is not None:
+            keep &= journey_mask[journey_index[:-1]]
+        prev = prev[keep]
+        return prev, prev + 1
+
+    def first_session_ids(self) -> np.ndarray:
+        """Session id of each journey's first event (-1 for journeys without events)."""
+        counts = self.event_counts()
+        first = np.full(self.n_journeys, NO_CODE, dtype=np.int64)
+        has_events = counts > 0
+        first[has_events] = self.session_id[self.offsets[:-1][has_events]]
+        return first
+
+
+def _datetimes_to_ms(values: Sequence) -> np.ndarray:
+    """int64 ms since epoch of naive UTC datetimes; None -> -1."""
+    stamps = np.array(values, dtype="datetime64[ms]")  # None -> NaT
+    ms = stamps.astype(np.int64)
+    ms[np.isnat(stamps)] = NO_CODE
+    return ms
+
+
+def build_event_frame(session: Session, journeys: Sequence, strings: Optional[StringPool] = None) -> JourneyEventFrame:
+    """Load the events of `journeys` (CustomerJourney rows) into one JourneyEventFrame."""
+    journeys = list(journeys)
+    strings = strings or StringPool()
+    position = {j.id: i for i, j in enumerate(journeys)}
+
+    # Interned rows only ship their ids; the text of each distinct id is loaded once
+    url = case((Event.url_id.is_(None), Event.url), else_=None)
+    x_path = case((Event.x_path_id.is_(None), Event.x_path), else_=None)
+
+    rows = []
+    ids = list(position)
+    for start in range(0, len(ids), _ID_CHUNK):
+        rows.extend(session.query(Event.customer_journey_id, Event.timestamp, Event.url_id, url,
+                                  Event.x_path_id, x_path, Event.session_id, Event.is_match)
+                    .filter(Event.customer_journey_id.in_(ids[start:start + _ID_CHUNK]))
+                    .order_by(Event.customer_journey_id, Event.timestamp, Event.id)
+                    .all())
+
+    journey_pos = np.fromiter((position[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+    order = np.argsort(journey_pos, kind="stable")  # journeys in input order, events keep timestamp order
+    rows = [rows[i] for i in order]
+
+    counts = np.bincount(journey_pos, minlength=len(journeys))
+    offsets = np.zeros(len(journeys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    url_id = np.fromiter((strings.intern_ref(r[2], r[3]) for r in rows), dtype=np.int32, count=len(rows))
+    xpath_id = np.fromiter((strings.intern_ref(r[4], r[5]) for r in rows), dtype=np.int32, count=len(rows))
+    remap = strings.resolve(session)
+
+    return JourneyEventFrame(
+        journeys,
+        offsets=offsets,
+        timestamp_ms=_datetimes_to_ms([r[1] for r in rows]),
+        url_id=remap[url_id],
+        xpath_id=remap[xpath_id],
+        session_id=strings.intern_many(r[6] for r in rows),
+        is_match=np.fromiter((bool(r[7]) for r in rows), dtype=bool, count=len(rows)),
+        strings=strings,
+    )
@@ -1,90 +1,98 @@
+import math
 from collections import defaultdict
 from typing import Dict, List, Tuple
-from models.customer_journey import CompletionType, JourneyStatusEnum
+import numpy as np
+from calculators.event_frame import NO_CODE
+from calculators.sequences import MAX_PATTERN_LEN, mine_sequential_patterns
 
-def calculate_indirect_completion_rate(journey_groups) -> Dict[int, float]:
+def _detour_rows(frame, journey_mask, ideal_path_steps: List[dict]) -> np.ndarray:
     """
-    Calculates the indirect completion rate per journey_id as PERCENT (0–100).
-    Returns: {journey_id: indirect_rate_percent}
+    Rows of the selected journeys' off-path clicks: not matched, not on an ideal step's xPath,
+    and with an xPath.
     """
-    rates: Dict[int, float] = {}
-    for journey_id, journeys in journey_groups.items():
-        completed = sum(1 for j in journeys if j.status == JourneyStatusEnum.COMPLETED)
-        indirect  = sum(1 for j in journeys
-                        if j.status == JourneyStatusEnum.COMPLETED
-                        and j.completion_type == CompletionType.INDIRECT)
-        rates[journey_id] = round((indirect / completed * 100) if completed else 0.0, 2)
-    return rates
+    ideal_xpath_ids = [frame.strings.ids[s["xPath"]] for s in ideal_path_steps
+                       if s.get("xPath") and s["xPath"] in frame.strings.ids]
+    detour = (journey_mask[frame.journey_index()] & ~frame.is_match
+              & ~np.isin(frame.xpath_id, ideal_xpath_ids)
+              & (frame.xpath_id != frame.strings.ids.get("", NO_CODE)))
+    return np.flatnonzero(detour)
 
 
-from collections import defaultdict
-from typing import List, Dict, Tuple
-
-def extract_frequent_alternatives(indirect_completed: List, session) -> Dict[str, List[Tuple[str, float]]]:
+def extract_frequent_alt_clicks(frame, journey_mask, ideal_path_steps: List[dict]) -> Dict[str, List[Tuple[str, float]]]:
     """
-    For each indirectly completed journey (CustomerJourney objects), find events
-    that are NOT part of the ideal path (is_match == False or xPath not in ideal steps).
-    Returns per-URL lists of (xPath, frequency) where frequency = (#journeys containing this event) / total_indirect.
+    The off-path clicks of the journeys in `frame` selected by `journey_mask` (the indirect
+    completions), per URL: lists of (xPath, frequency), frequency being the share of the
+    selected journeys that made that click at least once.
     Example: { "/page-b": [("//div[@class='promo']", 0.5), ...] }
     """
-    alt_event_counts: Dict[Tuple[str, str], int] = defaultdict(int)
-    total_indirect = len(indirect_completed)
-    if total_indirect == 0:
+    total = int(journey_mask.sum())
+    if total == 0 or frame.n_events == 0:
         return {}
 
-    for journey in indirect_completed:
-        seen_this_session = set()
-        event_sequence = get_event_sequence_for_customer(session, journey)  # list of dicts per event
-
-        # Build set of ideal xPaths for this journey
-        ideal_xpaths = {step.x_path for step in journey.journey.steps if getattr(step, "x_path", None)}
-
-        for ev in event_sequence:
-            ev_xpath = ev.get("xPath")
-            ev_url = ev.get("url")
-            ev_is_match = ev.get("is_match", False)
-
-            # Skip events that are part of the ideal path
-            if ev_is_match or (ev_xpath in ideal_xpaths):
-                continue
+    rows = _detour_rows(frame, journey_mask, ideal_path_steps)
+    if not len(rows):
+        return {}
 
-            # Count each (xPath,url) once per journey
-            key = (ev_xpath, ev_url)
-            if key not in seen_this_session and ev_xpath:
-                alt_event_counts[key] += 1
-                seen_this_session.add(key)
+    # Count each (xPath, url) once per journey
+    keys = np.unique(np.stack([frame.journey_index()[rows], frame.url_id[rows], frame.xpath_id[rows]], axis=1), axis=0)
+    pairs, counts = np.unique(keys[:, 1:], axis=0, return_counts=True)
 
-    # Group and normalize by frequency
     result: Dict[str, List[Tuple[str, float]]] = {}
-    for (xPath, url), count in alt_event_counts.items():
-        freq = round(count / total_indirect, 2)
-        result.setdefault(url, []).append((xPath, freq))
+    for (url_id, xpath_id), count in zip(pairs, counts):
+        result.setdefault(frame.strings.lookup(int(url_id)), []).append(
+            (frame.strings.lookup(int(xpath_id)), round(int(count) / total, 2)))
 
-    # Sort each URL’s list by frequency descending
+    # Sort each URL's list by frequency descending
     for url in result:
         result[url].sort(key=lambda t: t[1], reverse=True)
-
     return result
 
 
+MIN_DETOUR_SUPPORT = 0.05  # share of the indirect completions that took a detour pattern
 
-def get_event_sequence_for_customer(session, journey):
+def extract_frequent_detours(frame, journey_mask, ideal_path_steps: List[dict],
+                             min_support: float = MIN_DETOUR_SUPPORT,
+                             max_len: int = MAX_PATTERN_LEN) -> List[dict]:
     """
-    Given a CustomerJourney object, returns its events ordered by timestamp.
-    Each event is a dict with url, element, xPath, timestamp (ms), is_match, session_id, event_id.
+    Frequent ordered detours of the journeys in `frame` selected by `journey_mask` (the indirect
+    completions): the off-path clicks a journey made after reaching k ideal steps form its
+    detour at step k, and PrefixSpan finds the click sequences frequent among those detours.
+    Clicks on the ideal path (matched, or on an ideal step's xPath) are not part of detours.
+    Returns [{"after_step": k, "path": [{"url", "xPath"}], "count", "frequency"}], most frequent first.
     """
-    from models import Event  # local import to avoid circulars
-    events = (session.query(Event)
-              .filter(Event.customer_journey_id == journey.id)
-              .order_by(Event.timestamp)
-              .all())
-
-    return [{
-        "url": e.url,
-        "element": e.elements_chain,
-        "xPath": e.x_path,
-        "timestamp": int(e.timestamp.timestamp() * 1000),
-        "is_match": bool(e.is_match),
-        "session_id": e.session_id,
-        "event_id": e.id
-    } for e in events]
+    total = int(journey_mask.sum())
+    if total == 0 or frame.n_events == 0:
+        return []
+
+    rows = _detour_rows(frame, journey_mask, ideal_path_steps)
+    if not len(rows):
+        return []
+
+    # Ideal steps reached before each click, within its journey
+    journey_index = frame.journey_index()
+    matches_before = np.r_[0, np.cumsum(frame.is_match)]
+    reached = matches_before[:-1] - np.repeat(matches_before[frame.offsets[:-1]], frame.event_counts())
+
+    # One item per (url, xPath); one sequence per (journey, step reached)
+    pairs, items = np.unique(np.stack([frame.url_id[rows], frame.xpath_id[rows]], axis=1),
+                             axis=0, return_inverse=True)
+    items = items.reshape(-1)
+    groups = np.stack([journey_index[rows], reached[rows]], axis=1)
+    starts = np.flatnonzero(np.r_[True, np.any(groups[1:] != groups[:-1], axis=1)])
+    sequences_by_step: Dict[int, List[List[int]]] = defaultdict(list)
+    for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+        sequences_by_step[int(groups[start, 1])].append(items[start:end].tolist())
+
+    min_count = math.ceil(min_support * total)
+    detours = []
+    for step, sequences in sorted(sequences_by_step.items()):
+        for pattern, count in mine_sequential_patterns(sequences, min_count, max_len=max_len):
+            detours.append({
+                "after_step": step,
+                "path": [{"url": frame.strings.lookup(int(pairs[item, 0])),
+                          "xPath": frame.strings.lookup(int(pairs[item, 1]))} for item in pattern],
+                "count": count,
+                "frequency": round(count / total, 2),
+            })
+    detours.sort(key=lambda d: (-d["count"], d["after_step"], len(d["path"])))
+    return detours
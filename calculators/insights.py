@@ -1,6 +1,7 @@
 from collections import defaultdict, OrderedDict
 from statistics import mean
 from typing import Dict, List, Tuple, Any, Optional
+import numpy as np
 
 from utils.norm_and_compare import compare_elements
 from utils.url_utils import extract_base_url_pattern, urls_match_pattern, urls_glob_match
@@ -22,19 +23,19 @@ def generate_step_insights_from_ideal_path(
     repeated_events: Optional[Dict[Tuple[str, str], float]] = None,
     drop_off_events: Optional[Dict[Tuple[str, str], float]] = None,
     *,
+    step_percentiles: Optional[Dict[Tuple[str, str], Dict[str, float]]] = None,
     debug: bool = True,               # <— turn on verbose prints
 ) -> Tuple[Dict[str, Any], List[Tuple[str, str, str, float]]]:
+    """
+    step_percentiles: {(url, xPath) of a step: {"p50": ms, "p90": ms, "p99": ms}} from the
+    journey's step time sketches (services/duration_sketches.py), reported per step.
+    """
 
     repeated_events = repeated_events or {}
     drop_off_events = drop_off_events or {}
 
     # 0) Precompute patterns
-    ideal_with_patterns = []
-    for s in ideal_path_steps:
-        ideal_with_patterns.append({
-            **s,
-            "url_pattern": extract_base_url_pattern(s["url"]),
-        })
+    ideal_with_patterns = _with_url_patterns(ideal_path_steps)
 
     if debug:
         print("\n[DEBUG] Ideal steps with patterns:")
@@ -42,27 +43,14 @@ def generate_step_insights_from_ideal_path(
             print(f"  step_{idx}: step={s.get('step')} url={s['url']} pattern={s['url_pattern']} xPath={s.get('xPath')}")
 
     # 1) Ideal durations
-    ideal_durations: Dict[Tuple[str, str], float] = {}
-    for i in range(1, len(ideal_with_patterns)):
-        prev = ideal_with_patterns[i - 1]
-        curr = ideal_with_patterns[i]
-        key = (curr["url"], curr["xPath"])
-        prev_ms = _to_ms(prev.get("timestamp"))
-        curr_ms = _to_ms(curr.get("timestamp"))
-        if prev_ms is None or curr_ms is None:
-            continue
-        ideal_durations[key] = max(0.0, float(curr_ms - prev_ms))
+    ideal_durations = _ideal_durations(ideal_with_patterns)
     if debug:
         print("\n[DEBUG] Ideal durations (ms) keyed by (url, element of dest step):")
         for k, v in ideal_durations.items():
             print("  ", k, "=>", v)
 
     # 2) Actual times
-    step_stats: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(lambda: {
-        "times": [],
-        "delayed_sessions": set(),
-        "all_sessions": set(),
-    })
+    step_stats: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(_empty_step_stats)
     delayed_events: List[Tuple[str, str, str, float]] = []
 
     for journey_idx, journey in enumerate(completed_journeys, start=1):
@@ -132,6 +120,43 @@ def generate_step_insights_from_ideal_path(
                       f"is_match={curr_event.get('is_match')} duration={duration}")
 
     # 3) Build insights (and print per-step averages)
+    step_insights = _build_step_insights(ideal_with_patterns, step_stats, repeated_events, drop_off_events,
+                                         step_percentiles=step_percentiles, debug=debug)
+    return step_insights, delayed_events
+
+
+def _with_url_patterns(ideal_path_steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**s, "url_pattern": extract_base_url_pattern(s["url"])} for s in ideal_path_steps]
+
+
+def _ideal_durations(ideal_with_patterns: List[Dict[str, Any]]) -> Dict[Tuple[str, str], float]:
+    """Admin-recorded time between consecutive ideal steps, keyed by (url, xPath) of the destination step."""
+    ideal_durations: Dict[Tuple[str, str], float] = {}
+    for i in range(1, len(ideal_with_patterns)):
+        prev = ideal_with_patterns[i - 1]
+        curr = ideal_with_patterns[i]
+        key = (curr["url"], curr["xPath"])
+        prev_ms = _to_ms(prev.get("timestamp"))
+        curr_ms = _to_ms(curr.get("timestamp"))
+        if prev_ms is None or curr_ms is None:
+            continue
+        ideal_durations[key] = max(0.0, float(curr_ms - prev_ms))
+    return ideal_durations
+
+
+def _empty_step_stats() -> Dict[str, Any]:
+    return {"times": [], "delayed_sessions": set(), "all_sessions": set()}
+
+
+def _build_step_insights(
+    ideal_with_patterns: List[Dict[str, Any]],
+    step_stats: Dict[Tuple[str, str], Dict[str, Any]],
+    repeated_events: Dict[Tuple[str, str], float],
+    drop_off_events: Dict[Tuple[str, str], float],
+    *,
+    step_percentiles: Optional[Dict[Tuple[str, str], Dict[str, float]]] = None,
+    debug: bool = False,
+) -> "OrderedDict[str, Any]":
     step_insights: "OrderedDict[str, Any]" = OrderedDict()
     sorted_steps = sorted(ideal_with_patterns, key=lambda x: x.get("step", 0))
 
@@ -139,11 +164,7 @@ def generate_step_insights_from_ideal_path(
         print("\n[DEBUG] Per-step timing stats before averaging:")
     for i, step in enumerate(sorted_steps):
         key = (step["url"], step["xPath"])
-        stats = step_stats.get(key, {
-            "times": [],
-            "delayed_sessions": set(),
-            "all_sessions": set(),
-        })
+        stats = step_stats.get(key) or _empty_step_stats()
 
         avg_time = mean(stats["times"]) if stats["times"] else 0.0
         all_count = len(stats["all_sessions"])
@@ -179,6 +200,7 @@ def generate_step_insights_from_ideal_path(
             "url": step["url"],
             "xPath": step.get("xPath"),
             "avg_time_ms": int(round(avg_time)),
+            "time_percentiles_ms": (step_percentiles or {}).get(key),
             "drop_off_rate": round(drop_off_rate, 2),
             "repeated_rate": round(repeated_rate, 2),
             "anomalies": anomalies,
@@ -189,4 +211,96 @@ def generate_step_insights_from_ideal_path(
             },
         }
 
+    return step_insights
+
+
+def generate_step_insights_from_frame(
+    ideal_path_steps: List[Dict[str, Any]],
+    frame,
+    journey_mask,
+    threshold: float,
+    repeated_events: Optional[Dict[Tuple[str, str], float]] = None,
+    drop_off_events: Optional[Dict[Tuple[str, str], float]] = None,
+    *,
+    step_percentiles: Optional[Dict[Tuple[str, str], Dict[str, float]]] = None,
+    debug: bool = False,
+) -> Tuple[Dict[str, Any], List[Tuple[str, str, str, float]]]:
+    """
+    generate_step_insights_from_ideal_path over the journeys of a JourneyEventFrame selected by
+    `journey_mask`. URL and element checks run once per distinct url/xpath and ideal step; every
+    consecutive event pair is then matched to its first fitting ideal transition with array ops.
+    """
+    repeated_events = repeated_events or {}
+    drop_off_events = drop_off_events or {}
+    ideal_with_patterns = _with_url_patterns(ideal_path_steps)
+    ideal_durations = _ideal_durations(ideal_with_patterns)
+    step_stats: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(_empty_step_stats)
+    delayed_events: List[Tuple[str, str, str, float]] = []
+
+    prev, curr, matched, transition, durations = match_ideal_transitions(ideal_path_steps, frame, journey_mask)
+    if len(matched):
+        strings = frame.strings
+        sessions = frame.first_session_ids()[frame.journey_index()[prev[matched]]]
+        for pair, t, session_idx in zip(matched, transition, sessions):
+            ideal_curr = ideal_with_patterns[t]
+            ideal_key = (ideal_curr["url"], ideal_curr["xPath"])
+            session_id = strings.lookup(session_idx) or "unknown"
+            duration = float(durations[pair])
+
+            stats = step_stats[ideal_key]
+            stats["times"].append(duration)
+            stats["all_sessions"].add(session_id)
+
+            ideal_ms = ideal_durations.get(ideal_key)
+            if ideal_ms is not None and duration > threshold * ideal_ms:
+                stats["delayed_sessions"].add(session_id)
+                delayed_events.append((
+                    strings.lookup(frame.xpath_id[curr[pair]]),
+                    strings.lookup(frame.url_id[curr[pair]]),
+                    session_id,
+                    duration,
+                ))
+
+    if debug:
+        print(f"[DEBUG] {len(matched)}/{len(prev)} event pairs matched an ideal transition, "
+              f"{len(delayed_events)} delayed")
+
+    step_insights = _build_step_insights(ideal_with_patterns, step_stats, repeated_events, drop_off_events,
+                                         step_percentiles=step_percentiles, debug=debug)
     return step_insights, delayed_events
+
+
+def match_ideal_transitions(ideal_path_steps: List[Dict[str, Any]], frame, journey_mask):
+    """
+    Match every consecutive event pair of the selected journeys to its first fitting ideal
+    transition. Returns (prev, curr, matched, transition, durations): the pair rows, the indices
+    of the matched pairs, the index of the destination ideal step of each matched pair, and the
+    duration (ms) of every pair.
+    """
+    ideal_with_patterns = _with_url_patterns(ideal_path_steps)
+    prev, curr = frame.consecutive_pairs(journey_mask)
+    durations = (frame.timestamp_ms[curr] - frame.timestamp_ms[prev]).astype(np.float64)
+    if len(ideal_with_patterns) < 2 or not len(prev):
+        empty = np.empty(0, dtype=np.int64)
+        return prev, curr, empty, empty, durations
+
+    strings = frame.strings
+    url_ok = strings.match_table(
+        np.concatenate([frame.url_id[prev], frame.url_id[curr]]),
+        [lambda url, p=s["url_pattern"]: urls_glob_match(url, p) for s in ideal_with_patterns],
+    )
+    el_ok = strings.match_table(
+        np.concatenate([frame.xpath_id[prev], frame.xpath_id[curr]]),
+        [lambda xpath, x=s["xPath"]: compare_elements(x, xpath) for s in ideal_with_patterns],
+    )
+
+    valid = (frame.timestamp_ms[prev] >= 0) & (frame.timestamp_ms[curr] >= 0) & (durations >= 0)
+    base = valid & frame.is_match[curr]
+
+    # fits[pair, t - 1]: pair matches the ideal transition (t - 1) -> t
+    fits = (url_ok[frame.url_id[prev], :-1] & url_ok[frame.url_id[curr], 1:]
+            & el_ok[frame.xpath_id[prev], :-1] & el_ok[frame.xpath_id[curr], 1:]
+            & base[:, None])
+    matched = np.flatnonzero(fits.any(axis=1))
+    transition = fits[matched].argmax(axis=1) + 1
+    return prev, curr, matched, transition, durations
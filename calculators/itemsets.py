@@ -0,0 +1,97 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+MAX_ITEMSET_LEN = 4          # longest itemset mined
+MAX_TRANSACTIONS = 20000     # transactions mined at most (the first ones given)
+
+
+class _FPNode:
+    __slots__ = ("item", "count", "parent", "children")
+
+    def __init__(self, item: Optional[int], parent: Optional["_FPNode"]):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children: Dict[int, "_FPNode"] = {}
+
+
+def _min_count(min_support: float, n_transactions: int) -> int:
+    """Smallest count whose support (count / n) is >= min_support, as apriori filters."""
+    min_count = max(1, math.ceil(min_support * n_transactions))
+    while min_count > 1 and (min_count - 1) / n_transactions >= min_support:
+        min_count -= 1
+    while min_count / n_transactions < min_support:
+        min_count += 1
+    return min_count
+
+
+def _fp_growth(weighted: List[Tuple[Iterable[int], int]], min_count: int, max_len: int,
+               suffix: Tuple[int, ...], out: Dict[Tuple[int, ...], int]):
+    """Mine the itemsets of the (items, weight) transactions into `out`, each extended by `suffix`."""
+    counts: Dict[int, int] = defaultdict(int)
+    for items, weight in weighted:
+        for item in items:
+            counts[item] += weight
+    frequent = {item: count for item, count in counts.items() if count >= min_count}
+    if not frequent:
+        return
+
+    # FP-tree: transactions share prefixes ordered by descending support
+    rank = {item: r for r, item in enumerate(sorted(frequent, key=lambda i: (-frequent[i], i)))}
+    root = _FPNode(None, None)
+    header: Dict[int, List[_FPNode]] = defaultdict(list)
+    for items, weight in weighted:
+        node = root
+        for item in sorted((i for i in items if i in rank), key=rank.__getitem__):
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _FPNode(item, node)
+                header[item].append(child)
+            child.count += weight
+            node = child
+
+    for item in frequent:
+        itemset = suffix + (item,)
+        out[itemset] = frequent[item]
+        if len(itemset) >= max_len:
+            continue
+        # Conditional pattern base: the prefix paths leading to `item`
+        conditional = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                conditional.append((path, node.count))
+        if conditional:
+            _fp_growth(conditional, min_count, max_len, itemset, out)
+
+
+def mine_frequent_itemsets(transactions: List[Iterable[Hashable]], min_support: float,
+                           max_len: int = MAX_ITEMSET_LEN,
+                           max_transactions: int = MAX_TRANSACTIONS) -> List[Tuple[Tuple[Hashable, ...], int, float]]:
+    """
+    Itemsets contained in at least `min_support` (fraction) of the transactions, mined with
+    FP-growth over integer-encoded items (an item counts once per transaction). Only the first
+    `max_transactions` transactions are mined.
+    Returns [(items sorted, count, support)] ordered by length, then items, as apriori lists them.
+    """
+    transactions = transactions[:max_transactions]
+    n = len(transactions)
+    if n == 0:
+        return []
+
+    # Encode items as ints in sorted order (the columns of a TransactionEncoder)
+    vocabulary = sorted({item for transaction in transactions for item in transaction})
+    codes = {item: code for code, item in enumerate(vocabulary)}
+    weighted = list(Counter(frozenset(codes[item] for item in transaction) for transaction in transactions).items())
+
+    found: Dict[Tuple[int, ...], int] = {}
+    _fp_growth(weighted, _min_count(min_support, n), max_len, (), found)
+
+    itemsets = sorted((tuple(sorted(itemset)), count) for itemset, count in found.items())
+    itemsets.sort(key=lambda entry: len(entry[0]))
+    return [(tuple(vocabulary[code] for code in itemset), count, count / n) for itemset, count in itemsets]
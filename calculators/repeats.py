@@ -1,4 +1,6 @@
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Sequence
+import numpy as np
+from calculators.event_frame import build_event_frame
 from repositories.events import fetch_events_for_customer_journey
 from utils.norm_and_compare import compare_elements
 from collections import defaultdict
@@ -57,7 +59,7 @@ def detect_repeated_behavior(
     # tail sequence
     if counter >= threshold:
         repeated_steps.append((
-            current_event.elements_chain.split(';')[0],
+            current_event.x_path,
             current_event.url,
             current_event.session_id,
             counter,
@@ -66,6 +68,98 @@ def detect_repeated_behavior(
     return repeated_steps
 
 
+def detect_repeated_behavior_from_frame(
+    frame,
+    journey_rows: Sequence[int],
+    last_ideal_steps: Optional[Sequence[int]] = None,
+    threshold: int = 3,
+    *,
+    backtrack_window: int = 2,
+) -> Dict[int, List[RepeatedTuple]]:
+    """
+    detect_repeated_behavior for many journeys of a JourneyEventFrame at once.
+    `journey_rows` are frame positions, `last_ideal_steps` the matching last ideal step of each
+    (None scans every event). Returns {journey_row: [(element, url, session_id, repeat_count), ...]}.
+
+    Runs are found by run-length encoding (journey, url_id, xpath_id) over the scanned events.
+    compare_elements also accepts some different element strings (key/value subsets of non-XPath
+    chains); journeys where that happens between neighbours fall back to the event-by-event scan.
+    """
+    journey_rows = np.asarray(journey_rows, dtype=np.int64)
+    if len(journey_rows) == 0:
+        return {}
+
+    starts = frame.offsets[journey_rows]
+    ends = frame.offsets[journey_rows + 1]
+    if last_ideal_steps is not None:
+        skip = np.maximum(0, np.asarray(last_ideal_steps, dtype=np.int64) - backtrack_window)
+        starts = np.minimum(starts + skip, ends)
+
+    # Scanned event rows of every journey, concatenated; seg = position in journey_rows
+    lengths = ends - starts
+    seg = np.repeat(np.arange(len(journey_rows)), lengths)
+    seg_begin = np.cumsum(lengths) - lengths
+    rows = np.arange(len(seg)) - seg_begin[seg] + starts[seg]
+    if len(rows) == 0:
+        return {}
+
+    url = frame.url_id[rows]
+    xpath = frame.xpath_id[rows]
+    same_journey = seg[1:] == seg[:-1]
+    same_url = same_journey & (url[1:] == url[:-1])
+    same_element = same_url & (xpath[1:] == xpath[:-1])
+
+    # Neighbours with different element ids that compare_elements still treats as equal
+    lookup = frame.strings.lookup
+    candidates = np.flatnonzero(same_url & ~same_element)
+    fuzzy_segments = set()
+    if len(candidates):
+        pairs = np.unique(np.stack([xpath[candidates + 1], xpath[candidates]], axis=1), axis=0)
+        fuzzy_pairs = {(int(a), int(b)) for a, b in pairs if compare_elements(lookup(a), lookup(b))}
+        if fuzzy_pairs:
+            fuzzy_segments = {int(seg[i]) for i in candidates
+                              if (int(xpath[i + 1]), int(xpath[i])) in fuzzy_pairs}
+
+    run_starts = np.flatnonzero(np.concatenate(([True], ~same_element)))
+    repeats = np.diff(np.append(run_starts, len(rows))) - 1
+
+    repeated: Dict[int, List[RepeatedTuple]] = defaultdict(list)
+    hits = repeats >= threshold
+    for i, count in zip(run_starts[hits], repeats[hits]):
+        if int(seg[i]) in fuzzy_segments:
+            continue
+        row = rows[i]
+        repeated[int(journey_rows[seg[i]])].append((
+            lookup(frame.xpath_id[row]),
+            lookup(frame.url_id[row]),
+            lookup(frame.session_id[row]),
+            int(count),
+        ))
+
+    for s in sorted(fuzzy_segments):
+        repeated[int(journey_rows[s])] = _scan_repeats(frame, rows[seg == s], threshold)
+
+    return {journey_row: reps for journey_row, reps in repeated.items() if reps}
+
+
+def _scan_repeats(frame, rows: np.ndarray, threshold: int) -> List[RepeatedTuple]:
+    """The event-by-event scan of detect_repeated_behavior over frame rows."""
+    lookup = frame.strings.lookup
+    repeated_steps: List[RepeatedTuple] = []
+    current, counter = rows[0], 0
+    for row in rows[1:]:
+        if (frame.url_id[row] == frame.url_id[current]
+                and compare_elements(lookup(frame.xpath_id[row]), lookup(frame.xpath_id[current]))):
+            counter += 1
+            continue
+        if counter >= threshold:
+            repeated_steps.append((lookup(frame.xpath_id[current]), lookup(frame.url_id[current]),
+                                   lookup(frame.session_id[current]), counter))
+        current, counter = row, 0
+    if counter >= threshold:
+        repeated_steps.append((lookup(frame.xpath_id[current]), lookup(frame.url_id[current]),
+                               lookup(frame.session_id[current]), counter))
+    return repeated_steps
 
 
 def calculate_repeated_behavior_all_journeys(
@@ -74,22 +168,30 @@ def calculate_repeated_behavior_all_journeys(
     *,
     threshold: int = 3,
     last_ideal_step: int = 1,
+    frame=None,
 ):
     """
     For all given CustomerJourney rows, detect repeated behavior.
+    Pass the JourneyEventFrame holding their events if there is one; otherwise it is built here.
     Returns: { parent_journey_id: [ (element, url, session_id, repeat_count), ... ] }
     """
-    repeated_events_by_journey: Dict[int, List[RepeatedTuple]] = defaultdict(list)
+    journeys = list(journeys)
+    if frame is None:
+        frame = build_event_frame(session, journeys)
+    position = {int(cj_id): i for i, cj_id in enumerate(frame.cj_ids)}
+    journey_rows = [position[cj.id] for cj in journeys]
+
+    repeated = detect_repeated_behavior_from_frame(
+        frame,
+        journey_rows,
+        last_ideal_steps=[last_ideal_step] * len(journey_rows),
+        threshold=threshold,
+    )
 
-    for cj in journeys:
-        reps = detect_repeated_behavior(
-            session,
-            cj.id,
-            last_ideal_step=last_ideal_step,
-            threshold=threshold,
-        )
-        if reps:
+    repeated_events_by_journey: Dict[int, List[RepeatedTuple]] = defaultdict(list)
+    for cj, journey_row in zip(journeys, journey_rows):
+        if journey_row in repeated:
             # Use the FK to the parent Journey as the dict key
-            repeated_events_by_journey[cj.journey_id].extend(reps)
+            repeated_events_by_journey[cj.journey_id].extend(repeated[journey_row])
 
     return repeated_events_by_journey
@@ -0,0 +1,50 @@
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+MAX_PATTERN_LEN = 3       # longest pattern mined
+MAX_PATTERNS = 100        # patterns returned at most, most frequent first within each length
+MAX_SEQUENCES = 20000     # sequences mined at most (the first ones given)
+
+
+def mine_sequential_patterns(sequences: Sequence[Sequence[int]], min_count: int,
+                             max_len: int = MAX_PATTERN_LEN, max_patterns: int = MAX_PATTERNS,
+                             max_sequences: int = MAX_SEQUENCES) -> List[Tuple[Tuple[int, ...], int]]:
+    """
+    Ordered patterns (not necessarily contiguous) found in at least `min_count` of the
+    integer-encoded sequences, with PrefixSpan over pseudo-projections: a projected database is
+    only (sequence, position) pairs, and each length keeps at most `max_patterns` prefixes, so
+    memory is bounded by max_patterns x the number of sequences.
+    Returns [(pattern, number of sequences containing it)], by length then frequency.
+    """
+    sequences = sequences[:max_sequences]
+    min_count = max(1, min_count)
+
+    # Items below the support threshold cannot be part of any pattern
+    support = Counter(item for sequence in sequences for item in set(sequence))
+    frequent = {item for item, count in support.items() if count >= min_count}
+    sequences = [[item for item in sequence if item in frequent] for sequence in sequences]
+    sequences = [sequence for sequence in sequences if sequence]
+
+    patterns: List[Tuple[Tuple[int, ...], int]] = []
+    level = [((), [(s, 0) for s in range(len(sequences))])]
+    while level and len(level[0][0]) < max_len and len(patterns) < max_patterns:
+        next_level = []
+        for prefix, projected in level:
+            # Where each item first occurs after the prefix, once per sequence
+            extensions: Dict[int, List[Tuple[int, int]]] = {}
+            for s, start in projected:
+                sequence = sequences[s]
+                seen = set()
+                for position in range(start, len(sequence)):
+                    item = sequence[position]
+                    if item not in seen:
+                        seen.add(item)
+                        extensions.setdefault(item, []).append((s, position + 1))
+            for item, item_projected in extensions.items():
+                if len(item_projected) >= min_count:
+                    next_level.append((prefix + (item,), item_projected))
+        next_level.sort(key=lambda entry: (-len(entry[1]), entry[0]))
+        next_level = next_level[:max_patterns - len(patterns)]
+        patterns.extend((pattern, len(projected)) for pattern, projected in next_level)
+        level = next_level
+    return patterns
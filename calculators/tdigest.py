@@ -0,0 +1,126 @@
+import math
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+
+DEFAULT_COMPRESSION = 200
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest, k1 scale function). Holds at most about
+    `compression` centroids whatever the number of values added; small inputs stay exact
+    (one centroid per value). Serializes to a JSON-able dict with to_dict()/from_dict().
+    """
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._buffer_means = []
+        self._buffer_weights = []
+        self._buffered = 0
+
+    @property
+    def count(self) -> int:
+        return int(round(self.weights.sum())) + self._buffered
+
+    def add(self, value: float):
+        self.add_many([value])
+
+    def add_many(self, values: Iterable[float]):
+        values = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            self._push(values, np.ones(len(values)), float(values.min()), float(values.max()))
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        if len(other.means):
+            self._push(other.means, other.weights, other.min, other.max)
+
+    def _push(self, means: np.ndarray, weights: np.ndarray, lo: float, hi: float):
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        self._buffer_means.append(means)
+        self._buffer_weights.append(weights)
+        self._buffered += int(round(weights.sum()))
+        if self._buffered > 5 * self.compression:
+            self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer_means:
+            return
+        means = np.concatenate([self.means] + self._buffer_means)
+        weights = np.concatenate([self.weights] + self._buffer_weights)
+        self._buffer_means, self._buffer_weights, self._buffered = [], [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        merged_means, merged_weights = [], []
+        cur_mean, cur_weight = means[0], weights[0]
+        before = 0.0  # weight of the centroids already emitted
+        k_lower = self._k(0.0)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if self._k((before + cur_weight + weight) / total) - k_lower <= 1:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                merged_means.append(cur_mean)
+                merged_weights.append(cur_weight)
+                before += cur_weight
+                k_lower = self._k(before / total)
+                cur_mean, cur_weight = mean, weight
+        merged_means.append(cur_mean)
+        merged_weights.append(cur_weight)
+
+        self.means = np.array(merged_means, dtype=np.float64)
+        self.weights = np.array(merged_weights, dtype=np.float64)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1); None for an empty digest."""
+        self._compress()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+
+        total = self.weights.sum()
+        target = min(max(q, 0.0), 1.0) * total
+        centers = np.cumsum(self.weights) - self.weights / 2  # rank of each centroid's middle
+        if target <= centers[0]:
+            return float(np.interp(target, [0.0, centers[0]], [self.min, self.means[0]]))
+        if target >= centers[-1]:
+            return float(np.interp(target, [centers[-1], total], [self.means[-1], self.max]))
+        return float(np.interp(target, centers, self.means))
+
+    def percentiles(self, percentiles: Dict[str, float] = PERCENTILES) -> Dict[str, float]:
+        """{"p50": ..., "p90": ..., "p99": ...} rounded to 2 decimals (0.0 when empty)."""
+        return {name: round(self.quantile(q) or 0.0, 2) for name, q in percentiles.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "means": [float(m) for m in self.means],
+            "weights": [float(w) for w in self.weights],
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "TDigest":
+        data = data or {}
+        digest = cls(data.get("compression", DEFAULT_COMPRESSION))
+        digest.means = np.asarray(data.get("means", []), dtype=np.float64)
+        digest.weights = np.asarray(data.get("weights", []), dtype=np.float64)
+        digest.min = data.get("min")
+        digest.max = data.get("max")
+        return digest
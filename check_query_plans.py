@@ -0,0 +1,117 @@
+# Query-plan regression check for the pipeline's hot queries.
+# For every query we EXPLAIN it and fail if the index it depends on is not used
+# (index missing, renamed, or the query shape no longer matches it).
+# Postgres: sequential scans are disabled for the check, so it verifies the index is *usable*
+# even on a small dev database where the planner would rightly prefer a seq scan.
+# SQLite (local runs): uses EXPLAIN QUERY PLAN. Without table statistics SQLite breaks cost
+# ties between indexes arbitrarily, so there only a full table scan counts as a regression.
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import text
+
+HOT_QUERIES = [
+    ("pipeline stages: events after watermark", "idx_raw_event_account_ingested",
+     'SELECT * FROM "RawEvent" WHERE "accountId" = :account_id AND "ingestedAt" <= :until '
+     'AND ("ingestedAt", id) > (:since, :event_id) ORDER BY "ingestedAt", id'),
+    ("process_friction: events in time range", "idx_raw_event_account_ts",
+     'SELECT * FROM "RawEvent" WHERE "accountId" = :account_id AND "timestamp" >= :since'),
+    ("session start times", "idx_raw_event_session_ts",
+     'SELECT "timestamp" FROM "RawEvent" WHERE "sessionId" = :session_id ORDER BY "timestamp" LIMIT 1'),
+    ("matcher: active journey for person", "idx_customer_journey_person_journey_status",
+     'SELECT id FROM "CustomerJourney" WHERE "personId" = :person_id AND "journeyId" = :journey_id '
+     "AND status = 'IN_PROGRESS'"),
+    ("evaluate_journey_failures: stale sweep", "idx_customer_journey_in_progress",
+     'SELECT id FROM "CustomerJourney" WHERE "accountId" = :account_id '
+     "AND status = 'IN_PROGRESS' AND \"endTime\" < :since"),
+    ("journey events in order", "idx_event_customer_journey_ts",
+     'SELECT * FROM "Event" WHERE "customerJourneyId" = :cj_id ORDER BY "timestamp"'),
+    ("process_event_usage: usage lookup", "idx_events_usage_lookup",
+     'SELECT id FROM "EventsUsage" WHERE "accountId" = :account_id AND pathname = :pathname '
+     'AND "eventType" = :event_type AND "xPath" = :x_path'),
+    ("upsert_friction lookup", "idx_journey_friction_lookup",
+     'SELECT id FROM "JourneyFriction" WHERE "journeyId" = :journey_key AND "eventName" = :event_name '
+     'AND url = :url AND "frictionType" = :friction_type'),
+    ("form usage lookup", "idx_form_usage_session_form",
+     'SELECT id FROM "FormUsage" WHERE "accountId" = :account_id AND "sessionId" = :session_id '
+     'AND pathname = :pathname AND "formHash" = :form_hash'),
+]
+
+PARAMS = {
+    "account_id": 1,
+    "session_id": "session",
+    "person_id": "person",
+    "journey_id": 1,
+    "journey_key": "1",
+    "cj_id": 1,
+    "pathname": "/",
+    "event_type": "click",
+    "x_path": "//a",
+    "event_name": "repeated",
+    "url": "/",
+    "friction_type": "REPEATED",
+    "form_hash": "hash",
+    "since": datetime(2000, 1, 1),
+    "until": datetime(2100, 1, 1),
+    "event_id": "event",
+}
+
+SQLITE_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\S+)')
+
+
+def _collect_index_names(node, found):
+    if isinstance(node, dict):
+        if "Index Name" in node:
+            found.add(node["Index Name"])
+        for value in node.values():
+            _collect_index_names(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_index_names(value, found)
+    return found
+
+
+def explain_indexes(session, sql: str, params: dict) -> set:
+    """Names of the indexes the planner uses for `sql`."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = session.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar()
+        return _collect_index_names(plan, set())
+    if dialect == "sqlite":
+        rows = session.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()
+        return {m.group(1) for row in rows for m in SQLITE_INDEX_RE.finditer(str(row[-1]))}
+    raise RuntimeError(f"Unsupported dialect for plan checks: {dialect}")
+
+
+def check_query_plans(session) -> list:
+    """Returns a list of (query name, expected index, indexes used) for every regression."""
+    failures = []
+    strict = session.get_bind().dialect.name == "postgresql"
+    try:
+        for name, expected_index, sql in HOT_QUERIES:
+            used = explain_indexes(session, sql, PARAMS)
+            if expected_index in used:
+                status = "ok"
+            elif used and not strict:
+                status = "warn"
+            else:
+                status = "FAIL"
+                failures.append((name, expected_index, used))
+            print(f"[{status}] {name}: expected {expected_index}, used {sorted(used) or 'no index'}")
+    finally:
+        session.rollback()  # drops SET LOCAL
+    return failures
+
+
+if __name__ == "__main__":
+    from app import app
+    from db import db
+
+    with app.app_context():
+        failures = check_query_plans(db.session)
+
+    if failures:
+        print(f"❌ {len(failures)} hot queries no longer use their index")
+        sys.exit(1)
+    print("✅ All hot queries use their indexes")
@@ -8,4 +8,25 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     S3_BUCKET_NAME = 'suggesty-screenshots'
     AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
-    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_KEY")
\ No newline at end of file
+    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_KEY")
+
+    # Reuse AI insights for an unchanged summary for this long (0 disables the cache)
+    INSIGHTS_CACHE_TTL_HOURS = int(os.getenv("INSIGHTS_CACHE_TTL_HOURS", "24"))
+
+    # Shared LLM client (services/llm_client.py); point LLM_BASE_URL at a local fake server in tests
+    LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+    # RawEvent months older than this are dropped once every pipeline stage has processed them (0 keeps everything)
+    RAW_EVENT_RETENTION_DAYS = int(os.getenv("RAW_EVENT_RETENTION_DAYS", "180"))
+
+    # Processed RawEvents older than this move to Parquet under RAW_EVENT_ARCHIVE_DIR (0 disables archiving)
+    RAW_EVENT_ARCHIVE_AFTER_DAYS = int(os.getenv("RAW_EVENT_ARCHIVE_AFTER_DAYS", "30"))
+    RAW_EVENT_ARCHIVE_DIR = os.getenv("RAW_EVENT_ARCHIVE_DIR", "archive/raw_events")
+
+    # Backlogs of at least EVENT_MATCHING_SHARD_MIN_EVENTS raw events are matched to journeys by this
+    # many processes, sharded by person (services/event_processor_sharded.py); 1 matches serially
+    EVENT_MATCHING_WORKERS = int(os.getenv("EVENT_MATCHING_WORKERS", "1"))
+    EVENT_MATCHING_SHARD_MIN_EVENTS = int(os.getenv("EVENT_MATCHING_SHARD_MIN_EVENTS", "5000"))
@@ -0,0 +1,11 @@
+-- Open page per session, carried between page-usage batches (services/page_usage.py)
+CREATE TABLE IF NOT EXISTS "PageSessionState" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "distinctId" VARCHAR(255),
+    "sessionId" VARCHAR(255),
+    "pathname" VARCHAR(512),
+    "timestamp" TIMESTAMP NOT NULL,
+    "updatedAt" TIMESTAMP DEFAULT now(),
+    CONSTRAINT "unique_page_session_state" UNIQUE ("accountId", "distinctId", "sessionId")
+);
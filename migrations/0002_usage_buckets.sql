@@ -0,0 +1,25 @@
+-- Hourly/daily usage rollups (repositories/usage_rollups.py)
+CREATE TABLE IF NOT EXISTS "PageUsageBucket" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "pathname" VARCHAR(512) NOT NULL,
+    "granularity" VARCHAR(10) NOT NULL,
+    "bucketStart" TIMESTAMP NOT NULL,
+    "totalTime" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "totalVisits" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP DEFAULT now(),
+    CONSTRAINT "unique_page_usage_bucket" UNIQUE ("accountId", "granularity", "bucketStart", "pathname")
+);
+
+CREATE TABLE IF NOT EXISTS "EventsUsageBucket" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "pathname" VARCHAR(512) NOT NULL,
+    "eventType" VARCHAR(255),
+    "xPath" VARCHAR(500),
+    "granularity" VARCHAR(10) NOT NULL,
+    "bucketStart" TIMESTAMP NOT NULL,
+    "totalEvents" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP DEFAULT now(),
+    CONSTRAINT "unique_events_usage_bucket" UNIQUE ("accountId", "granularity", "bucketStart", "pathname", "eventType", "xPath")
+);
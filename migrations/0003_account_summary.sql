@@ -0,0 +1,10 @@
+-- Materialized per-account dashboard summary (services/summary_cache.py)
+CREATE TABLE IF NOT EXISTS "AccountSummary" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL UNIQUE REFERENCES "Account"("id"),
+    "summary" JSON,
+    "dataVersion" INTEGER NOT NULL DEFAULT 0,
+    "summaryVersion" INTEGER,
+    "computedAt" TIMESTAMP,
+    "updatedAt" TIMESTAMP DEFAULT now()
+);
@@ -0,0 +1,4 @@
+-- Content-addressed AI insights cache (services/insights.py)
+ALTER TABLE "Insights" ADD COLUMN IF NOT EXISTS "inputHash" VARCHAR(64);
+ALTER TABLE "Insights" ADD COLUMN IF NOT EXISTS "model" VARCHAR;
+CREATE INDEX IF NOT EXISTS "ix_Insights_inputHash" ON "Insights" ("inputHash");
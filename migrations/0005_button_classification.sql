@@ -0,0 +1,9 @@
+-- Cached button labels, one per distinct element (services/button_classifier.py)
+CREATE TABLE IF NOT EXISTS "ButtonClassification" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "comparisonKey" TEXT NOT NULL,
+    "label" VARCHAR(100) NOT NULL,
+    "createdAt" TIMESTAMP DEFAULT now(),
+    CONSTRAINT "unique_button_classification" UNIQUE ("accountId", "comparisonKey")
+);
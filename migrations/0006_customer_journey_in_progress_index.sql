@@ -0,0 +1,5 @@
+-- Partial index for the stale in-progress journey sweep (services/event_processor_failed.py)
+-- CONCURRENTLY cannot run inside a transaction block; run this file with autocommit (psql -f).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_customer_journey_in_progress"
+    ON "CustomerJourney" ("accountId", "endTime")
+    WHERE "status" = 'IN_PROGRESS';
@@ -0,0 +1,33 @@
+-- Indexes for the pipeline's hot filters (declared in models/customer_journey.py).
+-- Verify with: python check_query_plans.py
+-- CONCURRENTLY cannot run inside a transaction block; run this file with autocommit (psql -f).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_account_ts"
+    ON "RawEvent" ("accountId", "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_session_ts"
+    ON "RawEvent" ("sessionId", "timestamp");
+
+-- Partial indexes over the unprocessed tail of each stage
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_pending_ideal_path"
+    ON "RawEvent" ("accountId", "timestamp") WHERE processed_ideal_path = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_pending_page_time"
+    ON "RawEvent" ("accountId", "distinctId", "sessionId", "timestamp") WHERE processed_page_time = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_pending_event_usage"
+    ON "RawEvent" ("accountId") WHERE processed_event_usage = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_raw_event_pending_form_usage"
+    ON "RawEvent" ("accountId", "timestamp") WHERE processed_form_usage = false;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_customer_journey_person_journey_status"
+    ON "CustomerJourney" ("personId", "journeyId", "status");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_event_customer_journey_ts"
+    ON "Event" ("customerJourneyId", "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_events_usage_lookup"
+    ON "EventsUsage" ("accountId", "pathname", "eventType", "xPath");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_journey_friction_lookup"
+    ON "JourneyFriction" ("journeyId", "eventName", "url", "frictionType");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_form_usage_session_form"
+    ON "FormUsage" ("accountId", "sessionId", "pathname", "formHash");
+
+ANALYZE "RawEvent";
+ANALYZE "CustomerJourney";
+ANALYZE "Event";
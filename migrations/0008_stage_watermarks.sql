@@ -0,0 +1,54 @@
+-- Per-account, per-stage watermarks replace the RawEvent.processed_* flags (repositories/watermarks.py).
+-- Run the pipeline right before this migration so every stage is drained; the seeded watermark
+-- is the last event before each stage's first unprocessed one, so anything after it is reprocessed.
+
+ALTER TABLE "RawEvent" ADD COLUMN IF NOT EXISTS "ingestedAt" TIMESTAMP;
+UPDATE "RawEvent" SET "ingestedAt" = COALESCE("timestamp", now() AT TIME ZONE 'utc') WHERE "ingestedAt" IS NULL;
+ALTER TABLE "RawEvent"
+    ALTER COLUMN "ingestedAt" SET DEFAULT (now() AT TIME ZONE 'utc'),
+    ALTER COLUMN "ingestedAt" SET NOT NULL;
+
+CREATE TABLE IF NOT EXISTS "StageWatermark" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "stage" VARCHAR(50) NOT NULL,
+    "lastIngestedAt" TIMESTAMP NOT NULL,
+    "lastEventId" VARCHAR(255) NOT NULL,
+    "updatedAt" TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    CONSTRAINT "unique_stage_watermark" UNIQUE ("accountId", "stage")
+);
+
+WITH flags AS (
+    SELECT "accountId", "ingestedAt", "id", 'ideal_path' AS stage, COALESCE(processed_ideal_path, false) AS done FROM "RawEvent"
+    UNION ALL
+    SELECT "accountId", "ingestedAt", "id", 'page_time', COALESCE(processed_page_time, false) FROM "RawEvent"
+    UNION ALL
+    SELECT "accountId", "ingestedAt", "id", 'event_usage', COALESCE(processed_event_usage, false) FROM "RawEvent"
+    UNION ALL
+    SELECT "accountId", "ingestedAt", "id", 'form_usage', COALESCE(processed_form_usage, false) FROM "RawEvent"
+), processed_prefix AS (
+    SELECT "accountId", stage, "ingestedAt", "id",
+           bool_and(done) OVER (PARTITION BY "accountId", stage ORDER BY "ingestedAt", "id") AS all_done
+    FROM flags
+)
+INSERT INTO "StageWatermark" ("accountId", "stage", "lastIngestedAt", "lastEventId", "updatedAt")
+SELECT DISTINCT ON ("accountId", stage) "accountId", stage, "ingestedAt", "id", now() AT TIME ZONE 'utc'
+FROM processed_prefix
+WHERE all_done
+ORDER BY "accountId", stage, "ingestedAt" DESC, "id" DESC
+ON CONFLICT ("accountId", "stage") DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS "idx_raw_event_account_ingested" ON "RawEvent" ("accountId", "ingestedAt", "id");
+
+DROP INDEX IF EXISTS "idx_raw_event_pending_ideal_path";
+DROP INDEX IF EXISTS "idx_raw_event_pending_page_time";
+DROP INDEX IF EXISTS "idx_raw_event_pending_event_usage";
+DROP INDEX IF EXISTS "idx_raw_event_pending_form_usage";
+
+ALTER TABLE "RawEvent"
+    DROP COLUMN IF EXISTS processed,
+    DROP COLUMN IF EXISTS processed_ideal_path,
+    DROP COLUMN IF EXISTS processed_friction,
+    DROP COLUMN IF EXISTS processed_page_time,
+    DROP COLUMN IF EXISTS processed_event_usage,
+    DROP COLUMN IF EXISTS processed_form_usage;
@@ -0,0 +1,46 @@
+-- Range-partition RawEvent by month of "ingestedAt" (services/raw_event_partitions.py).
+-- Stage scans filter on "ingestedAt" after their watermark, so they only touch the newest partitions,
+-- and retention drops whole months instead of DELETE-ing rows.
+-- Postgres requires the partition key in the primary key, so the key becomes ("id", "ingestedAt").
+-- Run while ingestion is paused; the copy rewrites the table once.
+
+BEGIN;
+
+ALTER TABLE "RawEvent" RENAME TO "RawEvent_unpartitioned";
+ALTER INDEX IF EXISTS "idx_raw_event_account_ts" RENAME TO "idx_raw_event_account_ts_old";
+ALTER INDEX IF EXISTS "idx_raw_event_session_ts" RENAME TO "idx_raw_event_session_ts_old";
+ALTER INDEX IF EXISTS "idx_raw_event_account_ingested" RENAME TO "idx_raw_event_account_ingested_old";
+
+CREATE TABLE "RawEvent" (LIKE "RawEvent_unpartitioned" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE ("ingestedAt");
+ALTER TABLE "RawEvent" ADD PRIMARY KEY ("id", "ingestedAt");
+ALTER TABLE "RawEvent" ADD FOREIGN KEY ("accountId") REFERENCES "Account"("id");
+
+-- One partition per month of existing data through two months ahead, plus a catch-all
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', COALESCE((SELECT min("ingestedAt") FROM "RawEvent_unpartitioned"), now()));
+    last_month DATE := date_trunc('month', now()) + INTERVAL '2 months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF "RawEvent" FOR VALUES FROM (%L) TO (%L)',
+            'RawEvent_p' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            month_start + INTERVAL '1 month'
+        );
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+END $$;
+CREATE TABLE IF NOT EXISTS "RawEvent_default" PARTITION OF "RawEvent" DEFAULT;
+
+CREATE INDEX "idx_raw_event_account_ts" ON "RawEvent" ("accountId", "timestamp");
+CREATE INDEX "idx_raw_event_session_ts" ON "RawEvent" ("sessionId", "timestamp");
+CREATE INDEX "idx_raw_event_account_ingested" ON "RawEvent" ("accountId", "ingestedAt", "id");
+
+INSERT INTO "RawEvent" SELECT * FROM "RawEvent_unpartitioned";
+DROP TABLE "RawEvent_unpartitioned";
+
+COMMIT;
+
+ANALYZE "RawEvent";
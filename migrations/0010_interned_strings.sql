@@ -0,0 +1,46 @@
+-- Per-account string dictionary for urls, xpaths and elements chains (repositories/interning.py).
+-- Event rows reference it by id; Event."elementsChain" is cleared once its id is set, while
+-- Event.url / "xPath" stay for the readers that filter on them.
+
+CREATE TABLE IF NOT EXISTS "InternedString" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "kind" VARCHAR(20) NOT NULL,
+    "valueHash" VARCHAR(64) NOT NULL,
+    "value" TEXT NOT NULL,
+    "createdAt" TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    CONSTRAINT "unique_interned_string" UNIQUE ("accountId", "kind", "valueHash")
+);
+
+ALTER TABLE "Event"
+    ADD COLUMN IF NOT EXISTS "urlId" INTEGER REFERENCES "InternedString"("id"),
+    ADD COLUMN IF NOT EXISTS "xPathId" INTEGER REFERENCES "InternedString"("id"),
+    ADD COLUMN IF NOT EXISTS "elementsChainId" INTEGER REFERENCES "InternedString"("id");
+
+-- Backfill: one dictionary row per distinct value, then point the events at it
+INSERT INTO "InternedString" ("accountId", "kind", "valueHash", "value")
+SELECT DISTINCT "accountId", kind, encode(sha256(convert_to(value, 'UTF8')), 'hex'), value
+FROM (
+    SELECT "accountId", 'url' AS kind, url AS value FROM "Event"
+    UNION
+    SELECT "accountId", 'xpath', "xPath" FROM "Event"
+    UNION
+    SELECT "accountId", 'elements_chain', "elementsChain" FROM "Event"
+) strings
+WHERE value IS NOT NULL AND value <> ''
+ON CONFLICT ("accountId", "kind", "valueHash") DO NOTHING;
+
+UPDATE "Event" e SET "urlId" = s."id"
+FROM "InternedString" s
+WHERE e."urlId" IS NULL AND s."accountId" = e."accountId" AND s.kind = 'url'
+  AND s."valueHash" = encode(sha256(convert_to(e.url, 'UTF8')), 'hex');
+
+UPDATE "Event" e SET "xPathId" = s."id"
+FROM "InternedString" s
+WHERE e."xPathId" IS NULL AND s."accountId" = e."accountId" AND s.kind = 'xpath'
+  AND s."valueHash" = encode(sha256(convert_to(e."xPath", 'UTF8')), 'hex');
+
+UPDATE "Event" e SET "elementsChainId" = s."id", "elementsChain" = NULL
+FROM "InternedString" s
+WHERE e."elementsChainId" IS NULL AND s."accountId" = e."accountId" AND s.kind = 'elements_chain'
+  AND s."valueHash" = encode(sha256(convert_to(e."elementsChain", 'UTF8')), 'hex');
@@ -0,0 +1,17 @@
+-- Drop-off attribution recorded when a CustomerJourney is marked FAILED (services/event_processor_failed.py).
+-- Journeys that failed before this migration are attributed by the next metrics run
+-- (record_missing_drop_offs), since the repeat reasons need their events.
+
+CREATE TABLE IF NOT EXISTS "JourneyDropOff" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "journeyId" INTEGER NOT NULL REFERENCES "Journey"("id"),
+    "customerJourneyId" INTEGER NOT NULL REFERENCES "CustomerJourney"("id"),
+    "sessionId" VARCHAR(255) NOT NULL,
+    "stepIndex" INTEGER NOT NULL,
+    "reasons" JSON,
+    "createdAt" TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    CONSTRAINT "unique_journey_drop_off" UNIQUE ("customerJourneyId")
+);
+
+CREATE INDEX IF NOT EXISTS "idx_journey_drop_off_journey_step" ON "JourneyDropOff" ("journeyId", "stepIndex");
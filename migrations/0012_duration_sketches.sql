@@ -0,0 +1,17 @@
+-- Completion-time and per-step time quantile sketches (services/duration_sketches.py), plus the
+-- p50/p90/p99 completion times on JourneyAnalytics. Existing completed journeys are folded in by
+-- the next metrics run, which rebuilds any journey whose sketch count is behind.
+
+CREATE TABLE IF NOT EXISTS "DurationSketch" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "journeyId" INTEGER NOT NULL REFERENCES "Journey"("id"),
+    "metric" VARCHAR(30) NOT NULL,
+    "stepId" INTEGER NOT NULL DEFAULT 0,
+    "digest" JSON NOT NULL,
+    "count" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    CONSTRAINT "unique_duration_sketch" UNIQUE ("journeyId", "metric", "stepId")
+);
+
+ALTER TABLE "JourneyAnalytics" ADD COLUMN IF NOT EXISTS "completionTimePercentiles" JSON;
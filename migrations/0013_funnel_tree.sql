@@ -0,0 +1,28 @@
+-- Materialized funnel tree (services/funnel_tree.py) read by /api/paths/build_funnel_tree, and
+-- each customer journey's position in it. Existing journeys are replayed into the tree by the
+-- next metrics run (ensure_funnel_tree).
+
+CREATE TABLE IF NOT EXISTS "FunnelTreeNode" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "journeyId" INTEGER NOT NULL REFERENCES "Journey"("id"),
+    "parentId" INTEGER REFERENCES "FunnelTreeNode"("id"),
+    "depth" INTEGER NOT NULL DEFAULT 0,
+    "keyHash" VARCHAR(64) NOT NULL,
+    "elementsChain" TEXT,
+    "url" TEXT,
+    "xPath" TEXT,
+    "pageTitle" TEXT,
+    "ideal" BOOLEAN NOT NULL DEFAULT FALSE,
+    "count" INTEGER NOT NULL DEFAULT 0,
+    "timeSum" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "timeCount" INTEGER NOT NULL DEFAULT 0,
+    "anomalyCount" INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT "unique_funnel_tree_child" UNIQUE ("journeyId", "parentId", "keyHash")
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS "unique_funnel_tree_root" ON "FunnelTreeNode" ("journeyId") WHERE "parentId" IS NULL;
+CREATE INDEX IF NOT EXISTS "idx_funnel_tree_journey_depth" ON "FunnelTreeNode" ("journeyId", "depth");
+
+ALTER TABLE "CustomerJourney" ADD COLUMN IF NOT EXISTS "funnelNodeId" INTEGER REFERENCES "FunnelTreeNode"("id");
+ALTER TABLE "CustomerJourney" ADD COLUMN IF NOT EXISTS "funnelLastEventAt" TIMESTAMP;
@@ -0,0 +1,55 @@
+-- Recompute runs of a journey template's matching (services/journey_recompute.py) and the shadow
+-- tables their journeys and events are written to before being swapped into CustomerJourney /
+-- Event in one transaction.
+
+CREATE TABLE IF NOT EXISTS "JourneyRecompute" (
+    "id" SERIAL PRIMARY KEY,
+    "accountId" INTEGER NOT NULL REFERENCES "Account"("id"),
+    "journeyId" INTEGER NOT NULL REFERENCES "Journey"("id"),
+    "rangeStart" TIMESTAMP,
+    "rangeEnd" TIMESTAMP,
+    "status" VARCHAR(20) NOT NULL DEFAULT 'RUNNING',
+    "lastIngestedAt" TIMESTAMP,
+    "lastEventId" VARCHAR(255),
+    "eventsReplayed" INTEGER NOT NULL DEFAULT 0,
+    "journeysRebuilt" INTEGER NOT NULL DEFAULT 0,
+    "error" TEXT,
+    "createdAt" TIMESTAMP DEFAULT NOW(),
+    "swappedAt" TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS "CustomerJourneyRecompute" (
+    "id" SERIAL PRIMARY KEY,
+    "recomputeId" INTEGER NOT NULL REFERENCES "JourneyRecompute"("id"),
+    "sessionId" VARCHAR(255) NOT NULL,
+    "personId" VARCHAR(36),
+    "status" VARCHAR(20) NOT NULL,
+    "completionType" VARCHAR(20),
+    "startTime" TIMESTAMP,
+    "endTime" TIMESTAMP,
+    "sessionStartTime" TIMESTAMP,
+    "totalSteps" INTEGER,
+    "currentStepIndex" INTEGER,
+    "liveId" INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS "idx_customer_journey_recompute_run" ON "CustomerJourneyRecompute" ("recomputeId");
+
+CREATE TABLE IF NOT EXISTS "EventRecompute" (
+    "id" SERIAL PRIMARY KEY,
+    "recomputeId" INTEGER NOT NULL REFERENCES "JourneyRecompute"("id"),
+    "customerJourneyRecomputeId" INTEGER NOT NULL REFERENCES "CustomerJourneyRecompute"("id"),
+    "accountId" INTEGER NOT NULL,
+    "personId" VARCHAR(36) NOT NULL,
+    "sessionId" VARCHAR(255) NOT NULL,
+    "eventType" VARCHAR(50) NOT NULL,
+    "url" VARCHAR(255) NOT NULL,
+    "xPath" VARCHAR(500),
+    "urlId" INTEGER,
+    "xPathId" INTEGER,
+    "elementsChainId" INTEGER,
+    "timestamp" TIMESTAMP NOT NULL,
+    "is_match" BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS "idx_event_recompute_run" ON "EventRecompute" ("recomputeId");
@@ -0,0 +1,30 @@
+-- Visits already counted in PageUsageBucket per open session (services/page_usage.py), so a
+-- session spanning two page-usage batches is one visit per page and bucket
+ALTER TABLE "PageSessionState" ADD COLUMN IF NOT EXISTS "countedVisits" JSON;
+
+-- The unique constraint on EventsUsageBucket let rows with a NULL eventType or xPath through
+-- twice. Merge those duplicates, then replace it with a unique index over the COALESCEd columns.
+UPDATE "EventsUsageBucket" b
+SET "totalEvents" = d."total"
+FROM (
+    SELECT MIN("id") AS "keepId", SUM("totalEvents") AS "total"
+    FROM "EventsUsageBucket"
+    GROUP BY "accountId", "granularity", "bucketStart", "pathname", COALESCE("eventType", ''), COALESCE("xPath", '')
+    HAVING COUNT(*) > 1
+) d
+WHERE b."id" = d."keepId";
+
+DELETE FROM "EventsUsageBucket" b
+USING "EventsUsageBucket" k
+WHERE k."id" < b."id"
+  AND k."accountId" = b."accountId"
+  AND k."granularity" = b."granularity"
+  AND k."bucketStart" = b."bucketStart"
+  AND k."pathname" = b."pathname"
+  AND COALESCE(k."eventType", '') = COALESCE(b."eventType", '')
+  AND COALESCE(k."xPath", '') = COALESCE(b."xPath", '');
+
+ALTER TABLE "EventsUsageBucket" DROP CONSTRAINT IF EXISTS "unique_events_usage_bucket";
+CREATE UNIQUE INDEX IF NOT EXISTS "unique_events_usage_bucket"
+    ON "EventsUsageBucket" ("accountId", "granularity", "bucketStart", "pathname",
+                            COALESCE("eventType", ''), COALESCE("xPath", ''));
@@ -0,0 +1,23 @@
+-- RawEvent's primary key became ("id", "ingestedAt") when it was partitioned (0009), so a
+-- redelivered PostHog event was stored a second time. "RawEventId" restores one row per event
+-- uuid: ingestion (routes/events.py) inserts the id here first and rejects duplicates.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS "RawEventId" (
+    "id" VARCHAR(255) PRIMARY KEY,
+    "accountId" INTEGER NOT NULL,
+    "ingestedAt" TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "ix_RawEventId_ingestedAt" ON "RawEventId" ("ingestedAt");
+
+-- Duplicates stored since 0009: keep the first arrival
+DELETE FROM "RawEvent" r
+USING "RawEvent" k
+WHERE k."id" = r."id" AND k."ingestedAt" < r."ingestedAt";
+
+INSERT INTO "RawEventId" ("id", "accountId", "ingestedAt")
+SELECT "id", "accountId", "ingestedAt" FROM "RawEvent"
+ON CONFLICT ("id") DO NOTHING;
+
+COMMIT;
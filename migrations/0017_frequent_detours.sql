@@ -0,0 +1,4 @@
+-- Frequent ordered detours between ideal steps (calculators/indirect.extract_frequent_detours),
+-- next to the per-url alternative clicks kept in "frequentAltPaths". Filled by the next metrics run.
+
+ALTER TABLE "JourneyAnalytics" ADD COLUMN IF NOT EXISTS "frequentDetours" JSON;
@@ -11,12 +11,26 @@ from .customer_journey import (
     JourneyLiveStatus,
     JourneyProgress,
     RawEvent,
+    RawEventId,
     JourneyAnalytics,
     Account,
     PageUsage,
+    PageSessionState,
     EventsUsage,
+    PageUsageBucket,
+    EventsUsageBucket,
     FormUsage,
     JourneyFriction,
+    AccountSummary,
+    ButtonClassification,
+    StageWatermark,
+    InternedString,
+    JourneyDropOff,
+    DurationSketch,
+    FunnelTreeNode,
+    JourneyRecompute,
+    CustomerJourneyRecompute,
+    EventRecompute,
     CompletionType,
     FrictionType
 )
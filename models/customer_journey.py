@@ -137,15 +137,28 @@ class CustomerJourney(db.Model):
     updated_at = db.Column("updatedAt", db.DateTime, default=db.func.current_timestamp())
     total_steps = db.Column("totalSteps", db.Integer, nullable=True)
     bounce = db.Column(db.Boolean, nullable=True)  # Set default value for bounce
-    friction_flags = db.Column("frictionFlags", db.Boolean, nullable=False)  # Set default value for bounce
+    friction_flags = db.Column("frictionFlags", db.Boolean, nullable=False, default=False)  # Set default value for bounce
     current_step_index = db.Column("currentStepIndex", db.Integer, nullable=True, default=0)  # Set default value for bounce
     last_status_change_at = db.Column("lastStatusChangeAt", db.DateTime, default=db.func.current_timestamp())
 
+    # Where this journey's path currently ends in the materialized funnel tree (services/funnel_tree.py)
+    funnel_node_id = db.Column("funnelNodeId", db.Integer, db.ForeignKey("FunnelTreeNode.id"), nullable=True)
+    funnel_last_event_at = db.Column("funnelLastEventAt", db.DateTime, nullable=True)
+
     # Relationships
     journey = db.relationship("Journey", back_populates="customer_journeys")
     events = db.relationship("Event", back_populates="customer_journey")
     progress = db.relationship("JourneyProgress", back_populates="customer_journey", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Stale-journey sweep (services/event_processor_failed.py) only ever looks at in-progress rows
+        db.Index('idx_customer_journey_in_progress', 'accountId', 'endTime',
+                 postgresql_where=db.text("status = 'IN_PROGRESS'"),
+                 sqlite_where=db.text("status = 'IN_PROGRESS'")),
+        # "Is this person already in this journey?" lookups in the matcher
+        db.Index('idx_customer_journey_person_journey_status', 'personId', 'journeyId', 'status'),
+    )
+
     def __init__(self, account_id, journey_id, session_id, start_time, end_time, current_step_index, session_start_time, total_steps=0, updated_at=None, person_id=None, status=JourneyStatusEnum.IN_PROGRESS, completion_type=None):
         self.account_id = account_id
         self.journey_id = journey_id
@@ -197,15 +210,36 @@ class Event(db.Model):
     url = db.Column(db.String(255), nullable=False)
     page_title = db.Column("pageTitle", db.String(255), nullable=False)
     element = db.Column(db.String(255), nullable=False)
-    elements_chain = db.Column("elementsChain", db.String(255))
+    elements_chain_value = db.Column("elementsChain", db.String(255))  # only rows written before elementsChainId
     x_path = db.Column("xPath", db.String(500), nullable=True) 
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     customer_journey_id = db.Column("customerJourneyId", db.Integer, db.ForeignKey("CustomerJourney.id"), nullable=False)
     is_match = db.Column(db.Boolean, default=False)  # Column to track if the event matches the journey step
 
+    # Interned strings (InternedString ids, see repositories/interning.py)
+    url_id = db.Column("urlId", db.Integer, db.ForeignKey("InternedString.id"), nullable=True)
+    x_path_id = db.Column("xPathId", db.Integer, db.ForeignKey("InternedString.id"), nullable=True)
+    elements_chain_id = db.Column("elementsChainId", db.Integer, db.ForeignKey("InternedString.id"), nullable=True)
+
     customer_journey = db.relationship("CustomerJourney", back_populates="events")
+    elements_chain_ref = db.relationship("InternedString", foreign_keys=[elements_chain_id], lazy="selectin")
+
+    __table_args__ = (
+        db.Index('idx_event_customer_journey_ts', 'customerJourneyId', 'timestamp'),
+    )
+
+    @property
+    def elements_chain(self):
+        if self.elements_chain_ref is not None:
+            return self.elements_chain_ref.value
+        return self.elements_chain_value
 
-    def __init__(self, account_id,session_id, event_type, url, page_title, element, elements_chain, x_path, customer_journey_id=None, timestamp=None, person_id=None, is_match=False):
+    @elements_chain.setter
+    def elements_chain(self, value):
+        self.elements_chain_value = value
+
+    def __init__(self, account_id,session_id, event_type, url, page_title, element, elements_chain, x_path, customer_journey_id=None, timestamp=None, person_id=None, is_match=False,
+                 url_id=None, x_path_id=None, elements_chain_id=None):
         self.account_id = account_id
         self.session_id = session_id
         self.event_type = event_type
@@ -218,6 +252,9 @@ class Event(db.Model):
         self.timestamp = timestamp or datetime.utcnow()
         self.person_id = person_id  # Now optional
         self.is_match = is_match  # Column to track if the event matches the journey step
+        self.url_id = url_id
+        self.x_path_id = x_path_id
+        self.elements_chain_id = elements_chain_id
 
 class RawEvent(db.Model):
     __tablename__ = 'RawEvent'
@@ -233,12 +270,27 @@ class RawEvent(db.Model):
     elements_chain = db.Column("elementsChain", db.Text, nullable=True)
     x_path = db.Column("xPath", db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, nullable=True)
-    processed = db.Column(db.Boolean, default=False)  # track if the event has been processed
-    processed_ideal_path = db.Column(db.Boolean, default=False)
-    processed_friction = db.Column(db.Boolean, default=False)
-    processed_page_time = db.Column(db.Boolean, default=False)
-    processed_event_usage = db.Column(db.Boolean, default=False)
-    processed_form_usage = db.Column(db.Boolean, default=False)
+    # Server-side arrival time; stage watermarks (StageWatermark) advance over (ingestedAt, id).
+    # In Postgres the table is partitioned by month of ingestedAt (migrations/0009), which
+    # requires it in the primary key; uniqueness of id alone is kept by RawEventId.
+    ingested_at = db.Column("ingestedAt", db.DateTime, primary_key=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_raw_event_account_ts', 'accountId', 'timestamp'),
+        db.Index('idx_raw_event_session_ts', 'sessionId', 'timestamp'),
+        # "everything after the watermark" scans of every stage
+        db.Index('idx_raw_event_account_ingested', 'accountId', 'ingestedAt', 'id'),
+    )
+
+class RawEventId(db.Model):
+    __tablename__ = 'RawEventId'
+
+    # One row per ingested PostHog event uuid. The partitioned RawEvent cannot enforce a unique id
+    # across its months, so ingestion inserts here first and a redelivered event is rejected.
+    # Rows are dropped with their RawEvent month (services/raw_event_partitions.apply_retention).
+    id = db.Column(db.String(255), primary_key=True)
+    account_id = db.Column("accountId", db.Integer, nullable=False)
+    ingested_at = db.Column("ingestedAt", db.DateTime, nullable=False, index=True)
 
 from cuid import cuid
 
@@ -254,10 +306,12 @@ class JourneyAnalytics(db.Model):
 
     # Total time to complete the journey (nullable if not completed)
     completion_time_ms = db.Column("completionTimeMs", db.Integer, nullable=True)
+    completion_time_percentiles = db.Column("completionTimePercentiles", db.JSON, nullable=True)  # {"p50", "p90", "p99"} in ms
     total_steps = db.Column("totalSteps", db.Integer, nullable=False)
     drop_off_distribution = db.Column("dropOffDistribution", db.JSON, nullable=True) # how many users dropped off at each step
     friction_score = db.Column("frictionScore", db.Float, nullable=False) # Normalized friction score (0-1 or 0-100)
     frequent_alt_paths = db.Column("frequentAltPaths", db.JSON, nullable=True) # JSON of frequent alternative paths the user took
+    frequent_detours = db.Column("frequentDetours", db.JSON, nullable=True)  # frequent ordered detours between ideal steps
     step_insights = db.Column("stepInsights", db.JSON, nullable=True) # Full funnel structure with ideal and alternative paths with counters/times
 
     calculated_at = db.Column("calculatedAt", db.DateTime, default=datetime.utcnow) # When the aggregation was run
@@ -298,6 +352,11 @@ class JourneyFriction(db.Model):
 
     account_id = db.Column("accountId", db.Integer, db.ForeignKey('Account.id'), nullable=False)
 
+    __table_args__ = (
+        # upsert_friction lookup
+        db.Index('idx_journey_friction_lookup', 'journeyId', 'eventName', 'url', 'frictionType'),
+    )
+
     def __init__(self, journey_id, event_name, url, event_details, session_id, friction_type, volume, user_dismissed, account_id, friction_rate=0.0):
         self.journey_id = journey_id
         self.event_name = event_name
@@ -320,6 +379,25 @@ class PageUsage(db.Model):
     total_visits = db.Column("totalVisits", db.Integer, default=0)
     updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
 
+class PageSessionState(db.Model):
+    __tablename__ = 'PageSessionState'
+
+    # The last page seen for a session in the previous page-usage batch ("open page").
+    # Its dwell time is only known once the next event of the session arrives.
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column("accountId", db.Integer, db.ForeignKey('Account.id'), nullable=False)
+    distinct_id = db.Column("distinctId", db.String(255), nullable=True)
+    session_id = db.Column("sessionId", db.String(255), nullable=True)
+    pathname = db.Column(db.String(512), nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    # [[granularity, bucket start, pathname], ...] visits of the session already counted in PageUsageBucket
+    counted_visits = db.Column("countedVisits", db.JSON, nullable=True)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('accountId', 'distinctId', 'sessionId', name='unique_page_session_state'),
+    )
+
 class EventsUsage(db.Model):
     __tablename__ = 'EventsUsage'
 
@@ -337,6 +415,44 @@ class EventsUsage(db.Model):
     __table_args__ = (
         db.UniqueConstraint('accountId', 'pathname', 'eventType', 'elementsChain', name='unique_event_usage'),
         db.Index('idx_events_usage_account_clicks', 'accountId', 'totalEvents'),
+        db.Index('idx_events_usage_lookup', 'accountId', 'pathname', 'eventType', 'xPath'),
+    )
+
+class PageUsageBucket(db.Model):
+    __tablename__ = 'PageUsageBucket'
+
+    # Hourly/daily rollup of PageUsage, written incrementally by the page usage stage
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column("accountId", db.Integer, db.ForeignKey('Account.id'), nullable=False)
+    pathname = db.Column(db.String(512), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # "hour" or "day"
+    bucket_start = db.Column("bucketStart", db.DateTime, nullable=False)
+    total_time = db.Column("totalTime", db.Float, nullable=False, default=0.0)  # seconds
+    total_visits = db.Column("totalVisits", db.Integer, nullable=False, default=0)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('accountId', 'granularity', 'bucketStart', 'pathname', name='unique_page_usage_bucket'),
+    )
+
+class EventsUsageBucket(db.Model):
+    __tablename__ = 'EventsUsageBucket'
+
+    # Hourly/daily rollup of EventsUsage, written incrementally by the event usage stage
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column("accountId", db.Integer, db.ForeignKey('Account.id'), nullable=False)
+    pathname = db.Column(db.String(512), nullable=False)
+    event_type = db.Column("eventType", db.String(255), nullable=True)
+    x_path = db.Column("xPath", db.String(500), nullable=True)
+    granularity = db.Column(db.String(10), nullable=False)  # "hour" or "day"
+    bucket_start = db.Column("bucketStart", db.DateTime, nullable=False)
+    total_events = db.Column("totalEvents", db.Integer, nullable=False, default=0)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # eventType / xPath can be NULL, and NULLs never conflict in a plain unique constraint
+        db.Index('unique_events_usage_bucket', account_id, granularity, bucket_start, pathname,
+                 func.coalesce(event_type, ''), func.coalesce(x_path, ''), unique=True),
     )
 
 class FormUsage(db.Model):
@@ -364,6 +480,11 @@ class FormUsage(db.Model):
     created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
     updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # per-event session/form lookup in detect_and_save_form_usage
+        db.Index('idx_form_usage_session_form', 'accountId', 'sessionId', 'pathname', 'formHash'),
+    )
+
 
 class Insights(db.Model):
     __tablename__ = 'Insights'
@@ -378,5 +499,212 @@ class Insights(db.Model):
     insights = db.Column(String, nullable=True)
     scope = db.Column(String, nullable=True)  # e.g., "Overall", "Form Usage", "Navigation"
 
+    # Cache key: hash of canonical summary + model + prompts (services/ai_client.insights_cache_key)
+    input_hash = db.Column("inputHash", String(64), nullable=True, index=True)
+    model = db.Column(String, nullable=True)
+
+    created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
+
+
+class AccountSummary(db.Model):
+    __tablename__ = 'AccountSummary'
+
+    # Materialized build_summary_for_account() result, refreshed at the end of each pipeline run.
+    # The summary is current while summaryVersion == dataVersion; writers bump dataVersion to invalidate it.
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False, unique=True)
+    summary = db.Column(db.JSON, nullable=True)
+    data_version = db.Column("dataVersion", Integer, nullable=False, default=0)
+    summary_version = db.Column("summaryVersion", Integer, nullable=True)
+    computed_at = db.Column("computedAt", db.DateTime, nullable=True)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class JourneyDropOff(db.Model):
+    __tablename__ = 'JourneyDropOff'
+
+    # Where a FAILED CustomerJourney dropped off, recorded once when it is marked FAILED
+    # (services/event_processor_failed.py); the metrics stage aggregates these rows.
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    journey_id = db.Column("journeyId", Integer, db.ForeignKey('Journey.id'), nullable=False)
+    customer_journey_id = db.Column("customerJourneyId", Integer, db.ForeignKey('CustomerJourney.id'), nullable=False)
+    session_id = db.Column("sessionId", String(255), nullable=False)
+    step_index = db.Column("stepIndex", Integer, nullable=False)  # last ideal step reached (clamped to the ideal path)
+    reasons = db.Column(db.JSON(none_as_null=True), nullable=True)  # [[element, url, session_id, repeat_count], ...]; NULL if none
+    created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('customerJourneyId', name='unique_journey_drop_off'),
+        db.Index('idx_journey_drop_off_journey_step', 'journeyId', 'stepIndex'),
+    )
+
+
+class DurationSketch(db.Model):
+    __tablename__ = 'DurationSketch'
+
+    # Mergeable quantile sketch (calculators/tdigest.py) of a journey's completion times, or of the
+    # time users take to reach one of its ideal steps; folded in as journeys complete
+    # (services/duration_sketches.py).
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    journey_id = db.Column("journeyId", Integer, db.ForeignKey('Journey.id'), nullable=False)
+    metric = db.Column(String(30), nullable=False)  # "completion_time" | "step_time"
+    step_id = db.Column("stepId", Integer, nullable=False, default=0)  # destination Step.id for step_time, else 0
+    digest = db.Column(db.JSON, nullable=False)  # TDigest.to_dict()
+    count = db.Column(Integer, nullable=False, default=0)  # durations folded in
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('journeyId', 'metric', 'stepId', name='unique_duration_sketch'),
+    )
+
+
+class FunnelTreeNode(db.Model):
+    __tablename__ = 'FunnelTreeNode'
+
+    # Prefix tree of every customer journey's clicks for a journey template, keyed by elements
+    # chain under each parent; one root row (depth 0) per template. Counters are only ever
+    # incremented, by the pipeline as events are appended (services/funnel_tree.py).
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    journey_id = db.Column("journeyId", Integer, db.ForeignKey('Journey.id'), nullable=False)
+    parent_id = db.Column("parentId", Integer, db.ForeignKey('FunnelTreeNode.id'), nullable=True)  # NULL for the root
+    depth = db.Column(Integer, nullable=False)
+    key_hash = db.Column("keyHash", String(64), nullable=False)  # sha256 hex of elements_chain
+    elements_chain = db.Column("elementsChain", db.Text, nullable=True)
+    url = db.Column(db.Text, nullable=True)  # path without scheme and host
+    x_path = db.Column("xPath", db.Text, nullable=True)
+    page_title = db.Column("pageTitle", db.Text, nullable=True)
+    ideal = db.Column(db.Boolean, nullable=False, default=False)
+    count = db.Column(Integer, nullable=False, default=0)
+    time_sum = db.Column("timeSum", db.Float, nullable=False, default=0.0)  # seconds since the previous click
+    time_count = db.Column("timeCount", Integer, nullable=False, default=0)
+    anomaly_count = db.Column("anomalyCount", Integer, nullable=False, default=0)  # slower than 1.5x the ideal time
+
+    __table_args__ = (
+        db.UniqueConstraint('journeyId', 'parentId', 'keyHash', name='unique_funnel_tree_child'),
+        db.Index('unique_funnel_tree_root', 'journeyId', unique=True,
+                 postgresql_where=db.text('"parentId" IS NULL'),
+                 sqlite_where=db.text('"parentId" IS NULL')),
+        db.Index('idx_funnel_tree_journey_depth', 'journeyId', 'depth'),
+    )
+
+
+class JourneyRecompute(db.Model):
+    __tablename__ = 'JourneyRecompute'
+
+    # One replay of a journey template's matching over a time range (services/journey_recompute.py).
+    # Its journeys and events are written to the shadow tables below and swapped into
+    # CustomerJourney / Event in one transaction.
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    journey_id = db.Column("journeyId", Integer, db.ForeignKey('Journey.id'), nullable=False)
+    range_start = db.Column("rangeStart", db.DateTime, nullable=True)  # journeys started at or after (NULL: all)
+    range_end = db.Column("rangeEnd", db.DateTime, nullable=True)      # and before (NULL: no bound)
+    status = db.Column(String(20), nullable=False, default="RUNNING")  # RUNNING, SWAPPED or FAILED
+    # The last RawEvent replayed, in (ingestedAt, id) order: the ideal_path watermark it caught up with
+    last_ingested_at = db.Column("lastIngestedAt", db.DateTime, nullable=True)
+    last_event_id = db.Column("lastEventId", String(255), nullable=True)
+    events_replayed = db.Column("eventsReplayed", Integer, nullable=False, default=0)
+    journeys_rebuilt = db.Column("journeysRebuilt", Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
     created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    swapped_at = db.Column("swappedAt", db.DateTime, nullable=True)
+
+
+class CustomerJourneyRecompute(db.Model):
+    __tablename__ = 'CustomerJourneyRecompute'
+
+    # Shadow CustomerJourney of a JourneyRecompute (status / completionType hold the enum names)
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    recompute_id = db.Column("recomputeId", Integer, db.ForeignKey('JourneyRecompute.id'), nullable=False)
+    session_id = db.Column("sessionId", String(255), nullable=False)
+    person_id = db.Column("personId", String(36), nullable=True)
+    status = db.Column(String(20), nullable=False)
+    completion_type = db.Column("completionType", String(20), nullable=True)
+    start_time = db.Column("startTime", db.DateTime, nullable=True)
+    end_time = db.Column("endTime", db.DateTime, nullable=True)
+    session_start_time = db.Column("sessionStartTime", db.DateTime, nullable=True)
+    total_steps = db.Column("totalSteps", Integer, nullable=True)
+    current_step_index = db.Column("currentStepIndex", Integer, nullable=True)
+    live_id = db.Column("liveId", Integer, nullable=True)  # its CustomerJourney once swapped in
+
+    __table_args__ = (
+        db.Index('idx_customer_journey_recompute_run', 'recomputeId'),
+    )
+
+
+class EventRecompute(db.Model):
+    __tablename__ = 'EventRecompute'
+
+    # Shadow Event of a JourneyRecompute, in a CustomerJourneyRecompute
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    recompute_id = db.Column("recomputeId", Integer, db.ForeignKey('JourneyRecompute.id'), nullable=False)
+    customer_journey_recompute_id = db.Column("customerJourneyRecomputeId", Integer,
+                                              db.ForeignKey('CustomerJourneyRecompute.id'), nullable=False)
+    account_id = db.Column("accountId", Integer, nullable=False)
+    person_id = db.Column("personId", String(36), nullable=False)
+    session_id = db.Column("sessionId", String(255), nullable=False)
+    event_type = db.Column("eventType", String(50), nullable=False)
+    url = db.Column(String(255), nullable=False)
+    x_path = db.Column("xPath", String(500), nullable=True)
+    url_id = db.Column("urlId", Integer, nullable=True)
+    x_path_id = db.Column("xPathId", Integer, nullable=True)
+    elements_chain_id = db.Column("elementsChainId", Integer, nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    is_match = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('idx_event_recompute_run', 'recomputeId'),
+    )
+
+
+class InternedString(db.Model):
+    __tablename__ = 'InternedString'
+
+    # Per-account dictionary of repeated strings (urls, xpaths, elements chains); rows are never
+    # updated or deleted, so an id can be cached for the life of the process.
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    kind = db.Column(String(20), nullable=False)  # "url" | "xpath" | "elements_chain"
+    value_hash = db.Column("valueHash", String(64), nullable=False)  # sha256 hex of value
+    value = db.Column(db.Text, nullable=False)
+    created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('accountId', 'kind', 'valueHash', name='unique_interned_string'),
+    )
+
+
+class StageWatermark(db.Model):
+    __tablename__ = 'StageWatermark'
+
+    # How far a pipeline stage got through an account's RawEvents: every event at or before
+    # (lastIngestedAt, lastEventId) has been processed by that stage. See repositories/watermarks.py.
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    stage = db.Column(String(50), nullable=False)
+    last_ingested_at = db.Column("lastIngestedAt", db.DateTime, nullable=False)
+    last_event_id = db.Column("lastEventId", String(255), nullable=False)
+    updated_at = db.Column("updatedAt", db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('accountId', 'stage', name='unique_stage_watermark'),
+    )
+
+
+class ButtonClassification(db.Model):
+    __tablename__ = 'ButtonClassification'
+
+    # One LLM label per distinct element, keyed by utils.element_chain_utils.get_comparison_key
+    id = db.Column(Integer, primary_key=True, autoincrement=True)
+    account_id = db.Column("accountId", Integer, db.ForeignKey('Account.id'), nullable=False)
+    comparison_key = db.Column("comparisonKey", db.Text, nullable=False)
+    label = db.Column(String(100), nullable=False)
+    created_at = db.Column("createdAt", db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('accountId', 'comparisonKey', name='unique_button_classification'),
+    )
@@ -3,7 +3,7 @@
 #
 # Standalone parser test:
 # - Parses a static elements_chain string
-# - Prints the JSON that would be sent to classify_button()
+# - Prints the JSON the button classifier sends for it
 
 import re
 import json
@@ -75,7 +75,8 @@ def parse_elements_chain(chain_str: str) -> List[Dict[str, Any]]:
 
 def payload_for_classifier(parsed_chain: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Build the minimal JSON you'd send to classify_button().
+    Build the minimal JSON the button classifier sends for one element
+    (utils.classify_click_events.classify_buttons_batch).
     Assumes the FIRST element is the clicked element.
     Uses the SECOND element (if exists) as 'parent_class'.
     """
@@ -113,7 +114,7 @@ if __name__ == "__main__":
     parsed = parse_elements_chain(SAMPLE_CHAIN)
     payload = payload_for_classifier(parsed)
 
-    print("=== Parsed first element payload (to send to classify_button) ===")
+    print("=== Parsed first element payload (sent to the button classifier) ===")
     print(json.dumps(payload, indent=2))
 
     # If you also want to see everything:
@@ -14,7 +14,10 @@ from services.page_usage import process_page_usage
 from services.event_usage import process_event_usage
 from services.form_usage import detect_and_save_form_usage
 from services.process_friction import process_friction
-from services.insights import generate_insights
+from services.insights import generate_insights_for_accounts
+from services.summary_cache import invalidate_account_summary, refresh_account_summary
+from services.raw_event_archive import archive_raw_events
+from services.raw_event_partitions import maintain_raw_event_partitions
 from models import Account  # adjust if your Account model is in another module
 
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +40,7 @@ def run_jobs(account_ids=None):
         # OR loop per account if needed
         for account in accounts:
             logger.info(f"➡️ Processing account {account.id}")
+            invalidate_account_summary(db.session, account.id)
 
             # 1. Raw events
             logger.info("Processing raw events...")
@@ -67,11 +71,23 @@ def run_jobs(account_ids=None):
             logger.info("Processing friction metrics...")
             process_friction(db.session, account_id=account.id)
 
-            # 8. Insights
-            logger.info("Processing insights...")
-            generate_insights(db.session, account_id=account.id)
+            # 8. Dashboard summary
+            logger.info("Refreshing dashboard summary...")
+            refresh_account_summary(db.session, account.id)
             continue
 
+        # 9. Insights, with the LLM calls for all accounts overlapping
+        logger.info("Processing insights...")
+        generate_insights_for_accounts(db.session, [account.id for account in accounts])
+
+        # 10. Archive old processed events to Parquet
+        logger.info("Archiving raw events...")
+        archive_raw_events(db.session, [account.id for account in accounts])
+
+        # 11. RawEvent partitions and retention
+        logger.info("Maintaining RawEvent partitions...")
+        maintain_raw_event_partitions(db.session)
+
         logger.info("✅ All jobs completed successfully.")
 
 if __name__ == "__main__":
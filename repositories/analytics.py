@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from models import JourneyAnalytics
 
@@ -15,8 +16,10 @@ def upsert_journey_analytics(
     total_steps: int,
     drop_off_distribution: dict,
     friction_score: float,
-    frequent_alt_paths: dict,
-    step_insights: dict
+    frequent_alt_paths: Dict[str, List[Tuple[str, float]]],
+    step_insights: dict,
+    completion_time_percentiles: dict = None,
+    frequent_detours: Optional[List[dict]] = None,
 ):
     ja = (session.query(JourneyAnalytics)
           .filter(JourneyAnalytics.journey_id == journey_id).first())
@@ -26,12 +29,14 @@ def upsert_journey_analytics(
         ja.total_completions = total_completions
         ja.indirect_rate = indirect_rate
         ja.completion_time_ms = completion_time_ms
+        ja.completion_time_percentiles = completion_time_percentiles
         ja.total_steps = total_steps
         ja.total_users = total_users
         ja.account_id = account_id
         ja.drop_off_distribution = drop_off_distribution
         ja.friction_score = friction_score
         ja.frequent_alt_paths = frequent_alt_paths
+        ja.frequent_detours = frequent_detours
         ja.step_insights = step_insights
         ja.updated_at = datetime.utcnow()
     else:
@@ -43,10 +48,12 @@ def upsert_journey_analytics(
             total_users=total_users,
             indirect_rate=indirect_rate,
             completion_time_ms=completion_time_ms,
+            completion_time_percentiles=completion_time_percentiles,
             total_steps=total_steps,
             drop_off_distribution=drop_off_distribution,
             friction_score=friction_score,
             frequent_alt_paths=frequent_alt_paths,
+            frequent_detours=frequent_detours,
             step_insights=step_insights,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
@@ -0,0 +1,58 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import exists, func
+from sqlalchemy.orm import Session
+from models import CustomerJourney, JourneyDropOff, JourneyStatusEnum, Step
+
+
+def fetch_ideal_step_counts(session: Session, journey_ids) -> Dict[int, int]:
+    """{journey_id: number of ideal path steps}."""
+    rows = (session.query(Step.journey_id, func.count(Step.id))
+            .filter(Step.journey_id.in_(list(journey_ids)))
+            .group_by(Step.journey_id)
+            .all())
+    return dict(rows)
+
+
+def fetch_unattributed_failures(session: Session, account_id: Optional[int] = None) -> List[int]:
+    """
+    Ids of FAILED customer journeys that have no JourneyDropOff row yet. Journeys that cannot be
+    attributed (no current step, or a template without ideal steps) are left out, so they are
+    not reloaded on every run.
+    """
+    q = (session.query(CustomerJourney.id)
+         .outerjoin(JourneyDropOff, JourneyDropOff.customer_journey_id == CustomerJourney.id)
+         .filter(CustomerJourney.status == JourneyStatusEnum.FAILED,
+                 JourneyDropOff.id.is_(None),
+                 CustomerJourney.current_step_index.isnot(None),
+                 exists().where(Step.journey_id == CustomerJourney.journey_id)))
+    if account_id:
+        q = q.filter(CustomerJourney.account_id == account_id)
+    return [cj_id for (cj_id,) in q.all()]
+
+
+def save_drop_offs(session: Session, drop_offs: List[JourneyDropOff]):
+    """Add drop-off rows, skipping journeys that already have one. Does not commit."""
+    if not drop_offs:
+        return
+    existing = {cj_id for (cj_id,) in
+                session.query(JourneyDropOff.customer_journey_id)
+                .filter(JourneyDropOff.customer_journey_id.in_([d.customer_journey_id for d in drop_offs]))
+                .all()}
+    session.add_all(d for d in drop_offs if d.customer_journey_id not in existing)
+
+
+def fetch_drop_off_counts(session: Session, journey_id: int) -> List[Tuple[int, str, int]]:
+    """[(step_index, session_id, count)] of the journey's drop-offs."""
+    return (session.query(JourneyDropOff.step_index, JourneyDropOff.session_id, func.count(JourneyDropOff.id))
+            .filter(JourneyDropOff.journey_id == journey_id)
+            .group_by(JourneyDropOff.step_index, JourneyDropOff.session_id)
+            .all())
+
+
+def fetch_drop_off_reasons(session: Session, journey_id: int) -> List[Tuple[int, list]]:
+    """[(step_index, reasons)] of the journey's drop-offs that have repeat reasons."""
+    return (session.query(JourneyDropOff.step_index, JourneyDropOff.reasons)
+            .filter(JourneyDropOff.journey_id == journey_id,
+                    JourneyDropOff.reasons.isnot(None))
+            .order_by(JourneyDropOff.id)
+            .all())
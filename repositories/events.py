@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List
 from sqlalchemy.orm import Session
 from models import Event, Step
 
@@ -7,6 +7,19 @@ def fetch_steps_for_journey(session: Session, journey_id: int) -> List[Step]:
             .filter(Step.journey_id == journey_id)
             .order_by(Step.created_at).all())
 
+def fetch_ideal_path(session: Session, journey_id: int) -> List[Dict[str, Any]]:
+    """The journey's admin-recorded steps in the dict form the calculators take."""
+    steps = fetch_steps_for_journey(session, journey_id)
+    return [{
+        "id": s.id,
+        "step": s.index,
+        "name": s.name,
+        "url": s.url,
+        "element": s.elements_chain,
+        "xPath": s.x_path,
+        "timestamp": s.created_at
+    } for s in steps]
+
 def fetch_events_for_customer_journey(session: Session, cj_id: str) -> List[Event]:
     return (session.query(Event)
             .filter(Event.customer_journey_id == cj_id)
@@ -0,0 +1,110 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import InternedString
+
+KINDS = ("url", "xpath", "elements_chain")
+
+# (account_id, kind, value_hash) -> id of committed InternedString rows, shared by every pool
+# in the process. Ids of rows inserted by a pool are only cached after a later run reads them back,
+# so a rolled-back insert can never leave a dangling id here.
+_PROCESS_CACHE: Dict[Tuple[int, str, str], int] = {}
+_PROCESS_CACHE_MAX = 200_000
+
+
+def value_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _remember(key, string_id):
+    if len(_PROCESS_CACHE) >= _PROCESS_CACHE_MAX:
+        _PROCESS_CACHE.clear()
+    _PROCESS_CACHE[key] = string_id
+
+
+class InternPool:
+    """
+    Maps an account's urls, xpaths and elements chains to InternedString ids, inserting new
+    strings as needed. One pool per job run; inserts are flushed but not committed.
+    """
+
+    def __init__(self, session: Session, account_id: int):
+        self.session = session
+        self.account_id = account_id
+        self._ids: Dict[Tuple[str, str], int] = {}  # (kind, value_hash) -> id
+
+    def intern_many(self, kind: str, values: Iterable[Optional[str]]) -> List[Optional[int]]:
+        """
+        Ids for `values` (None for empty values), with one SELECT for the uncached ones and one
+        INSERT for those not stored yet. Pass a whole batch's values rather than one at a time.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown interned string kind: {kind}")
+
+        values = list(values)
+        hashes = [value_hash(v) if v else None for v in values]
+        missing = {}
+        for v, h in zip(values, hashes):
+            if h is None or (kind, h) in self._ids:
+                continue
+            cached = _PROCESS_CACHE.get((self.account_id, kind, h))
+            if cached is not None:
+                self._ids[(kind, h)] = cached
+            else:
+                missing[h] = v
+
+        if missing:
+            found = (self.session.query(InternedString.value_hash, InternedString.id)
+                     .filter(InternedString.account_id == self.account_id,
+                             InternedString.kind == kind,
+                             InternedString.value_hash.in_(list(missing)))
+                     .all())
+            for h, string_id in found:
+                self._ids[(kind, h)] = string_id
+                _remember((self.account_id, kind, h), string_id)
+                missing.pop(h)
+            if missing:
+                self._insert_many(kind, missing)
+
+        return [self._ids[(kind, h)] if h else None for h in hashes]
+
+    def _insert_many(self, kind: str, missing: Dict[str, str]):
+        """Insert the value_hash -> value strings in one statement, one at a time if some already exist."""
+        rows = [{"account_id": self.account_id, "kind": kind, "value_hash": h, "value": v}
+                for h, v in missing.items()]
+        try:
+            with self.session.begin_nested():
+                inserted = self.session.execute(
+                    insert(InternedString).returning(InternedString.value_hash, InternedString.id), rows
+                ).all()
+            for h, string_id in inserted:
+                self._ids[(kind, h)] = string_id
+        except IntegrityError:
+            # some inserted concurrently by another worker
+            for h, v in missing.items():
+                self._ids[(kind, h)] = self._insert(kind, h, v)
+
+    def _insert(self, kind: str, h: str, value: str) -> int:
+        row = InternedString(account_id=self.account_id, kind=kind, value_hash=h, value=value)
+        try:
+            with self.session.begin_nested():
+                self.session.add(row)
+            return row.id
+        except IntegrityError:
+            # inserted concurrently by another worker
+            return (self.session.query(InternedString.id)
+                    .filter_by(account_id=self.account_id, kind=kind, value_hash=h)
+                    .scalar())
+
+
+def load_strings(session: Session, ids: Iterable[int]) -> Dict[int, str]:
+    """id -> value for the given InternedString ids."""
+    ids = list({i for i in ids if i is not None})
+    values: Dict[int, str] = {}
+    for start in range(0, len(ids), 5000):
+        values.update(session.query(InternedString.id, InternedString.value)
+                      .filter(InternedString.id.in_(ids[start:start + 5000]))
+                      .all())
+    return values
@@ -1,16 +1,126 @@
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 from collections import defaultdict
+from sqlalchemy import and_, case, func
 from sqlalchemy.orm import Session
-from models import Journey, CustomerJourney
+from models import Journey, CustomerJourney, Event, JourneyStatusEnum, CompletionType
+from repositories.interning import load_strings
 
-def fetch_journeys(session: Session, account_id: Optional[int]):
-    q = session.query(Journey).join(CustomerJourney)
+def fetch_journey_accounts(session: Session, journey_ids: List[int]) -> Dict[int, int]:
+    """{journey_id: account_id} for the given Journey ids."""
+    return dict(session.query(Journey.id, Journey.account_id).filter(Journey.id.in_(journey_ids)).all())
+
+def fetch_template_customer_journeys(session: Session, journey_id: int) -> list:
+    """
+    The template's customer journeys as column rows (id, journey_id, status, completion_type,
+    current_step_index, start_time, end_time), enough for build_event_frame without loading
+    CustomerJourney objects.
+    """
+    return (session.query(CustomerJourney.id, CustomerJourney.journey_id, CustomerJourney.status,
+                          CustomerJourney.completion_type, CustomerJourney.current_step_index,
+                          CustomerJourney.start_time, CustomerJourney.end_time)
+            .filter(CustomerJourney.journey_id == journey_id)
+            .order_by(CustomerJourney.id)
+            .all())
+
+def fetch_customer_journeys(session: Session, ids: List[int], chunk_size: int = 5000) -> List[CustomerJourney]:
+    journeys = []
+    for start in range(0, len(ids), chunk_size):
+        journeys.extend(session.query(CustomerJourney)
+                        .filter(CustomerJourney.id.in_(ids[start:start + chunk_size]))
+                        .all())
+    return journeys
+
+def fetch_completion_stats(session: Session, account_id: Optional[int]) -> Dict[int, Dict[str, int]]:
+    """
+    One GROUP BY over CustomerJourney: {journey_id: {"total", "completed", "indirect", "timed_completed"}},
+    timed_completed being the completions with both a start and an end time.
+    """
+    completed = CustomerJourney.status == JourneyStatusEnum.COMPLETED
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    q = (session.query(
+            CustomerJourney.journey_id,
+            func.count(CustomerJourney.id),
+            count_if(completed),
+            count_if(and_(completed, CustomerJourney.completion_type == CompletionType.INDIRECT)),
+            count_if(and_(completed, CustomerJourney.start_time.isnot(None), CustomerJourney.end_time.isnot(None))))
+         .join(Journey, Journey.id == CustomerJourney.journey_id)
+         .group_by(CustomerJourney.journey_id))
     if account_id:
         q = q.filter(Journey.account_id == account_id)
-    return q.all()
+    return {
+        journey_id: {"total": total, "completed": done, "indirect": indirect, "timed_completed": timed}
+        for journey_id, total, done, indirect, timed in q.all()
+    }
+
+
+SAMPLE_BUCKETS = 10_000
+
+
+def _window_query(session: Session, journey_id: int, start: Optional[datetime], end: Optional[datetime],
+                  sample: float, *columns):
+    """CustomerJourneys of the template that started in [start, end], sampled by id."""
+    q = session.query(*columns).filter(CustomerJourney.journey_id == journey_id)
+    if start is not None:
+        q = q.filter(CustomerJourney.start_time >= start)
+    if end is not None:
+        q = q.filter(CustomerJourney.start_time <= end)
+    if sample < 1:
+        # deterministic: the same journeys are in the sample on every request
+        q = q.filter(CustomerJourney.id % SAMPLE_BUCKETS < int(sample * SAMPLE_BUCKETS))
+    return q
+
+
+def count_customer_journeys(session: Session, journey_id: int, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, sample: float = 1.0) -> int:
+    return _window_query(session, journey_id, start, end, sample, func.count(CustomerJourney.id)).scalar()
+
+
+def iter_customer_journey_chunks(session: Session, journey_id: int, start: Optional[datetime] = None,
+                                 end: Optional[datetime] = None, sample: float = 1.0,
+                                 limit: Optional[int] = None, chunk_size: int = 1000) -> Iterator[Tuple[list, Dict[int, list]]]:
+    """
+    Stream a template's customer journeys, newest first, as (journeys, events) chunks of at most
+    `chunk_size` journeys: journey rows (id, session_id, person_id, status, updated_at, start_time,
+    end_time) and {customer journey id: event rows (url, page_title, x_path, elements_chain,
+    timestamp) in timestamp order}. Only one chunk is held at a time; stops after `limit` journeys.
+    """
+    columns = (CustomerJourney.id, CustomerJourney.session_id, CustomerJourney.person_id,
+               CustomerJourney.status, CustomerJourney.updated_at, CustomerJourney.start_time,
+               CustomerJourney.end_time)
+    remaining = limit
+    last_id = None
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        q = _window_query(session, journey_id, start, end, sample, *columns)
+        if last_id is not None:
+            q = q.filter(CustomerJourney.id < last_id)
+        journeys = q.order_by(CustomerJourney.id.desc()).limit(size).all()
+        if not journeys:
+            return
+
+        event_rows = (session.query(Event.customer_journey_id, Event.url, Event.page_title, Event.x_path,
+                                    Event.elements_chain_value, Event.elements_chain_id, Event.timestamp)
+                      .filter(Event.customer_journey_id.in_([j.id for j in journeys]))
+                      .order_by(Event.customer_journey_id, Event.timestamp, Event.id)
+                      .all())
+        chains = load_strings(session, (r.elements_chain_id for r in event_rows))
+        events: Dict[int, list] = defaultdict(list)
+        for r in event_rows:
+            events[r.customer_journey_id].append({
+                "url": r.url,
+                "page_title": r.page_title,
+                "x_path": r.x_path,
+                "elements_chain": chains.get(r.elements_chain_id, r.elements_chain_value),
+                "timestamp": r.timestamp,
+            })
 
-def group_customer_journeys_by_journey_id(journeys) -> Dict[int, List[CustomerJourney]]:
-    grouped = defaultdict(list)
-    for j in journeys:
-        grouped[j.id].extend(j.customer_journeys)
-    return grouped
+        yield journeys, events
+        last_id = journeys[-1].id
+        if remaining is not None:
+            remaining -= len(journeys)
+        if len(journeys) < size:
+            return
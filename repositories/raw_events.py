@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import RawEventId
+
+
+def claim_raw_event_id(session: Session, event_id: str, account_id: int, ingested_at: datetime) -> bool:
+    """
+    Record that the PostHog event `event_id` is being ingested. Returns False, writing nothing,
+    if it already was (a redelivery). Does not commit.
+    """
+    try:
+        with session.begin_nested():
+            session.add(RawEventId(id=event_id, account_id=account_id, ingested_at=ingested_at))
+    except IntegrityError:
+        return False
+    return True
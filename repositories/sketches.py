@@ -0,0 +1,42 @@
+from typing import Dict, Tuple
+from sqlalchemy.orm import Session
+from calculators.tdigest import TDigest
+from models import DurationSketch
+
+COMPLETION_TIME = "completion_time"
+STEP_TIME = "step_time"
+
+SketchKey = Tuple[int, str, int]  # (journey_id, metric, step_id)
+
+
+def fold_into_sketch(session: Session, account_id: int, key: SketchKey, digest: TDigest, count: int):
+    """Merge `digest` (summarizing `count` durations) into the stored sketch. Does not commit."""
+    journey_id, metric, step_id = key
+    row = (session.query(DurationSketch)
+           .filter_by(journey_id=journey_id, metric=metric, step_id=step_id)
+           .with_for_update()
+           .first())
+    if row is None:
+        session.add(DurationSketch(account_id=account_id, journey_id=journey_id, metric=metric,
+                                   step_id=step_id, digest=digest.to_dict(), count=count))
+        return
+    stored = TDigest.from_dict(row.digest)
+    stored.merge(digest)
+    row.digest = stored.to_dict()
+    row.count += count
+
+
+def replace_sketches(session: Session, account_id: int, journey_id: int, digests: Dict[SketchKey, Tuple[TDigest, int]]):
+    """Replace every sketch of the journey with `digests`. Does not commit."""
+    session.query(DurationSketch).filter_by(journey_id=journey_id).delete(synchronize_session=False)
+    session.add_all(
+        DurationSketch(account_id=account_id, journey_id=j, metric=metric, step_id=step_id,
+                       digest=digest.to_dict(), count=count)
+        for (j, metric, step_id), (digest, count) in digests.items() if j == journey_id
+    )
+
+
+def fetch_sketches(session: Session, journey_id: int) -> Dict[Tuple[str, int], DurationSketch]:
+    """{(metric, step_id): DurationSketch} of the journey."""
+    rows = session.query(DurationSketch).filter_by(journey_id=journey_id).all()
+    return {(row.metric, row.step_id): row for row in rows}
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import PageUsageBucket, EventsUsageBucket
+
+GRANULARITIES = ("hour", "day")
+HOURLY_RETENTION = timedelta(days=14)  # daily buckets are kept forever
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def window_start(days: int, now: Optional[datetime] = None):
+    """
+    Pick the rollup granularity for a "last N days" window and return (granularity, since).
+    Short windows use hourly buckets, longer ones use day-aligned daily buckets.
+    """
+    now = now or datetime.utcnow()
+    granularity = "hour" if days <= 2 else "day"
+    return granularity, bucket_start(now - timedelta(days=days), granularity)
+
+
+def upsert_page_usage_buckets(session: Session, account_id: int, granularity: str, rows: Iterable[Dict]):
+    """
+    Add per-bucket page totals. Each row: {pathname, bucket_start, total_time, total_visits}.
+    Does not commit.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    existing = (session.query(PageUsageBucket)
+                .filter(PageUsageBucket.account_id == account_id,
+                        PageUsageBucket.granularity == granularity,
+                        PageUsageBucket.bucket_start.in_(list({r["bucket_start"] for r in rows})),
+                        PageUsageBucket.pathname.in_(list({r["pathname"] for r in rows})))
+                .all())
+    by_key = {(b.bucket_start, b.pathname): b for b in existing}
+
+    for r in rows:
+        bucket = by_key.get((r["bucket_start"], r["pathname"]))
+        if bucket is None:
+            bucket = PageUsageBucket(
+                account_id=account_id,
+                pathname=r["pathname"],
+                granularity=granularity,
+                bucket_start=r["bucket_start"],
+                total_time=0.0,
+                total_visits=0,
+            )
+            session.add(bucket)
+            by_key[(r["bucket_start"], r["pathname"])] = bucket
+        bucket.total_time += float(r["total_time"] or 0.0)
+        bucket.total_visits += int(r["total_visits"] or 0)
+        bucket.updated_at = datetime.utcnow()
+
+
+def upsert_events_usage_buckets(session: Session, account_id: int, granularity: str, counts: Dict[tuple, int]):
+    """
+    Add per-bucket event counts. `counts` maps (pathname, event_type, x_path, bucket_start) -> events.
+    Does not commit.
+    """
+    if not counts:
+        return
+
+    existing = (session.query(EventsUsageBucket)
+                .filter(EventsUsageBucket.account_id == account_id,
+                        EventsUsageBucket.granularity == granularity,
+                        EventsUsageBucket.bucket_start.in_(list({k[3] for k in counts})),
+                        EventsUsageBucket.pathname.in_(list({k[0] for k in counts})))
+                .all())
+    by_key = {(b.pathname, b.event_type, b.x_path, b.bucket_start): b for b in existing}
+
+    for key, total in counts.items():
+        bucket = by_key.get(key)
+        if bucket is None:
+            pathname, event_type, x_path, start = key
+            bucket = EventsUsageBucket(
+                account_id=account_id,
+                pathname=pathname,
+                event_type=event_type,
+                x_path=x_path,
+                granularity=granularity,
+                bucket_start=start,
+                total_events=0,
+            )
+            session.add(bucket)
+            by_key[key] = bucket
+        bucket.total_events += total
+        bucket.updated_at = datetime.utcnow()
+
+
+def prune_hourly_buckets(session: Session, account_id: int, now: Optional[datetime] = None):
+    cutoff = (now or datetime.utcnow()) - HOURLY_RETENTION
+    for model in (PageUsageBucket, EventsUsageBucket):
+        session.query(model).filter(
+            model.account_id == account_id,
+            model.granularity == "hour",
+            model.bucket_start < cutoff,
+        ).delete(synchronize_session=False)
+
+
+def query_page_usage_window(session: Session, account_id: int, days: int, limit: int = 20) -> List:
+    """Pages ordered by visits in the last `days` days: rows of (pathname, total_time, visits)."""
+    granularity, since = window_start(days)
+    visits = func.sum(PageUsageBucket.total_visits)
+    return (session.query(
+                PageUsageBucket.pathname.label("pathname"),
+                func.sum(PageUsageBucket.total_time).label("total_time"),
+                visits.label("visits"),
+            )
+            .filter(PageUsageBucket.account_id == account_id,
+                    PageUsageBucket.granularity == granularity,
+                    PageUsageBucket.bucket_start >= since)
+            .group_by(PageUsageBucket.pathname)
+            .order_by(visits.desc())
+            .limit(limit)
+            .all())
+
+
+def query_top_events_window(session: Session, account_id: int, days: int, limit: int = 5) -> List:
+    """Most used elements in the last `days` days: rows of (xpath, pathname, eventType, used)."""
+    granularity, since = window_start(days)
+    used = func.sum(EventsUsageBucket.total_events)
+    return (session.query(
+                EventsUsageBucket.x_path.label("xpath"),
+                EventsUsageBucket.pathname.label("pathname"),
+                EventsUsageBucket.event_type.label("eventType"),
+                used.label("used"),
+            )
+            .filter(EventsUsageBucket.account_id == account_id,
+                    EventsUsageBucket.granularity == granularity,
+                    EventsUsageBucket.bucket_start >= since)
+            .group_by(EventsUsageBucket.x_path, EventsUsageBucket.pathname, EventsUsageBucket.event_type)
+            .order_by(used.desc())
+            .limit(limit)
+            .all())
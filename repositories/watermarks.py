@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from models import RawEvent, StageWatermark
+
+STAGES = ("ideal_path", "page_time", "event_usage", "form_usage")
+
+# Rows younger than this are left for the next run: ingestedAt is assigned before commit,
+# so a row can become visible after a later-stamped one has already been read.
+SETTLE_DELAY = timedelta(seconds=30)
+
+
+def get_watermark(session: Session, account_id: int, stage: str) -> Optional[StageWatermark]:
+    return session.query(StageWatermark).filter_by(account_id=account_id, stage=stage).first()
+
+
+def pending_events(session: Session, account_id: int, stage: str, *columns, now: Optional[datetime] = None):
+    """
+    Query for the account's RawEvents that `stage` has not processed yet, in (ingestedAt, id) order.
+    Pass columns to select only those (RawEvent.ingested_at and RawEvent.id are needed to advance).
+    """
+    cutoff = (now or datetime.utcnow()) - SETTLE_DELAY
+    query = (session.query(*(columns or (RawEvent,)))
+             .filter(RawEvent.account_id == account_id, RawEvent.ingested_at <= cutoff))
+
+    watermark = get_watermark(session, account_id, stage)
+    if watermark:
+        # the plain range bound lets Postgres prune the monthly RawEvent partitions
+        query = query.filter(RawEvent.ingested_at >= watermark.last_ingested_at,
+                             tuple_(RawEvent.ingested_at, RawEvent.id)
+                             > tuple_(watermark.last_ingested_at, watermark.last_event_id))
+    return query.order_by(RawEvent.ingested_at, RawEvent.id)
+
+
+def advance_watermark(session: Session, account_id: int, stage: str, ingested_at: datetime, event_id: str):
+    """Move the stage's watermark forward to (ingested_at, event_id); never moves it back. Does not commit."""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    watermark = get_watermark(session, account_id, stage)
+    if watermark is None:
+        session.add(StageWatermark(account_id=account_id, stage=stage,
+                                   last_ingested_at=ingested_at, last_event_id=event_id))
+    elif (ingested_at, event_id) > (watermark.last_ingested_at, watermark.last_event_id):
+        watermark.last_ingested_at = ingested_at
+        watermark.last_event_id = event_id
+
+
+def reset_watermark(session: Session, account_id: int, stage: str) -> int:
+    """
+    Make the stage reprocess all of the account's events. Does not commit.
+    Returns how many events were behind the watermark.
+    """
+    watermark = get_watermark(session, account_id, stage)
+    if watermark is None:
+        return 0
+
+    count = (session.query(RawEvent)
+             .filter(RawEvent.account_id == account_id,
+                     tuple_(RawEvent.ingested_at, RawEvent.id)
+                     <= tuple_(watermark.last_ingested_at, watermark.last_event_id))
+             .count())
+    session.delete(watermark)
+    return count
@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from db import db
 from services.event_usage import process_event_usage
+from services.summary_cache import invalidate_account_summaries
 
 event_usage_blueprint = Blueprint("event_usage", __name__)
 
@@ -10,5 +11,6 @@ def process_event_usage_route():
     data = request.get_json(silent=True) or {}
     account_id = data.get("account_id")  # optional, None = all accounts
 
+    invalidate_account_summaries(db.session, [int(account_id)] if account_id else None)
     results = process_event_usage(db.session, account_id=account_id)
     return jsonify(results), 200
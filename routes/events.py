@@ -1,6 +1,8 @@
+from datetime import datetime
 from flask import request, jsonify, Blueprint
 from db import db
 from models.customer_journey import RawEvent, Account
+from repositories.raw_events import claim_raw_event_id
 from utils.element_chain_utils import elements_chain_to_xpath
 import re
 
@@ -53,6 +55,12 @@ def receive_posthog_event():
 
     print(f"[DEBUG] Processing event: {data.get('event')} | event_type: {event_type} | elements_chain length: {len(elements_chain) if elements_chain else 0}")
 
+    # PostHog redelivers events: the uuid is claimed in RawEventId first (the partitioned
+    # RawEvent table cannot enforce it), and a uuid already claimed is acknowledged, not stored
+    ingested_at = datetime.utcnow()
+    if not claim_raw_event_id(db.session, data.get("uuid"), account_id, ingested_at):
+        return jsonify({"status": "duplicate", "saved": 0}), 200
+
     raw_event = RawEvent(
         id=data.get("uuid"),
         session_id=data.get("session_id"),
@@ -64,7 +72,8 @@ def receive_posthog_event():
         current_url=normalized_current_url,  # Use normalized URL
         elements_chain=elements_chain,
         x_path=generated_xpath,
-        timestamp=data.get("timestamp")
+        timestamp=data.get("timestamp"),
+        ingested_at=ingested_at,
     )
 
     try:
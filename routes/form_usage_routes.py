@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from db import db
 from services.form_usage import detect_and_save_form_usage, reset_processed_form_usage
+from services.summary_cache import invalidate_account_summary
 
 form_usage_blueprint = Blueprint("form_usage", __name__)
 
@@ -13,6 +14,7 @@ def process_forms_route():
         return jsonify({"error": "Missing account_id"}), 400
 
     try:
+        invalidate_account_summary(db.session, int(account_id))
         processed_count = detect_and_save_form_usage(db.session, account_id=int(account_id))
         return jsonify({"message": f"Form usage analyzed", "processed": processed_count}), 200
     except Exception as e:
@@ -27,9 +29,10 @@ def reset_forms_route():
         return jsonify({"error": "Missing account_id"}), 400
 
     try:
+        invalidate_account_summary(db.session, int(account_id))
         reset_count = reset_processed_form_usage(db.session, account_id=int(account_id))
         return jsonify({
-            "message": f"Reset processed_form_usage flag for {reset_count} events",
+            "message": f"Reset form usage watermark, {reset_count} events will be reprocessed",
             "account_id": account_id,
             "events_reset": reset_count
         }), 200
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from db import db
 import datetime
 from services import process_friction
+from services.summary_cache import invalidate_account_summary
 
 friction_blueprint = Blueprint("friction", __name__)
 
@@ -32,8 +33,10 @@ def process_friction_route():
             return jsonify({"error": "Invalid end_time format. Use ISO format."}), 400
 
     try:
+        invalidate_account_summary(db.session, int(account_id))
         result = process_friction(db.session, account_id=int(account_id),
-                                  start_time=parsed_start_time, end_time=parsed_end_time)
+                                  start_time=parsed_start_time, end_time=parsed_end_time,
+                                  include_archive=bool(data.get("include_archive", False)))
         return jsonify({"message": "Friction processing completed successfully", **result}), 200
     except Exception as e:
         db.session.rollback()
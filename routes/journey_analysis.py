@@ -5,10 +5,8 @@ from flask import jsonify
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
-from mlxtend.frequent_patterns import apriori
-from mlxtend.preprocessing import TransactionEncoder
-import pandas as pd
 
+from calculators.itemsets import MAX_TRANSACTIONS, mine_frequent_itemsets
 from utils import compare_elements
 
 
@@ -27,31 +25,17 @@ def display_frequent_hidden_steps(filtered_paths, min_support=0.1):
     for journey in transactions:
         # processed_journey = [f"{event['url']}|{event['xpath']}" for event in journey]
         processed_journey = [f"{event['url']}|{event['elements_chain']}" for event in journey]
-        processed_transactions.append(processed_journey)    # Initialize the TransactionEncoder
+        processed_transactions.append(processed_journey)
 
-    # Use TransactionEncoder to convert the list of strings into a binary matrix
-    te = TransactionEncoder()
-    te_data = te.fit(processed_transactions).transform(processed_transactions)
-
-    # Create a DataFrame to view the result
-    df = pd.DataFrame(te_data, columns=te.columns_)
-
-    # Run the apriori algorithm to get the frequent itemsets
-    frequent_itemsets = apriori(df, min_support=min_support, use_colnames=True)
-
-    # Add a 'count' column by calculating the number of times each itemset appears
-    frequent_itemsets['count'] = frequent_itemsets['itemsets'].apply(
-        lambda x: sum([1 for journey in processed_transactions if set(x).issubset(journey)]))
-
-    # Convert frozensets to lists for JSON serialization
-    frequent_itemsets['itemsets'] = frequent_itemsets['itemsets'].apply(lambda x: list(x))
-
-    # Convert frequent_itemsets to a dictionary for JSON response
-    frequent_itemsets_dict = frequent_itemsets.to_dict(orient='records')
+    # FP-growth over integer-encoded steps, support counts come back with the itemsets
+    frequent_itemsets_dict = [
+        {"support": support, "itemsets": list(itemset), "count": count}
+        for itemset, count, support in mine_frequent_itemsets(processed_transactions, min_support)
+    ]
 
     # Show the resulting frequent itemsets along with their counts
-    print("\nFrequent Hidden Steps (with counts):")
-    print(frequent_itemsets)
+    print(f"\nFrequent Hidden Steps (with counts): {len(frequent_itemsets_dict)} itemsets "
+          f"from {min(len(processed_transactions), MAX_TRANSACTIONS)} paths")
 
     # Return the result as a JSON response
     return frequent_itemsets_dict
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from db import db
 from services.page_usage import process_page_usage
+from services.summary_cache import invalidate_account_summaries
 
 page_usage_blueprint = Blueprint("page_usage", __name__)
 
@@ -9,5 +10,6 @@ def process_page_usage_route():
     data = request.get_json(silent=True) or {}
     account_id = data.get("account_id")  # can be None
 
-    results = process_page_usage(db.session, account_ids=account_id)
+    invalidate_account_summaries(db.session, [int(account_id)] if account_id else None)
+    results = process_page_usage(db.session, account_id=account_id)
     return jsonify(results), 200
@@ -1,16 +1,20 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from db import db
 import re
-from sqlalchemy.orm import joinedload
-from models import CustomerJourney, Event, Step
-from urllib.parse import urlparse
+from repositories.journeys import count_customer_journeys, iter_customer_journey_chunks
+from services.funnel_tree import ANOMALY_FACTOR, fetch_funnel_tree_nodes, get_page_title, ideal_funnel_steps, is_ideal_click, trim_base_url
 paths_blueprint = Blueprint("ph_events", __name__)
 from datetime import datetime, timedelta
-from collections import Counter
+from collections import Counter, defaultdict
 from .journey_analysis import find_hidden_steps
+from utils.path_trie import PathTrie
 
 THRESHOLD_FAILURE_HOURS = 12  # After 12 hours, a journey is considered failed
 
+# Customer journeys analysed per request (?limit=, newest first); narrow with ?start=&end= or ?sample=
+DEFAULT_JOURNEY_LIMIT = 5000
+MAX_JOURNEY_LIMIT = 20000
+
 # Ideal journey structure with benchmark times (in seconds)
 # ideal_journey = {
 #     "/": {"elements_chain": "Import listings", "ideal_time": 5},
@@ -51,100 +55,76 @@ THRESHOLD_FAILURE_HOURS = 12  # After 12 hours, a journey is considered failed
 #
 # ]
 
-def get_page_title(page_title, trimmed_url):
-    return trimmed_url if page_title == 'N/A' else page_title
+def parse_journey_window(args):
+    """
+    Window of customer journeys to analyse from the query string:
+    start / end (ISO date or datetime, on the journey start time), sample (fraction in (0, 1])
+    and limit (at most MAX_JOURNEY_LIMIT). Raises ValueError on bad values.
+    """
+    start = datetime.fromisoformat(args["start"]) if args.get("start") else None
+    end = datetime.fromisoformat(args["end"]) if args.get("end") else None
+    if end is not None and len(args["end"]) == 10:
+        end += timedelta(days=1) - timedelta(microseconds=1)  # a bare date includes that whole day
+
+    sample = float(args.get("sample", 1))
+    if not 0 < sample <= 1:
+        raise ValueError("sample must be in (0, 1]")
 
-def get_journey_data(journey_id):
-    # Fetch the ideal journey (steps)
-    ideal_journey = db.session.query(Step).filter(Step.journey_id == journey_id).order_by(Step.created_at).all()
+    limit = int(args.get("limit", DEFAULT_JOURNEY_LIMIT))
+    if limit <= 0:
+        raise ValueError("limit must be positive")
 
-    # Initialize a list to hold the ideal journey with computed ideal_time
-    ideal_journey_data = []
-    previous_time = None
-    for step in ideal_journey:
-        # If this is the first step, set ideal_time to 0
-        if previous_time is None:
-            ideal_time = 0
-        else:
-            # Calculate the time difference (in seconds) between consecutive steps
-            time_diff = step.created_at - previous_time
-            ideal_time = time_diff.total_seconds()  # Convert time difference to seconds
-
-        elements_chain = step.elements_chain.split(";")[0]
-        # Parse the step.element JSON and extract the xpath
-        # element_data = json.loads(step.element)  # Parse the JSON string inside the 'element' field
-        # xpath = element_data.get("xpath")  # Access the 'xpath' field inside the parsed JSON
-
-        # Extract the base URL (protocol + domain) from the step.url
-        parsed_url = urlparse(step.url)
-        base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"  # Create the base URL using scheme and netloc
-
-        # Trim the base URL from the full URL, leaving only the relative path
-        trimmed_url = step.url.replace(base_url, "", 1)
-
-        # Add the step to the ideal journey dictionary
-        ideal_journey_data.append({
-            "url": trimmed_url,
-            "elements_chain": elements_chain,
-            "xpath": step.x_path,  # Include xpath from Step model
-            "ideal_time": ideal_time
-        })
-
-        # Update previous_time to the current step's created_at for the next iteration
-        previous_time = step.created_at
-
-    # Fetch user journeys related to the specific journey_id
-    user_journeys = (
-        db.session.query(CustomerJourney)
-        .options(joinedload(CustomerJourney.events))  # Efficient loading
-        .filter(CustomerJourney.journey_id == journey_id)
-        .all()
-    )
-
-    # Convert to JSON
+    return {"start": start, "end": end, "sample": sample, "limit": min(limit, MAX_JOURNEY_LIMIT)}
+
+def get_journey_data(journey_id, start=None, end=None, sample=1.0, limit=DEFAULT_JOURNEY_LIMIT):
+    # Fetch the ideal journey (steps) with their ideal times
+    ideal_journey_data = ideal_funnel_steps(db.session, journey_id)
+
+    # Fetch user journeys related to the specific journey_id, a chunk at a time (newest first)
     user_journeys_list = []
-    for journey in user_journeys:
-        events_dict = {}
-        for event in journey.events:
-            # Parse the element field as a JSON object
-            # element_data = json.loads(event.element)  # Parse the JSON string inside the 'element' field
-            # xpath = element_data.get("xpath")  # Extract the 'xpath' key
-
-            # Extract the base URL from the event URL
-            parsed_url = urlparse(event.url)
-            base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-            trimmed_url = event.url.replace(base_url, "", 1)  # Get the relative path
-
-            if trimmed_url not in events_dict:
-                events_dict[trimmed_url] = []
-
-            # Append the xpath and timestamp from Event model
-            events_dict[trimmed_url].append({
-                "elements_chain": event.elements_chain,
-                "xpath": event.x_path,  # Include xpath from Event model
-                "timestamp": event.timestamp.timestamp(),
-                "page_title": get_page_title(event.page_title, trimmed_url)
+    for journeys, events in iter_customer_journey_chunks(db.session, journey_id, start, end, sample, limit):
+        for journey in journeys:
+            events_dict = {}
+            for event in events.get(journey.id, []):  # already in timestamp order
+                trimmed_url = trim_base_url(event["url"])  # Get the relative path
+
+                if trimmed_url not in events_dict:
+                    events_dict[trimmed_url] = []
+
+                # Append the xpath and timestamp from Event model
+                events_dict[trimmed_url].append({
+                    "elements_chain": event["elements_chain"],
+                    "xpath": event["x_path"],  # Include xpath from Event model
+                    "timestamp": event["timestamp"].timestamp(),
+                    "page_title": get_page_title(event["page_title"], trimmed_url)
+                })
+
+            user_journeys_list.append({
+                "journey_id": journey.id,
+                "session_id": journey.session_id,
+                "user_id": str(journey.person_id),
+                "status": journey.status.value,
+                "events": events_dict,
+                "updated_at": journey.updated_at,
+                "start_time": journey.start_time,
+                "end_time": journey.end_time,
             })
 
-        # 🔥 Sort events for each page (trimmed_url) by timestamp before appending to final list
-        for page_url in events_dict:
-            events_dict[page_url].sort(key=lambda e: e["timestamp"])
-
-        user_journeys_list.append({
-            "journey_id": journey.id,
-            "session_id": journey.session_id,
-            "user_id": str(journey.person_id),
-            "status": journey.status.value,
-            "events": events_dict,
-            "updated_at": journey.updated_at,
-            "start_time": journey.start_time,
-            "end_time": journey.end_time,
-        })
+    total_journeys = count_customer_journeys(db.session, journey_id, start, end, sample)
 
     # Return as JSON response
     return {
         "ideal_journey": ideal_journey_data,
-        "user_journeys": user_journeys_list
+        "user_journeys": user_journeys_list,
+        "window": {
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "sample": sample,
+            "limit": limit,
+            "journeys_analyzed": len(user_journeys_list),
+            "journeys_matching": total_journeys,
+            "truncated": total_journeys > len(user_journeys_list),
+        },
     }
 
 def translate_elements_chain(elements_chain):
@@ -172,104 +152,151 @@ def translate_elements_chain(elements_chain):
     # Return original if no match found
     return elements_chain
 
-@paths_blueprint.route("/build_funnel_tree/<int:journey_id>", methods=["GET"])
-def build_funnel_tree(journey_id, journey_data=None):
-    if journey_data is None:
-        journey_data = get_journey_data(journey_id)
+def parse_tree_pruning(args):
+    """max_depth (clicks from the root, unlimited if absent) and min_count (default 1) from the query string."""
+    max_depth = int(args["max_depth"]) if args.get("max_depth") else None
+    min_count = int(args.get("min_count", 1))
+    if max_depth is not None and max_depth < 0:
+        raise ValueError("max_depth must not be negative")
+    return {"max_depth": max_depth, "min_count": min_count}
 
-    ideal_journey = journey_data["ideal_journey"]
-    user_journeys = journey_data["user_journeys"]
+def is_windowed(args):
+    """Does the request narrow the journeys (start / end / sample)? The materialized tree covers all of them."""
+    return any(args.get(name) for name in ("start", "end", "sample"))
 
+def funnel_tree_to_dict(trie, anomalies=None, max_depth=None, min_count=1):
+    """
+    Nested dict of a funnel PathTrie, children keyed by elements_chain (`anomalies`: {node id: elapsed times}),
+    down to `max_depth` clicks and without the nodes (and their subtrees) of fewer than `min_count` clicks.
+    """
     tree = {
         "name": "1",
         "url": "/",
         "elements_chain": "",
         "count": 0,
         "avg_time": 0,
-        "anomalies": [],
+        "anomaly_count": 0,
         "children": {}
     }
+    if anomalies is not None:
+        tree["anomalies"] = []
+
+    dicts = {}
+    for depth, parent, node in trie.walk():
+        if parent is None:
+            dicts[node] = tree
+            continue
+        if parent not in dicts or (max_depth is not None and depth > max_depth) or node.count < min_count:
+            continue  # pruned, or below a pruned node
+        child_node = {
+            "name": str(node.id),
+            "elements_chain": translate_elements_chain(node.elements_chain),
+            "xpath": node.xpath,
+            "url": node.url,
+            "pageTitle": node.page_title,
+            "count": node.count,
+            "avg_time": node.avg_time,
+            "anomaly_count": node.anomaly_count,
+            "children": {}
+        }
+        if anomalies is not None:
+            child_node["anomalies"] = anomalies.get(node.id, [])
+        if node.ideal:
+            child_node["ideal"] = True
+        dicts[parent]["children"][node.elements_chain] = child_node
+        dicts[node] = child_node
+    return tree
 
-    user_paths = []
+def read_funnel_tree(journey_id, max_depth=None, min_count=1):
+    """
+    The journey's funnel tree from the materialized FunnelTreeNode table (maintained by the
+    event pipeline), in the shape compute_funnel_tree returns; None if it has no tree yet.
+    """
+    nodes = fetch_funnel_tree_nodes(db.session, journey_id, max_depth, min_count)
+    if not nodes or nodes[0].parent_id is not None:
+        return None
+
+    trie = PathTrie()
+    by_id = {nodes[0].id: trie.root}
+    for row in nodes[1:]:
+        parent = by_id.get(row.parent_id)
+        if parent is None:  # below a pruned node
+            continue
+        node = trie.add(parent, row.elements_chain, id=row.id, url=row.url, xpath=row.x_path,
+                        elements_chain=row.elements_chain, page_title=row.page_title, ideal=row.ideal)
+        node.count, node.time_sum = row.count, row.time_sum
+        node.time_count, node.anomaly_count = row.time_count, row.anomaly_count
+        by_id[row.id] = node
+    # anomalies are only kept as counts here; the key stays for the shape of compute_funnel_tree
+    return funnel_tree_to_dict(trie, anomalies={})
+
+@paths_blueprint.route("/build_funnel_tree/<int:journey_id>", methods=["GET"])
+def build_funnel_tree(journey_id):
+    try:
+        pruning = parse_tree_pruning(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid tree pruning: {e}"}), 400
+    try:
+        window = parse_journey_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid journey window: {e}"}), 400
+
+    if not is_windowed(request.args):
+        tree = read_funnel_tree(journey_id, **pruning)
+        if tree is not None:
+            return tree
+
+    # Narrowed to a window, or not materialized yet: compute it from the journeys
+    return compute_funnel_tree(get_journey_data(journey_id, **window), **pruning)
+
+def compute_funnel_tree(journey_data, max_depth=None, min_count=1):
+    ideal_journey = journey_data["ideal_journey"]
+    user_journeys = journey_data["user_journeys"]
+
+    # first ideal time of each page
+    ideal_times = {}
+    for item in ideal_journey:
+        ideal_times.setdefault(item["url"], item["ideal_time"])
+
+    trie = PathTrie()
+    anomalies = defaultdict(list)
+    counter = 1
 
     for journey in user_journeys:
-        session_id = journey["journey_id"]
-        events = journey["events"]
         path = []
-        prev_timestamp = None
-
-        for page, event_list in events.items():
+        for page, event_list in journey["events"].items():
             for event in event_list:
-                elements_chain = event["elements_chain"]
-                xpath = event.get("xpath")  # Get xpath from event
-                timestamp = event["timestamp"]
-                page_url = page
-                page_title = get_page_title(event["page_title"], page_url)
-                path.append((elements_chain, xpath, timestamp, page_url, page_title))
+                path.append((event["elements_chain"], event.get("xpath"), event["timestamp"], page,
+                             get_page_title(event["page_title"], page)))
 
         # Sort the path by timestamp
-        path.sort(key=lambda x: x[2])  # Update index since we added xpath
-        user_paths.append((session_id, path))
-
-    counter = 1
+        path.sort(key=lambda x: x[2])
 
-    for session_id, path in user_paths:
-        node = tree
+        node = trie.root
         prev_timestamp = None
-
         for elements_chain, xpath, timestamp, page_url, page_title in path:
-            is_ideal = False
-
-            # Check if this event matches an ideal journey step using xpath or elements_chain
-            for ideal_event in ideal_journey:
-                url_match = ideal_event['url'] == page_url
-                # Prefer xpath matching, fallback to elements_chain
-                if xpath and ideal_event.get('xpath'):
-                    element_match = ideal_event['xpath'] == xpath
-                else:
-                    element_match = ideal_event['elements_chain'] == elements_chain
-                
-                if url_match and element_match:
-                    is_ideal = True
-                    break
-
-            if elements_chain not in node["children"]:
-                child_node = {
-                    "name": str(counter),
-                    "elements_chain": translate_elements_chain(elements_chain),
-                    "xpath": xpath,  # Include xpath in the node
-                    "url": page_url,
-                    "pageTitle": get_page_title(page_title, page_url),
-                    "count": 0,
-                    "avg_time": 0,
-                    "anomalies": [],
-                    "children": {}
-                }
-
-                if is_ideal:
-                    child_node["ideal"] = True
-
-                node["children"][elements_chain] = child_node
+            child = trie.find(node, elements_chain)
+            if child is None:
+                # Check if this event matches an ideal journey step using xpath or elements_chain
+                child = trie.add(node, elements_chain, id=counter, url=page_url, xpath=xpath,
+                                 elements_chain=elements_chain, page_title=page_title,
+                                 ideal=is_ideal_click(ideal_journey, page_url, elements_chain, xpath))
                 counter += 1
+            node = child
 
-            node = node["children"][elements_chain]
-            node["count"] += 1
-
+            elapsed_time = None
+            is_anomaly = False
             if prev_timestamp is not None:
                 elapsed_time = timestamp - prev_timestamp
-                ideal_time = next((item["ideal_time"] for item in ideal_journey if item["url"] == page_url), None)
-
-                if ideal_time is not None and elapsed_time > ideal_time * 1.5:
-                    node["anomalies"].append(elapsed_time)
-
-                if node["count"] == 1:
-                    node["avg_time"] = elapsed_time
-                else:
-                    node["avg_time"] = (node["avg_time"] * (node["count"] - 1) + elapsed_time) / node["count"]
+                ideal_time = ideal_times.get(page_url)
+                is_anomaly = ideal_time is not None and elapsed_time > ideal_time * ANOMALY_FACTOR
+                if is_anomaly:
+                    anomalies[node.id].append(elapsed_time)
+            node.record(elapsed_time, is_anomaly)
 
             prev_timestamp = timestamp
 
-    return tree
+    return funnel_tree_to_dict(trie, anomalies, max_depth, min_count)
 
 def calculate_average_completion_time(journeys):
     """
@@ -456,11 +483,18 @@ def find_repeated_clicks(user_journeys, min_repeats=3):
 # This API returns the data of the journey details
 @paths_blueprint.route("/journey/<int:journey_id>", methods=["GET"])
 def journey(journey_id):
+    try:
+        window = parse_journey_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid journey window: {e}"}), 400
+
     # Fetch journey data once
-    journey_data = get_journey_data(journey_id)
+    journey_data = get_journey_data(journey_id, **window)
 
-    # Generate funnel tree and summary
-    funnel_tree_data = build_funnel_tree(journey_id, journey_data)
+    # Generate funnel tree (materialized unless narrowed to a window) and summary
+    funnel_tree_data = None if is_windowed(request.args) else read_funnel_tree(journey_id)
+    if funnel_tree_data is None:
+        funnel_tree_data = compute_funnel_tree(journey_data)
 
     # unpack and get summaries from users journey data
     user_journeys = journey_data["user_journeys"]
@@ -485,7 +519,6 @@ def journey(journey_id):
 
     hidden_steps = find_hidden_steps(user_journeys, ideal_journey)
 
-    print(funnel_tree_data)
     # Return both in a single JSON response
     return jsonify({
         #"funnel_tree_new": tree_to_json(journey_tree),
@@ -497,14 +530,19 @@ def journey(journey_id):
             "users_completion_time": users_completion_time,
             "ideal_completion_time": ideal_completion_time,
         },
-        "hidden_step_impact": hidden_steps  # Added logistic regression insights
-
+        "hidden_step_impact": hidden_steps,  # Added logistic regression insights
+        "window": journey_data["window"],
     })
 
 @paths_blueprint.route("/journey/hidden_steps/<int:journey_id>", methods=["GET"])
 def get_hidden_steps(journey_id):
+    try:
+        window = parse_journey_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid journey window: {e}"}), 400
+
     # Fetch journey data once
-    journey_data = get_journey_data(journey_id)
+    journey_data = get_journey_data(journey_id, **window)
 
     # unpack and get summaries from users journey data
     user_journeys = journey_data["user_journeys"]
@@ -516,5 +554,6 @@ def get_hidden_steps(journey_id):
     # helpful_steps = prepare_and_analyze_journeys(user_journeys, funnel_tree_data)
     # Return both in a single JSON response
     return jsonify({
-        "hidden_step_impact": hidden_steps  # Added logistic regression insights
+        "hidden_step_impact": hidden_steps,  # Added logistic regression insights
+        "window": journey_data["window"],
     })
@@ -31,3 +31,40 @@ def process_and_fetch(account_id):
         return jsonify({
             "message": f"ℹ️ Skipped processing for account {account_id}"
         })
+
+
+@process_blueprint.route("/<int:account_id>/recompute", methods=["POST"])
+def recompute(account_id):
+    """
+    Rebuild a journey template's customer journeys after its steps were edited.
+    Body: {"journey_id": ..., "start": ISO date (optional), "end": ISO date (optional)}
+    """
+    from datetime import datetime
+    from db import db
+    from services.journey_recompute import run_recompute, start_recompute
+
+    body = request.get_json(silent=True) or {}
+    try:
+        journey_id = int(body["journey_id"])
+        start = datetime.fromisoformat(body["start"]) if body.get("start") else None
+        end = datetime.fromisoformat(body["end"]) if body.get("end") else None
+        run = start_recompute(db.session, account_id, journey_id, start, end)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid recompute request: {e}"}), 400
+
+    try:
+        run = run_recompute(db.session, run)
+    except Exception as e:
+        # the run is recorded as FAILED; hand back its id so it can be looked up
+        return jsonify({
+            "recompute_id": run.id,
+            "status": run.status,
+            "error": str(e),
+        }), 500
+
+    return jsonify({
+        "recompute_id": run.id,
+        "status": run.status,
+        "journeys_rebuilt": run.journeys_rebuilt,
+        "events_replayed": run.events_replayed,
+    })
@@ -1,7 +1,28 @@
-from flask import Blueprint, session, jsonify
+from flask import Blueprint, session, jsonify, request
+from db import db
+from services.button_classifier import classify_elements
 
 utils_blueprint = Blueprint('utils', __name__)
 @utils_blueprint.route("/clear_session", methods=["POST"])
 def clear_session():
     session.clear()  # Clears all session data
     return jsonify({"status": "Session cleared!"}), 200
+
+
+@utils_blueprint.route("/classify_elements", methods=["POST"])
+def classify_elements_route():
+    """
+    Label clicked elements, each distinct element classified once per account (cached).
+    Body: {"account_id": ..., "elements_chains": [...]}; returns {elements_chain: label}.
+    """
+    data = request.get_json(silent=True) or {}
+    account_id = data.get("account_id")
+    elements_chains = data.get("elements_chains")
+    if not account_id or not isinstance(elements_chains, list):
+        return jsonify({"error": "account_id and a list of elements_chains are required"}), 400
+
+    try:
+        return jsonify(classify_elements(db.session, int(account_id), elements_chains)), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
@@ -7,11 +7,20 @@ from sqlalchemy import func, text, desc, true
 from db import db
 import math
 from utils.url_utils import make_pretty_url
+from repositories.usage_rollups import query_page_usage_window, query_top_events_window
 
-def     get_page_usage(session: Session, account_id: int, limit: int = 20):
+def     get_page_usage(session: Session, account_id: int, limit: int = 20, days: int = None):
     """
     Fetch page usage stats for an account, ordered by total visits (desc).
+    Lifetime totals by default; with `days`, only the last N days (from the usage rollups).
     """
+    if days:
+        return [{
+            "page": make_pretty_url(row.pathname),
+            "avgTime": f"{row.total_time / row.visits:.0f}s" if row.visits and row.total_time else None,
+            "visits": int(row.visits or 0),
+        } for row in query_page_usage_window(session, account_id, days, limit)]
+
     rows = (
         session.query(PageUsage)
         .filter(PageUsage.account_id == account_id)
@@ -36,23 +45,11 @@ def     get_page_usage(session: Session, account_id: int, limit: int = 20):
 
 def get_top_fields(session: Session, account_id: int, days: int = 365, limit: int = 5):
     """
-    Aggregate EventsUsage for most-used fields (clicks/inputs).
-    Mirrors the UI logic.
+    Most-used fields (clicks/inputs) in the last `days` days.
+    Mirrors the UI logic. Reads the EventsUsageBucket rollups, so the window is
+    about when the events happened (not when the element was first seen).
     """
-    rows = (
-        session.query(
-            EventsUsage.x_path.label("xpath"),        # <-- use x_path
-            EventsUsage.pathname.label("pathname"),
-            EventsUsage.event_type.label("eventType"), # <-- use event_type
-            func.sum(EventsUsage.total_events).label("used"), # <-- use total_events
-        )
-        .filter(EventsUsage.account_id == account_id)
-        .filter(EventsUsage.created_at >= func.now() - text(f"INTERVAL '{days} days'"))
-        .group_by(EventsUsage.x_path, EventsUsage.pathname, EventsUsage.event_type)
-        .order_by(func.sum(EventsUsage.total_events).desc())
-        .limit(limit)
-        .all()
-    )
+    rows = query_top_events_window(session, account_id, days, limit)
 
 
     return [
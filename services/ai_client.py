@@ -1,40 +1,29 @@
 # services/ai_client.py
+import hashlib
+import json
 import os
-from openai import OpenAI
+from services.llm_client import get_llm_client
 
+MODEL = "llama-3.1-8b-instant"   # Groq-supported model
+TEMPERATURE = 0.5   # allow a bit more creativity for better narrative
+MAX_TOKENS = 1200
 
-def generate_ai_insights(summary: dict) -> str:
-    """
-    Send the summary JSON to Groq LLM and return HTML insights.
-    Requires environment variable GROQ_API_KEY.
-    """
-
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing GROQ_API_KEY environment variable")
-
-    # Groq provides an OpenAI-compatible API
-    client = OpenAI(
-        api_key=api_key,
-        base_url="https://api.groq.com/openai/v1"
-    )
+# System prompt to guide the LLM
+SYSTEM_PROMPT = (
+    "You are a Product Manager analyzing UX analytics data. "
+    "Your task is to write a structured, actionable report in HTML "
+    "that could be shown directly in a product analytics dashboard. "
+    "Do not simply restate numbers. Instead:\n"
+    "- Identify usage patterns (core vs. secondary features, ignored features).\n"
+    "- Highlight problems (low completion rates, high bounces, friction signals).\n"
+    "- Prioritize the 2–3 most critical issues.\n"
+    "- Call out 1–2 positive highlights.\n"
+    "- Suggest next steps (e.g., 'Simplify the budget form description field').\n"
+    "Format the output with <h2>, <h3>, <p>, <ul>, and <li> tags.\n"
+)
 
-    # System prompt to guide the LLM
-    system_prompt = (
-        "You are a Product Manager analyzing UX analytics data. "
-        "Your task is to write a structured, actionable report in HTML "
-        "that could be shown directly in a product analytics dashboard. "
-        "Do not simply restate numbers. Instead:\n"
-        "- Identify usage patterns (core vs. secondary features, ignored features).\n"
-        "- Highlight problems (low completion rates, high bounces, friction signals).\n"
-        "- Prioritize the 2–3 most critical issues.\n"
-        "- Call out 1–2 positive highlights.\n"
-        "- Suggest next steps (e.g., 'Simplify the budget form description field').\n"
-        "Format the output with <h2>, <h3>, <p>, <ul>, and <li> tags.\n"
-    )
-
-    # User prompt with summary JSON
-    user_prompt = f"""
+# User prompt with summary JSON
+USER_PROMPT_TEMPLATE = """
     Generate a concise, insightful report based on the following data.
     Format the output with <h2>, <h3>, <p>, <ul>, and <li> tags.
     Take into account that login and welcome pages are friquently used but not core features.
@@ -44,17 +33,54 @@ def generate_ai_insights(summary: dict) -> str:
     """
 
 
+class StubChatClient:
+    """Local stand-in for the LLM (tests / local runs without an API key)."""
+
+    def __init__(self, html="<h2>Insights</h2><p>Stub report.</p>"):
+        self.html = html
+        self.calls = []
+
+    def chat(self, messages, model=MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS, **extra) -> str:
+        self.calls.append(messages)
+        return self.html
+
+
+def get_default_client():
+    """Shared pooled LLM client (Groq, OpenAI-compatible API), or the stub if AI_INSIGHTS_STUB is set."""
+    if os.getenv("AI_INSIGHTS_STUB"):
+        return StubChatClient()
+    return get_llm_client()
+
+
+def canonical_summary(summary: dict) -> str:
+    """Stable JSON text for a summary: sorted keys, no whitespace."""
+    return json.dumps(summary, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def insights_cache_key(summary: dict, model: str = MODEL) -> str:
+    """Content hash of everything that determines the LLM output: summary, model and prompts."""
+    digest = hashlib.sha256()
+    for part in (canonical_summary(summary), model, SYSTEM_PROMPT, USER_PROMPT_TEMPLATE):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def generate_ai_insights(summary: dict, client=None) -> str:
+    """
+    Send the summary JSON to Groq LLM and return HTML insights.
+    Requires environment variable GROQ_API_KEY.
+    `client` is anything with a chat(messages, ...) method; defaults to the shared LLM client.
+    """
+    client = client or get_default_client()
+
     # Call the model
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",   # Groq-supported model
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
+    return client.chat(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(summary=summary)},
         ],
-        temperature=0.5,   # allow a bit more creativity for better narrative
-        max_tokens=1200,
+        model=MODEL,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
     )
-
-
-    # Extract first choice
-    return response.choices[0].message.content
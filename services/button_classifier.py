@@ -0,0 +1,70 @@
+# services/button_classifier.py
+from datetime import datetime
+from typing import Dict, Iterable
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import ButtonClassification
+from parse_element_chain import parse_elements_chain, payload_for_classifier
+from utils.classify_click_events import classify_buttons_batch
+from utils.element_chain_utils import get_comparison_key
+
+BATCH_SIZE = 25
+UNKNOWN_LABEL = "unknown"
+
+
+def _load_cached_labels(session: Session, account_id: int, keys) -> Dict[str, str]:
+    keys = list(keys)
+    labels = {}
+    for i in range(0, len(keys), 500):
+        rows = (session.query(ButtonClassification.comparison_key, ButtonClassification.label)
+                .filter(ButtonClassification.account_id == account_id,
+                        ButtonClassification.comparison_key.in_(keys[i:i + 500]))
+                .all())
+        labels.update({key: label for key, label in rows})
+    return labels
+
+
+def classify_elements(session: Session, account_id: int, elements_chains: Iterable[str],
+                      client=None, batch_size: int = BATCH_SIZE) -> Dict[str, str]:
+    """
+    Label clicked elements, classifying each distinct element once.
+    Chains are deduplicated by their comparison key (dynamic classes ignored), looked up in the
+    ButtonClassification cache, and only the misses are sent to the LLM, `batch_size` per request.
+    Returns {elements_chain: label}.
+    """
+    key_by_chain = {chain: get_comparison_key(chain) for chain in set(elements_chains) if chain}
+
+    # one representative chain per distinct element
+    chain_by_key = {}
+    for chain, key in key_by_chain.items():
+        if key:
+            chain_by_key.setdefault(key, chain)
+
+    labels = _load_cached_labels(session, account_id, chain_by_key.keys())
+    missing = [key for key in chain_by_key if key not in labels]
+    print(f"[DEBUG] Button classification for account {account_id}: "
+          f"{len(chain_by_key)} distinct elements, {len(missing)} not cached")
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i:i + batch_size]
+        payloads = [payload_for_classifier(parse_elements_chain(chain_by_key[key])) for key in batch]
+        batch_labels = classify_buttons_batch(payloads, client=client)
+
+        for key, label in zip(batch, batch_labels):
+            labels[key] = label
+            if label == UNKNOWN_LABEL:
+                continue
+            try:
+                with session.begin_nested():
+                    session.add(ButtonClassification(
+                        account_id=account_id,
+                        comparison_key=key,
+                        label=label,
+                        created_at=datetime.utcnow(),
+                    ))
+            except IntegrityError:
+                # another run classified the same element concurrently; its label wins next time
+                pass
+        session.commit()
+
+    return {chain: labels.get(key, UNKNOWN_LABEL) for chain, key in key_by_chain.items()}
@@ -0,0 +1,112 @@
+# services/duration_sketches.py
+# Completion-time and per-step time quantile sketches (DurationSketch, t-digests). Journeys are
+# folded in by process_raw_events in the transaction that completes them, so no duration is kept
+# or rescanned afterwards; the metrics stage only reads percentiles, and rebuilds a journey's
+# sketches from its completed journeys when their count disagrees (first run, lost updates).
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from calculators.event_frame import NO_CODE, build_event_frame
+from calculators.insights import match_ideal_transitions
+from calculators.tdigest import TDigest
+from models import DurationSketch, JourneyStatusEnum
+from models.customer_journey import CompletionType
+from repositories.events import fetch_ideal_path
+from repositories.journeys import fetch_customer_journeys
+from repositories.sketches import (
+    COMPLETION_TIME, STEP_TIME, SketchKey, fetch_sketches, fold_into_sketch, replace_sketches
+)
+
+
+def _timed_completions(frame) -> np.ndarray:
+    """Completed journeys with a start and end time (those calculate_completion_times counts)."""
+    return (frame.journey_mask(status=JourneyStatusEnum.COMPLETED)
+            & (frame.start_ms != NO_CODE) & (frame.end_ms != NO_CODE))
+
+
+def duration_digests(session: Session, frame, journey_mask: Optional[np.ndarray] = None) -> Dict[SketchKey, Tuple[TDigest, int]]:
+    """
+    Digests of the completion times of the completed journeys in `frame` (optionally restricted
+    to `journey_mask`) and of the time their direct completions took to reach each ideal step.
+    Returns {(journey_id, metric, step_id): (digest, number of durations)}.
+    """
+    if journey_mask is None:
+        journey_mask = np.ones(frame.n_journeys, dtype=bool)
+    digests: Dict[SketchKey, Tuple[TDigest, int]] = {}
+
+    def add(key, durations):
+        digest = TDigest()
+        digest.add_many(durations)
+        digests[key] = (digest, len(durations))
+
+    completed = journey_mask & _timed_completions(frame)
+    completion_ms = np.maximum(0, frame.end_ms - frame.start_ms).astype(np.float64)
+    for template_id in np.unique(frame.template_ids[completed]):
+        add((int(template_id), COMPLETION_TIME, 0), completion_ms[completed & (frame.template_ids == template_id)])
+
+    # Step times come from direct completions, as in the step insights
+    direct = journey_mask & frame.journey_mask(status=JourneyStatusEnum.COMPLETED,
+                                               completion_type=CompletionType.DIRECT)
+    for template_id in np.unique(frame.template_ids[direct]):
+        ideal_path = fetch_ideal_path(session, int(template_id))
+        _, _, matched, transition, durations = match_ideal_transitions(
+            ideal_path, frame, direct & (frame.template_ids == template_id))
+        if not len(matched):
+            continue
+        step_ids = np.array([step["id"] for step in ideal_path], dtype=np.int64)[transition]
+        step_durations = durations[matched]
+        for step_id in np.unique(step_ids):
+            add((int(template_id), STEP_TIME, int(step_id)), step_durations[step_ids == step_id])
+
+    return digests
+
+
+def record_completion_durations(session: Session, customer_journey_ids: List[int]) -> int:
+    """
+    Fold the durations of the given customer journeys (the ones that just completed) into the
+    stored sketches. Does not commit. Returns the number of completed journeys folded in.
+    """
+    journeys = [cj for cj in fetch_customer_journeys(session, list(customer_journey_ids))
+                if cj.status == JourneyStatusEnum.COMPLETED]
+    if not journeys:
+        return 0
+
+    frame = build_event_frame(session, journeys)
+    accounts = {cj.journey_id: cj.account_id for cj in journeys}
+    for key, (digest, count) in duration_digests(session, frame).items():
+        fold_into_sketch(session, accounts[key[0]], key, digest, count)
+    return len(journeys)
+
+
+def sync_duration_sketches(session: Session, account_id: int, journey_id: int, frame,
+                           journey_mask: np.ndarray, expected: Optional[int] = None) -> Dict[Tuple[str, int], DurationSketch]:
+    """
+    The journey's sketches, rebuilt from the completed journeys in `frame` (selected by
+    `journey_mask`) if they do not account for all `expected` timed completions (counted in
+    the frame if not given). Does not commit.
+    """
+    sketches = fetch_sketches(session, journey_id)
+    completion = sketches.get((COMPLETION_TIME, 0))
+    if expected is None:
+        expected = int((journey_mask & _timed_completions(frame)).sum())
+    if (completion.count if completion else 0) != expected:
+        replace_sketches(session, account_id, journey_id, duration_digests(session, frame, journey_mask))
+        session.flush()
+        sketches = fetch_sketches(session, journey_id)
+    return sketches
+
+
+def sketch_percentiles(sketches: Dict[Tuple[str, int], DurationSketch], ideal_path_steps: List[dict]):
+    """
+    (completion time percentiles or None, {(url, xPath) of a step: its step time percentiles}),
+    the percentiles being {"p50", "p90", "p99"} in ms.
+    """
+    completion = sketches.get((COMPLETION_TIME, 0))
+    completion_percentiles = TDigest.from_dict(completion.digest).percentiles() if completion else None
+
+    step_percentiles = {}
+    for step in ideal_path_steps:
+        sketch = sketches.get((STEP_TIME, step.get("id")))
+        if sketch is not None:
+            step_percentiles[(step["url"], step["xPath"])] = TDigest.from_dict(sketch.digest).percentiles()
+    return completion_percentiles, step_percentiles
@@ -1,19 +1,99 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from models import RawEvent, Event, Journey, CustomerJourney, JourneyLiveStatus, JourneyStatusEnum, Account
 from models.customer_journey import CompletionType
 from utils import compare_elements, urls_match_pattern  # Import URL utilities
+from repositories.watermarks import pending_events, advance_watermark
+from repositories.interning import InternPool
+from services.duration_sketches import record_completion_durations
+from services.funnel_tree import FunnelTreeUpdater
+from config import Config
 import pandas as pd
 import json
+from datetime import datetime
+from typing import List
+
+
+# Event id column, InternedString kind and raw event attribute of each interned event string
+EVENT_STRING_COLUMNS = (
+    ("url_id", "url", "current_url"),
+    ("x_path_id", "xpath", "x_path"),
+    ("elements_chain_id", "elements_chain", "elements_chain"),
+)
+
+
+def intern_event_strings(pool: InternPool, raw_events) -> List[dict]:
+    """Event id columns for each raw event's url, xpath and elements chain, interned once per kind."""
+    raw_events = list(raw_events)
+    ids = {column: pool.intern_many(kind, [getattr(e, attr) for e in raw_events])
+           for column, kind, attr in EVENT_STRING_COLUMNS}
+    return [{column: ids[column][i] for column in ids} for i in range(len(raw_events))]
+
+
+def new_event(raw_event, customer_journey_id: int, is_match: bool) -> Event:
+    """
+    The Event recording a raw event's click in a customer journey, without its interned string
+    ids; see add_new_events.
+    """
+    return Event(
+        account_id=raw_event.account_id,
+        person_id=raw_event.distinct_id,
+        page_title="",  # Can be filled later if needed
+        element="",  # Same here
+        event_type=raw_event.event_type,
+        elements_chain=None,  # stored once in InternedString
+        x_path=raw_event.x_path,  # Use stored XPath from RawEvent
+        url=raw_event.current_url,  # URL already normalized at entry point
+        customer_journey_id=customer_journey_id,
+        session_id=raw_event.session_id,
+        timestamp=raw_event.timestamp,
+        is_match=is_match
+    )
+
+
+def add_new_events(session: Session, intern_pool: InternPool, new_events: List[tuple]):
+    """Set the interned string ids of the (event, raw_event) pairs and add the events. Does not commit."""
+    string_ids = intern_event_strings(intern_pool, (raw_event for _, raw_event in new_events))
+    for (event, _), ids in zip(new_events, string_ids):
+        for column, string_id in ids.items():
+            setattr(event, column, string_id)
+    session.add_all(event for event, _ in new_events)
+
+
+def session_start_times(session: Session, account_id: int, raw_events) -> dict:
+    """Earliest RawEvent timestamp of each session the raw events belong to."""
+    batch_session_ids = list({event.session_id for event in raw_events if event.session_id})
+    return dict(
+        session.query(RawEvent.session_id, func.min(RawEvent.timestamp))
+        .filter(RawEvent.account_id == account_id, RawEvent.session_id.in_(batch_session_ids))
+        .group_by(RawEvent.session_id)
+        .all()
+    ) if batch_session_ids else {}
 
 
 # Function to process raw events and update customer journeys
-def process_raw_events(session: Session, account_id: int = None):
+def process_raw_events(session: Session, account_id: int = None, workers: int = None):
     """
     Process raw events.
     If account_id is given, only process events for that account.
     Otherwise, process all unprocessed events.
+    With more than one worker (default Config.EVENT_MATCHING_WORKERS), a backlog of at least
+    Config.EVENT_MATCHING_SHARD_MIN_EVENTS events is matched in parallel, sharded by person
+    (services/event_processor_sharded.py).
     """
 
+    # Progress is tracked per account (StageWatermark), so "all accounts" is one pass per account
+    if account_id is None:
+        for (acc_id,) in session.query(Account.id).all():
+            process_raw_events(session, account_id=acc_id, workers=workers)
+        return
+
+    workers = Config.EVENT_MATCHING_WORKERS if workers is None else workers
+    if workers > 1:
+        from services.event_processor_sharded import process_raw_events_sharded  # imports this module
+        if process_raw_events_sharded(session, account_id, workers):
+            return
+
     any_changes_made = False
 
     # STEP 1 — LOAD RAW EVENTS
@@ -21,11 +101,13 @@ def process_raw_events(session: Session, account_id: int = None):
     # First, we want to collect all raw events that haven’t been processed yet.
     # These are events that were recorded but haven’t been analyzed or assigned to any journey.
 
-    query = session.query(RawEvent).filter_by(processed_ideal_path=False)
+    pending_raw_events = pending_events(session, account_id, "ideal_path").all()
 
-    if account_id: query = query.filter(RawEvent.account_id == account_id)
-    
-    unprocessed_raw_events = query.order_by(RawEvent.timestamp).all()
+    # Journeys are matched in event time order, not arrival order
+    unprocessed_raw_events = sorted(
+        pending_raw_events,
+        key=lambda event: (event.timestamp is None, event.timestamp or datetime.min),
+    )
 
     # We use pandas here to make it easier to loop over and work with the data.
     # This creates a DataFrame (like an Excel table) where each row is an event.
@@ -40,7 +122,7 @@ def process_raw_events(session: Session, account_id: int = None):
         'raw_event_obj': event  # actual object we'll update later
     } for event in unprocessed_raw_events])
 
-    print(f"[DEBUG] Found {len(unprocessed_raw_events)} unprocessed raw events for account {account_id or 'ALL'}")
+    print(f"[DEBUG] Found {len(unprocessed_raw_events)} unprocessed raw events for account {account_id}")
 
     # STEP 2 — LOAD IDEAL JOURNEYS
 
@@ -70,6 +152,10 @@ def process_raw_events(session: Session, account_id: int = None):
 
     from collections import defaultdict
     cj_took_extra_steps = defaultdict(bool) # to monitor indirect success
+    completed_journey_ids = []  # folded into the duration sketches before the commit
+    intern_pool = InternPool(session, account_id)
+    new_events = []  # (event, raw_event); added once their strings are interned, after the loop
+    funnel_tree = FunnelTreeUpdater(session)  # counters flushed before the commit
     cj_seen_elements = defaultdict(set)
 
     # Now we iterate through each raw event that hasn't been processed yet.
@@ -78,18 +164,8 @@ def process_raw_events(session: Session, account_id: int = None):
     
     print(f"[DEBUG] Processing {len(raw_events_df)} raw events against {len(ideal_journeys_df)} ideal journeys")
     
-    # Cache earliest timestamp for each session_id
-    session_start_cache = (
-        session.query(RawEvent.session_id, RawEvent.timestamp)
-        .order_by(RawEvent.session_id, RawEvent.timestamp.asc())
-        .all()
-    )
-
-    # Convert to dict of session_id -> first timestamp
-    session_start_dict = {}
-    for sid, ts in session_start_cache:
-        if sid not in session_start_dict:
-            session_start_dict[sid] = ts
+    # Cache earliest timestamp for each session_id in this batch
+    session_start_dict = session_start_times(session, account_id, unprocessed_raw_events)
 
     for index, raw_event_row in raw_events_df.iterrows():
         # Accessing the original event object, and the values we need to compare
@@ -102,7 +178,6 @@ def process_raw_events(session: Session, account_id: int = None):
         # Skip pageview and pageleave events - they don't participate in journey matching
         if raw_event.event_type in ['pageview', 'pageleave', 'change', 'submit']:
             print(f"[INFO] Skipping {raw_event.event_type} event - not part of journey matching")
-            raw_event.processed_ideal_path = True
             any_changes_made = True
             continue
 
@@ -159,6 +234,7 @@ def process_raw_events(session: Session, account_id: int = None):
                 # Match found — start a new CustomerJourney
 
                 new_customer_journey = CustomerJourney(
+                    account_id=raw_event.account_id,
                     session_id=raw_event.session_id,
                     person_id=event_distinct_id,
                     journey_id=journey_id,
@@ -175,23 +251,11 @@ def process_raw_events(session: Session, account_id: int = None):
 
                 # Link raw_event to this journey
                 raw_event.customer_journey_id = new_customer_journey.id
-                raw_event.account_id = 1
 
                 # Create and link the first event (match = True)
-                event = Event(
-                    person_id=raw_event.distinct_id,
-                    page_title="",  # Can be filled later if needed
-                    element="",  # Same here
-                    event_type=raw_event.event_type,
-                    elements_chain=raw_event.elements_chain,
-                    x_path=raw_event.x_path,  # Use stored XPath from RawEvent
-                    url=raw_event.current_url,  # URL already normalized at entry point
-                    customer_journey_id=new_customer_journey.id,
-                    session_id=raw_event.session_id,
-                    timestamp=raw_event.timestamp,
-                    is_match=True
-                )
-                session.add(event)
+                event = new_event(raw_event, new_customer_journey.id, is_match=True)
+                new_events.append((event, raw_event))
+                funnel_tree.append(new_customer_journey, event, raw_event.elements_chain)
 
                 # Increment step index after successful first match
                 new_customer_journey.current_step_index = 1
@@ -203,7 +267,6 @@ def process_raw_events(session: Session, account_id: int = None):
 
         # If event was already handled in 3.1 (new journey started), skip processing it again in 3.2/3.3
         if event_handled:
-            raw_event.processed_ideal_path = True
             any_changes_made = True
             # print(f"[INFO] Skipping 3.2 and 3.3 — event {raw_event.id} already processed in 3.1")
             continue
@@ -221,7 +284,6 @@ def process_raw_events(session: Session, account_id: int = None):
         if not active_cjs_for_user and not event_handled:
             #and event.customer_journey_id not in [cj.journey_id for cj in active_cjs_for_user]:
             # print(f"[INFO] Skipping event {raw_event.id} — not part of any journey")
-            raw_event.processed_ideal_path = True
             any_changes_made = True
             continue  # Skip to next raw event
 
@@ -287,20 +349,9 @@ def process_raw_events(session: Session, account_id: int = None):
                 print(f"[DEBUG] Event does not match any remaining steps in the journey")
 
             # Create the event
-            event = Event(
-                person_id=raw_event.distinct_id,
-                page_title="",
-                element="",
-                event_type=raw_event.event_type,
-                elements_chain=raw_event.elements_chain,
-                x_path=raw_event.x_path,  # Use stored XPath from RawEvent
-                url=raw_event.current_url,  # URL already normalized at entry point
-                customer_journey_id=cj.id,
-                session_id=raw_event.session_id,
-                timestamp=raw_event.timestamp,
-                is_match=is_match
-            )
-            session.add(event)
+            event = new_event(raw_event, cj.id, is_match)
+            new_events.append((event, raw_event))
+            funnel_tree.append(cj, event, raw_event.elements_chain)
             print(f"[DEBUG] Created Event with is_match={is_match} for CustomerJourney {cj.id}")
 
             # If the event matches, update the journey state
@@ -325,6 +376,7 @@ def process_raw_events(session: Session, account_id: int = None):
                     cj.status = JourneyStatusEnum.COMPLETED
                     cj.end_time = raw_event.timestamp
                     cj.completion_type = CompletionType.DIRECT if not cj_took_extra_steps[cj.id] else CompletionType.INDIRECT
+                    completed_journey_ids.append(cj.id)
                     print(f"[INFO] Journey {cj.id} COMPLETED as {cj.completion_type}")
                 else:
                     print(f"[INFO] Journey {cj.id} progress: {cj.current_step_index}/{len(ideal_journey.steps)} steps completed")
@@ -343,9 +395,18 @@ def process_raw_events(session: Session, account_id: int = None):
             # Each event should only be processed against one active journey per user
             break
 
-                # Mark all events as processed at the end of each iteration
-        raw_event.processed_ideal_path = True
-        raw_event.account_id = 1
+        any_changes_made = True
+
+    # Events, funnel tree counters and completion / step times are written in the same transaction
+    add_new_events(session, intern_pool, new_events)
+    funnel_tree.flush()
+    if completed_journey_ids:
+        record_completion_durations(session, completed_journey_ids)
+
+    # Mark all loaded events as processed
+    if pending_raw_events:
+        last_event = pending_raw_events[-1]
+        advance_watermark(session, account_id, "ideal_path", last_event.ingested_at, last_event.id)
         any_changes_made = True
 
 
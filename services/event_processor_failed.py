@@ -1,31 +1,87 @@
 # services/event_processor_failed.py
 from datetime import datetime, timedelta
-from models import CustomerJourney, JourneyStatusEnum, Journey
+from typing import List
+import numpy as np
+from sqlalchemy import update
+from models import CustomerJourney, JourneyDropOff, JourneyStatusEnum
+from calculators.dropoffs import calculate_drop_off_attribution
+from calculators.event_frame import build_event_frame
+from repositories.dropoffs import fetch_ideal_step_counts, fetch_unattributed_failures, save_drop_offs
+from repositories.journeys import fetch_customer_journeys
 
-def evaluate_journey_failures(session, account_id=None, timeout_minutes=30):
+
+def mark_stale_journeys_failed(session, account_id=None, timeout_minutes=30) -> List[int]:
     """
-    Mark in-progress journeys as FAILED if they exceeded the timeout.
-    Optionally filter by account_id.
+    Set-based sweep: one UPDATE ... WHERE status = IN_PROGRESS AND endTime < threshold RETURNING id.
+    Served by the partial index idx_customer_journey_in_progress. Does not commit.
+    Returns the ids of the journeys marked FAILED.
     """
-    threshold = datetime.utcnow() - timedelta(minutes=timeout_minutes)
+    now = datetime.utcnow()
+    threshold = now - timedelta(minutes=timeout_minutes)
 
-    query = session.query(CustomerJourney).join(Journey).filter(
-        CustomerJourney.status == JourneyStatusEnum.IN_PROGRESS,
-        CustomerJourney.end_time < threshold
+    stmt = (
+        update(CustomerJourney)
+        .where(
+            CustomerJourney.status == JourneyStatusEnum.IN_PROGRESS,
+            CustomerJourney.end_time < threshold,
+        )
+        .values(
+            status=JourneyStatusEnum.FAILED,
+            last_status_change_at=now,
+            updated_at=now,
+        )
+        .returning(CustomerJourney.id)
     )
 
     if account_id:
-        query = query.filter(Journey.account_id == account_id)
+        stmt = stmt.where(CustomerJourney.account_id == account_id)
+
+    return [row[0] for row in session.execute(stmt, execution_options={"synchronize_session": False})]
+
+
+def record_drop_offs(session, customer_journey_ids: List[int], repeats_threshold: int = 3) -> int:
+    """
+    Store where each of the given (failed) customer journeys dropped off, with the repeated
+    interactions around that step, so the metrics stage does not replay their events.
+    Does not commit. Returns the number of JourneyDropOff rows added.
+    """
+    journeys = fetch_customer_journeys(session, customer_journey_ids)
+    if not journeys:
+        return 0
 
-    stale_journeys = query.all()
+    frame = build_event_frame(session, journeys)
+    step_counts = fetch_ideal_step_counts(session, set(frame.template_ids.tolist()))
+    total_steps = np.array([step_counts.get(int(t), 0) for t in frame.template_ids], dtype=np.int64)
 
-    updated_count = 0
-    for cj in stale_journeys:
-        cj.status = JourneyStatusEnum.FAILED
-        cj.failure_reason = 'timeout'
-        session.add(cj)
-        updated_count += 1
-        print(f"[FAILURE] Marked journey {cj.id} as FAILED")
+    drop_offs = []
+    for row, step_index, reasons in calculate_drop_off_attribution(frame, total_steps,
+                                                                   repeats_threshold=repeats_threshold):
+        journey = frame.journeys[row]
+        drop_offs.append(JourneyDropOff(
+            account_id=journey.account_id,
+            journey_id=journey.journey_id,
+            customer_journey_id=journey.id,
+            session_id=journey.session_id,
+            step_index=step_index,
+            reasons=[list(r) for r in reasons] or None,
+        ))
+    save_drop_offs(session, drop_offs)
+    return len(drop_offs)
 
+
+def record_missing_drop_offs(session, account_id=None) -> int:
+    """record_drop_offs() for FAILED journeys without a JourneyDropOff row (failed before it existed). Does not commit."""
+    return record_drop_offs(session, fetch_unattributed_failures(session, account_id))
+
+
+def evaluate_journey_failures(session, account_id=None, timeout_minutes=30):
+    """
+    Mark in-progress journeys as FAILED if they exceeded the timeout and record where they
+    dropped off. Optionally filter by account_id.
+    """
+    failed_ids = mark_stale_journeys_failed(session, account_id, timeout_minutes)
+    record_drop_offs(session, failed_ids)
     session.commit()
-    return updated_count
+
+    print(f"[FAILURE] Marked {len(failed_ids)} journeys as FAILED for account {account_id or 'ALL'}")
+    return len(failed_ids)
@@ -0,0 +1,261 @@
+# services/event_processor_sharded.py
+# Parallel journey matching for raw event backlogs. Matching is per person (a person's open
+# journeys only ever see that person's events), so the pending RawEvents are split by a stable
+# hash of distinct_id and each shard is matched by match_shard (a JourneyMatcher) in its own
+# process, on plain data and without database access. The main process then writes every
+# shard's new CustomerJourneys, Events and journey updates in one transaction, as
+# process_raw_events does.
+import json
+import zlib
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from config import Config
+from models import CustomerJourney, Journey, JourneyLiveStatus, JourneyStatusEnum
+from models.customer_journey import CompletionType
+from repositories.interning import InternPool
+from repositories.watermarks import pending_events, advance_watermark
+from services.duration_sketches import record_completion_durations
+from services.event_processor import add_new_events, new_event, session_start_times
+from services.funnel_tree import FunnelTreeUpdater
+from utils import urls_match_pattern
+
+SKIPPED_EVENT_TYPES = ('pageview', 'pageleave', 'change', 'submit')  # not part of journey matching
+
+_ID_CHUNK = 5000  # ids per IN (...) query
+
+# (journey id, (first step url, xpath) or None if unparsable, ((step url, xpath), ...) by creation time)
+Template = Tuple[int, Optional[Tuple[str, str]], Tuple[Tuple[str, str], ...]]
+# (position in the batch, raw event id, distinct_id, url, elements_chain, x_path, event_type)
+ShardEvent = Tuple[int, str, str, str, str, str, str]
+
+
+class ShardResult(NamedTuple):
+    new_journeys: List[Tuple[tuple, int, int]]   # (key, position of the starting event, journey template id)
+    events: List[Tuple[int, object, bool]]       # (position, key of its customer journey, is_match)
+    journeys: Dict[object, dict]                 # key -> final step index / completion / position of its last match
+
+
+def shard_of(distinct_id: Optional[str], shards: int) -> int:
+    """Stable shard of a person (the same in every process, unlike hash())."""
+    return zlib.crc32((distinct_id or "").encode("utf-8")) % shards
+
+
+class JourneyMatcher:
+    """
+    The matching rules of process_raw_events on plain data, without database access. Matching
+    state (the persons' open journeys) is kept between calls to match(), so a stream of events can
+    be matched a chunk at a time. Journeys started here are keyed ("new", n), others by id.
+    """
+
+    def __init__(self, templates: List[Template], open_journeys: List[Tuple[int, str, int, int]] = ()):
+        """`open_journeys`: the persons' in-progress journeys as (id, person id, template id, current step index)."""
+        self.templates = templates
+        self.templates_by_id = {template[0]: template for template in templates}
+        self.new_journeys = 0
+        # person -> in-progress journey states by template id (the order the serial matcher's
+        # person / journey index lookup returns them in; a person is in a template at most once)
+        self.active = defaultdict(list)
+        for cj_id, person_id, journey_id, step_index in open_journeys:
+            self.active[person_id].append({"key": cj_id, "journey_id": journey_id,
+                                           "current_step_index": step_index or 0,
+                                           "took_extra_steps": False, "seen": set()})
+
+    def match(self, events: List[ShardEvent]) -> ShardResult:
+        """Match the events, in the order given; positions in the result are the events' own."""
+        result = ShardResult([], [], {})
+        for position, _, person_id, url, elements_chain, xpath, event_type in events:
+            if event_type in SKIPPED_EVENT_TYPES:
+                continue
+            person_journeys = self.active[person_id]
+
+            # 3.1 — start of a new journey (for each template the person is not already in)
+            started = False
+            for journey_id, first_step, _ in self.templates:
+                if first_step is None or any(state["journey_id"] == journey_id for state in person_journeys):
+                    continue
+                first_step_url, first_step_xpath = first_step
+                if not (urls_match_pattern(url, first_step_url) and first_step_xpath and xpath
+                        and first_step_xpath == xpath):
+                    continue
+                key = ("new", self.new_journeys)
+                self.new_journeys += 1
+                state = {"key": key, "journey_id": journey_id, "current_step_index": 1,
+                         "took_extra_steps": False, "seen": set()}
+                person_journeys.append(state)
+                person_journeys.sort(key=lambda s: s["journey_id"])
+                result.new_journeys.append((key, position, journey_id))
+                result.events.append((position, key, True))
+                result.journeys[key] = {"current_step_index": 1, "completed": False, "indirect": False,
+                                        "position": position}
+                started = True
+            if started:
+                continue
+
+            # 3.3 — next (or a later) step of the first open journey that can still progress
+            tracking_key = xpath if xpath else elements_chain
+            for state in person_journeys:
+                template = self.templates_by_id.get(state["journey_id"])
+                if template is None:
+                    continue
+                steps = template[2]
+                step_index = state["current_step_index"]
+                if step_index >= len(steps):
+                    continue
+
+                def matches(step):
+                    return urls_match_pattern(url, step[0]) and step[1] and xpath and step[1] == xpath
+
+                matched_step_index = None
+                if matches(steps[step_index]):
+                    matched_step_index = step_index
+                else:
+                    matched_step_index = next((i for i in range(step_index + 1, len(steps)) if matches(steps[i])), None)
+                    if matched_step_index is not None:
+                        state["took_extra_steps"] = True  # steps were skipped
+
+                is_match = matched_step_index is not None
+                result.events.append((position, state["key"], is_match))
+                if is_match:
+                    state["seen"].add((url, tracking_key))
+                    state["current_step_index"] = matched_step_index + 1
+                    completed = state["current_step_index"] >= len(steps)
+                    result.journeys[state["key"]] = {"current_step_index": state["current_step_index"],
+                                                     "completed": completed,
+                                                     "indirect": state["took_extra_steps"],
+                                                     "position": position}
+                    if completed:
+                        person_journeys.remove(state)
+                elif (url, tracking_key) not in state["seen"]:
+                    state["took_extra_steps"] = True
+                break
+
+        return result
+
+
+def match_shard(templates: List[Template], open_journeys: List[Tuple[int, str, int, int]],
+                events: List[ShardEvent]) -> ShardResult:
+    """Match a shard's events, in order, against the journey templates and the persons' open journeys."""
+    return JourneyMatcher(templates, open_journeys).match(events)
+
+
+def journey_template(journey: Journey) -> Template:
+    """A journey template as plain data for JourneyMatcher."""
+    steps = sorted(journey.steps, key=lambda step: step.created_at)
+    try:
+        parsed_step = json.loads(journey.first_step)
+        first_step = (parsed_step.get("url"), parsed_step.get("xpath"))
+    except Exception:
+        first_step = None
+    return journey.id, first_step, tuple((step.url, step.x_path) for step in steps)
+
+
+def load_templates(session: Session) -> List[Template]:
+    """Active journey templates as plain data for JourneyMatcher."""
+    return [journey_template(journey)
+            for journey in session.query(Journey).filter_by(status=JourneyLiveStatus.ACTIVE).all()]
+
+
+def process_raw_events_sharded(session: Session, account_id: int, workers: int,
+                               min_events: Optional[int] = None) -> bool:
+    """
+    Match the account's pending raw events across `workers` processes and save the result
+    (commits). Returns False without doing anything when fewer than `min_events` (default
+    Config.EVENT_MATCHING_SHARD_MIN_EVENTS) are pending, leaving them to the serial matcher.
+    """
+    min_events = Config.EVENT_MATCHING_SHARD_MIN_EVENTS if min_events is None else min_events
+    pending_raw_events = pending_events(session, account_id, "ideal_path").all()
+    if not pending_raw_events or len(pending_raw_events) < min_events:
+        return False
+
+    # Journeys are matched in event time order, not arrival order
+    raw_events = sorted(pending_raw_events,
+                        key=lambda event: (event.timestamp is None, event.timestamp or datetime.min))
+    templates = load_templates(session)
+    print(f"[INFO] Matching {len(raw_events)} raw events for account {account_id} in {workers} shards")
+
+    shard_events = [[] for _ in range(workers)]
+    for position, raw_event in enumerate(raw_events):
+        shard_events[shard_of(raw_event.distinct_id, workers)].append(
+            (position, raw_event.id, raw_event.distinct_id, raw_event.current_url,
+             raw_event.elements_chain, raw_event.x_path, raw_event.event_type))
+
+    # Open journeys of the batch's persons (as process_raw_events sees them: any template)
+    person_ids = list({raw_event.distinct_id for raw_event in raw_events})
+    shard_journeys = [[] for _ in range(workers)]
+    for i in range(0, len(person_ids), _ID_CHUNK):
+        rows = (session.query(CustomerJourney.id, CustomerJourney.person_id, CustomerJourney.journey_id,
+                              CustomerJourney.current_step_index)
+                .filter(CustomerJourney.person_id.in_(person_ids[i:i + _ID_CHUNK]),
+                        CustomerJourney.status == JourneyStatusEnum.IN_PROGRESS)
+                .order_by(CustomerJourney.journey_id, CustomerJourney.id)
+                .all())
+        for row in rows:
+            shard_journeys[shard_of(row.person_id, workers)].append(tuple(row))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(match_shard, [templates] * workers, shard_journeys, shard_events))
+
+    # Merge: new journeys first (their ids are needed by the events), then the events in time order
+    session_start_dict = session_start_times(session, account_id, raw_events)
+    total_steps = {template[0]: len(template[2]) for template in templates}
+    journeys = {}
+    for shard, result in enumerate(results):
+        for key, position, journey_id in result.new_journeys:
+            raw_event = raw_events[position]
+            journeys[(shard, key)] = CustomerJourney(
+                account_id=raw_event.account_id,
+                session_id=raw_event.session_id,
+                person_id=raw_event.distinct_id,
+                journey_id=journey_id,
+                current_step_index=1,
+                status=JourneyStatusEnum.IN_PROGRESS,
+                start_time=raw_event.timestamp,
+                end_time=raw_event.timestamp,
+                session_start_time=session_start_dict.get(raw_event.session_id, raw_event.timestamp),
+                total_steps=total_steps[journey_id],
+            )
+    session.add_all(journeys.values())
+    session.flush()
+
+    existing_ids = list({key for result in results for _, key, _ in result.events if not isinstance(key, tuple)})
+    for i in range(0, len(existing_ids), _ID_CHUNK):
+        for cj in session.query(CustomerJourney).filter(CustomerJourney.id.in_(existing_ids[i:i + _ID_CHUNK])):
+            journeys[(shard_of(cj.person_id, workers), cj.id)] = cj
+
+    intern_pool = InternPool(session, account_id)
+    funnel_tree = FunnelTreeUpdater(session)
+    merged = sorted((position, shard, key, is_match)
+                    for shard, result in enumerate(results) for position, key, is_match in result.events)
+    new_events = []
+    for position, shard, key, is_match in merged:
+        raw_event = raw_events[position]
+        cj = journeys[(shard, key)]
+        event = new_event(raw_event, cj.id, is_match)
+        new_events.append((event, raw_event))
+        funnel_tree.append(cj, event, raw_event.elements_chain)
+    add_new_events(session, intern_pool, new_events)
+
+    completed_journey_ids = []
+    for shard, result in enumerate(results):
+        for key, state in result.journeys.items():
+            cj = journeys[(shard, key)]
+            cj.current_step_index = state["current_step_index"]
+            if state["completed"]:
+                cj.status = JourneyStatusEnum.COMPLETED
+                cj.end_time = raw_events[state["position"]].timestamp
+                cj.completion_type = CompletionType.INDIRECT if state["indirect"] else CompletionType.DIRECT
+                completed_journey_ids.append(cj.id)
+
+    funnel_tree.flush()
+    if completed_journey_ids:
+        session.flush()
+        record_completion_durations(session, completed_journey_ids)
+
+    last_event = pending_raw_events[-1]
+    advance_watermark(session, account_id, "ideal_path", last_event.ingested_at, last_event.id)
+    session.commit()
+    print(f"[SUCCESS] Matched {len(merged)} events; {len(journeys)} journeys touched, {len(completed_journey_ids)} completed")
+    return True
@@ -1,7 +1,10 @@
 # services/event_usage.py
+from collections import defaultdict
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 from models.customer_journey import RawEvent, EventsUsage
+from repositories.usage_rollups import GRANULARITIES, bucket_start, upsert_events_usage_buckets, prune_hourly_buckets
+from repositories.watermarks import pending_events, advance_watermark
 from utils.element_chain_utils import elements_chain_to_xpath
 
 def process_event_usage(session, account_id=None):
@@ -24,22 +27,22 @@ def process_event_usage(session, account_id=None):
         acc_id = account.id
         print(f"[DEBUG] Processing event usage for account {acc_id}")
 
-        # Get all unprocessed events for this account
-        unprocessed_events = session.query(RawEvent).filter_by(
-            processed_event_usage=False,
-            account_id=acc_id
-        ).all()
+        # Get the events after this stage's watermark
+        unprocessed_events = pending_events(session, acc_id, "event_usage").all()
 
         if not unprocessed_events:
             results[acc_id] = {"processed": 0, "message": "No unprocessed events found"}
             continue
 
+        # plain values: the per-record commit/rollback below may expire the ORM objects
+        last_ingested_at, last_event_id = unprocessed_events[-1].ingested_at, unprocessed_events[-1].id
+
         processed_count = 0
+        bucket_counts = {g: defaultdict(int) for g in GRANULARITIES}
 
         for event in unprocessed_events:
             # Skip events without required data
             if not event.pathname or not event.event_type or not event.elements_chain:
-                event.processed_event_usage = True
                 continue
 
             # Parse x_path from elements_chain
@@ -75,10 +78,21 @@ def process_event_usage(session, account_id=None):
                     session.rollback()
                     print(f"Duplicate record detected for accountId={event.account_id}, pathname={event.pathname}, eventType={event.event_type}, elementsChain={event.elements_chain}")
 
-            # Mark event as processed
-            event.processed_event_usage = True
+            if event.timestamp:
+                for granularity, counts in bucket_counts.items():
+                    key = (event.pathname, event.event_type, parsed_x_path, bucket_start(event.timestamp, granularity))
+                    counts[key] += 1
+
             processed_count += 1
 
+        # Hourly/daily rollups for windowed dashboards
+        for granularity, counts in bucket_counts.items():
+            upsert_events_usage_buckets(session, acc_id, granularity, counts)
+        prune_hourly_buckets(session, acc_id)
+
+        # Mark events as processed
+        advance_watermark(session, acc_id, "event_usage", last_ingested_at, last_event_id)
+
         # Commit all changes
         try:
             session.commit()
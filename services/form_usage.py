@@ -1,10 +1,12 @@
 from __future__ import annotations
 import hashlib
 import re
+from datetime import datetime
 from flask import jsonify, Blueprint
 from db import db
 from flask import request
 from models.customer_journey import FormUsage, RawEvent
+from repositories.watermarks import pending_events, advance_watermark, reset_watermark
 
 form_usage_blueprint = Blueprint("form_usage", __name__)
 
@@ -226,38 +228,33 @@ def extract_form_metadata(elements_chain: str, url: str) -> dict | None:
     return None
 
 def reset_processed_form_usage(session, account_id: int) -> int:
-    """Reset processed_form_usage flag and delete existing FormUsage records for an account."""
-    updated_count = (
-        session.query(RawEvent)
-        .filter_by(account_id=account_id, processed_form_usage=True)
-        .update({"processed_form_usage": False})
-    )
+    """Rewind the form usage watermark and delete existing FormUsage records for an account."""
+    reset_count = reset_watermark(session, account_id, "form_usage")
     deleted_count = (
         session.query(FormUsage)
         .filter_by(account_id=account_id)
         .delete()
     )
     session.commit()
-    return updated_count
+    return reset_count
 
 def detect_and_save_form_usage(session, account_id: int) -> int:
     """Process unprocessed form events for a given account and save usage metrics."""
-    unprocessed_events = (
-        session.query(RawEvent)
-        .filter_by(processed_form_usage=False, account_id=account_id)
-        .filter(RawEvent.event_type.in_(["change", "click", "submit"]))
-        .order_by(RawEvent.timestamp)
-        .all()
-    )
-    if not unprocessed_events:
+    pending = pending_events(session, account_id, "form_usage").all()
+    if not pending:
         return 0
 
+    # Form events only, replayed in event time order
+    unprocessed_events = sorted(
+        (event for event in pending if event.event_type in ("change", "click", "submit")),
+        key=lambda event: (event.timestamp is None, event.timestamp or datetime.min),
+    )
+
     processed_count = 0
 
     for event in unprocessed_events:
         metadata = extract_form_metadata(event.elements_chain, event.current_url)
         if not metadata:
-            event.processed_form_usage = True
             continue
 
         form_hash = metadata["formHash"]
@@ -313,8 +310,8 @@ def detect_and_save_form_usage(session, account_id: int) -> int:
             if form_usage.started_at:
                 form_usage.duration = int((event.timestamp - form_usage.started_at).total_seconds())
 
-        event.processed_form_usage = True
         processed_count += 1
 
+    advance_watermark(session, account_id, "form_usage", pending[-1].ingested_at, pending[-1].id)
     session.commit()
     return processed_count
\ No newline at end of file
@@ -0,0 +1,269 @@
+# services/funnel_tree.py
+# Materialized funnel tree (FunnelTreeNode) read by /api/paths/build_funnel_tree. process_raw_events
+# appends every Event it creates to its customer journey's path (CustomerJourney.funnelNodeId is
+# where the path ends); node counters are written as increments at the end of the run, so
+# concurrent workers add up instead of overwriting each other. rebuild_funnel_tree replays a
+# template's stored events (through a utils.path_trie.PathTrie), for journeys that existed
+# before the tree did.
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from sqlalchemy import exists, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import CustomerJourney, Event, FunnelTreeNode, Journey, Step
+from repositories.journeys import iter_customer_journey_chunks
+from utils.path_trie import PathTrie
+
+ANOMALY_FACTOR = 1.5  # a click slower than this times the ideal time of its page is an anomaly
+
+
+def trim_base_url(url: str) -> str:
+    """The url without its scheme and host (relative path)."""
+    parsed_url = urlparse(url)
+    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    return url.replace(base_url, "", 1)
+
+
+def get_page_title(page_title, trimmed_url):
+    return trimmed_url if page_title == 'N/A' else page_title
+
+
+def ideal_funnel_steps(session: Session, journey_id: int) -> List[dict]:
+    """
+    The template's steps as the funnel tree compares against them: trimmed url, head of the
+    elements chain, xpath, and ideal_time (seconds since the previous step, 0 for the first).
+    """
+    steps = session.query(Step).filter(Step.journey_id == journey_id).order_by(Step.created_at).all()
+
+    ideal_journey_data = []
+    previous_time = None
+    for step in steps:
+        ideal_time = 0 if previous_time is None else (step.created_at - previous_time).total_seconds()
+        ideal_journey_data.append({
+            "url": trim_base_url(step.url),
+            "elements_chain": step.elements_chain.split(";")[0],
+            "xpath": step.x_path,
+            "ideal_time": ideal_time,
+        })
+        previous_time = step.created_at
+    return ideal_journey_data
+
+
+def is_ideal_click(ideal_journey: List[dict], page_url: str, elements_chain, xpath) -> bool:
+    """Does the click match an ideal step (same page, same xpath or else same elements chain)?"""
+    for ideal_event in ideal_journey:
+        if ideal_event["url"] != page_url:
+            continue
+        if xpath and ideal_event.get("xpath"):
+            if ideal_event["xpath"] == xpath:
+                return True
+        elif ideal_event["elements_chain"] == elements_chain:
+            return True
+    return False
+
+
+def ideal_times_by_url(ideal_journey: List[dict]) -> Dict[str, float]:
+    """Ideal time of the first step on each page."""
+    ideal_times: Dict[str, float] = {}
+    for item in ideal_journey:
+        ideal_times.setdefault(item["url"], item["ideal_time"])
+    return ideal_times
+
+
+def click_timing(ideal_times: Dict[str, float], page_url: str, last_event_at, timestamp):
+    """(seconds since the previous click or None for a first click, whether that is an anomaly)."""
+    if last_event_at is None or timestamp is None:
+        return None, False
+    elapsed = max(0.0, (timestamp - last_event_at).total_seconds())
+    ideal_time = ideal_times.get(page_url)
+    return elapsed, ideal_time is not None and elapsed > ideal_time * ANOMALY_FACTOR
+
+
+def _key_hash(elements_chain: Optional[str]) -> str:
+    return hashlib.sha256((elements_chain or "").encode("utf-8")).hexdigest()
+
+
+class FunnelTreeUpdater:
+    """Appends clicks to customer journeys' paths in the funnel tree. Call flush() before committing."""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._ideal: Dict[int, Tuple[List[dict], Dict[str, float]]] = {}
+        self._children: Dict[Tuple[int, Optional[int], str], Tuple[int, int]] = {}  # -> (node id, depth)
+        self._depths: Dict[int, int] = {}
+        self._deltas = defaultdict(lambda: [0, 0.0, 0, 0])  # node id -> count, time sum, time count, anomalies
+
+    def _ideal_for(self, journey_id: int):
+        if journey_id not in self._ideal:
+            ideal_journey = ideal_funnel_steps(self.session, journey_id)
+            self._ideal[journey_id] = (ideal_journey, ideal_times_by_url(ideal_journey))
+        return self._ideal[journey_id]
+
+    def _depth(self, node_id: int) -> int:
+        if node_id not in self._depths:
+            self._depths[node_id] = self.session.query(FunnelTreeNode.depth).filter_by(id=node_id).scalar()
+        return self._depths[node_id]
+
+    def _node(self, account_id: int, journey_id: int, parent_id: Optional[int], elements_chain,
+              url=None, x_path=None, page_title=None) -> int:
+        """Id of the parent's child for `elements_chain` (the root when parent_id is None), created if missing."""
+        key = (journey_id, parent_id, _key_hash(elements_chain) if parent_id is not None else "")
+        cached = self._children.get(key)
+        if cached is not None:
+            return cached[0]
+
+        q = self.session.query(FunnelTreeNode.id, FunnelTreeNode.depth).filter(FunnelTreeNode.journey_id == journey_id)
+        q = q.filter(FunnelTreeNode.parent_id.is_(None) if parent_id is None else
+                     (FunnelTreeNode.parent_id == parent_id) & (FunnelTreeNode.key_hash == key[2]))
+        found = q.first()
+        if found is None:
+            depth = 0 if parent_id is None else self._depth(parent_id) + 1
+            ideal_journey, _ = self._ideal_for(journey_id)
+            node = FunnelTreeNode(
+                account_id=account_id, journey_id=journey_id, parent_id=parent_id, depth=depth,
+                key_hash=key[2], elements_chain=elements_chain, url=url, x_path=x_path,
+                page_title=page_title,
+                ideal=parent_id is not None and is_ideal_click(ideal_journey, url, elements_chain, x_path),
+            )
+            try:
+                with self.session.begin_nested():
+                    self.session.add(node)
+                found = (node.id, depth)
+            except IntegrityError:
+                # created concurrently by another worker
+                found = q.first()
+
+        self._children[key] = (found[0], found[1])
+        self._depths[found[0]] = found[1]
+        return found[0]
+
+    def append_click(self, account_id: int, journey_id: int, node_id: Optional[int], last_event_at,
+                     url: str, elements_chain, x_path, page_title, timestamp) -> int:
+        """Extend a path ending at `node_id` (None: not started) by one click; returns the new end node."""
+        _, ideal_times = self._ideal_for(journey_id)
+        if node_id is None:
+            node_id = self._node(account_id, journey_id, None, None)
+
+        page_url = trim_base_url(url)
+        child_id = self._node(account_id, journey_id, node_id, elements_chain, page_url, x_path,
+                              get_page_title(page_title, page_url))
+
+        elapsed, is_anomaly = click_timing(ideal_times, page_url, last_event_at, timestamp)
+        delta = self._deltas[child_id]
+        delta[0] += 1
+        if elapsed is not None:
+            delta[1] += elapsed
+            delta[2] += 1
+        if is_anomaly:
+            delta[3] += 1
+        return child_id
+
+    def append(self, customer_journey: CustomerJourney, event: Event, elements_chain=None):
+        """Append a new Event of the customer journey (pass its elements chain if not on the Event yet)."""
+        cj = customer_journey
+        cj.funnel_node_id = self.append_click(
+            cj.account_id, cj.journey_id, cj.funnel_node_id, cj.funnel_last_event_at, event.url,
+            elements_chain if elements_chain is not None else event.elements_chain,
+            event.x_path, event.page_title, event.timestamp,
+        )
+        cj.funnel_last_event_at = event.timestamp
+
+    def flush(self):
+        """Write the accumulated counter increments. Does not commit."""
+        for node_id, (count, time_sum, time_count, anomalies) in self._deltas.items():
+            self.session.execute(
+                update(FunnelTreeNode)
+                .where(FunnelTreeNode.id == node_id)
+                .values(count=FunnelTreeNode.count + count,
+                        time_sum=FunnelTreeNode.time_sum + time_sum,
+                        time_count=FunnelTreeNode.time_count + time_count,
+                        anomaly_count=FunnelTreeNode.anomaly_count + anomalies),
+                execution_options={"synchronize_session": False},
+            )
+        self._deltas.clear()
+
+
+def rebuild_funnel_tree(session: Session, journey_id: int, chunk_size: int = 1000) -> int:
+    """
+    Rebuild the template's tree from its stored events: replayed into a PathTrie in memory, then
+    inserted a level at a time. Does not commit. Returns the number of journeys replayed.
+    """
+    account_id = session.query(Journey.account_id).filter_by(id=journey_id).scalar()
+    session.execute(update(CustomerJourney)
+                    .where(CustomerJourney.journey_id == journey_id)
+                    .values(funnel_node_id=None, funnel_last_event_at=None),
+                    execution_options={"synchronize_session": False})
+    session.query(FunnelTreeNode).filter_by(journey_id=journey_id).delete(synchronize_session=False)
+
+    ideal_journey = ideal_funnel_steps(session, journey_id)
+    ideal_times = ideal_times_by_url(ideal_journey)
+    trie = PathTrie()
+    path_ends = []  # (customer journey id, its last node, time of its last event)
+    for journeys, events in iter_customer_journey_chunks(session, journey_id, chunk_size=chunk_size):
+        for journey in journeys:
+            node, last_at = trie.root, None
+            for event in events.get(journey.id, []):
+                page_url = trim_base_url(event["url"])
+                elements_chain, x_path = event["elements_chain"], event["x_path"]
+                child = trie.find(node, elements_chain)
+                if child is None:
+                    child = trie.add(node, elements_chain, url=page_url, xpath=x_path,
+                                     elements_chain=elements_chain,
+                                     page_title=get_page_title(event["page_title"], page_url),
+                                     ideal=is_ideal_click(ideal_journey, page_url, elements_chain, x_path))
+                node = child
+                node.record(*click_timing(ideal_times, page_url, last_at, event["timestamp"]))
+                last_at = event["timestamp"]
+            if node is not trie.root:
+                path_ends.append((journey.id, node, last_at))
+    if not path_ends:
+        return 0
+
+    levels = defaultdict(list)
+    for depth, parent, node in trie.walk():
+        levels[depth].append((parent, node))
+    for depth in sorted(levels):
+        rows = [FunnelTreeNode(
+            account_id=account_id, journey_id=journey_id, parent_id=parent.id if parent else None,
+            depth=depth, key_hash=_key_hash(node.elements_chain) if parent else "",
+            elements_chain=node.elements_chain, url=node.url, x_path=node.xpath,
+            page_title=node.page_title, ideal=node.ideal, count=node.count, time_sum=node.time_sum,
+            time_count=node.time_count, anomaly_count=node.anomaly_count,
+        ) for parent, node in levels[depth]]
+        session.add_all(rows)
+        session.flush()
+        for (_, node), row in zip(levels[depth], rows):
+            node.id = row.id
+
+    session.execute(update(CustomerJourney), [  # bulk UPDATE by primary key
+        {"id": cj_id, "funnel_node_id": node.id, "funnel_last_event_at": last_at}
+        for cj_id, node, last_at in path_ends
+    ])
+    return len(path_ends)
+
+
+def ensure_funnel_tree(session: Session, journey_id: int) -> bool:
+    """
+    Rebuild the template's tree if some of its customer journeys have events but are not in it
+    (they predate the tree). Does not commit. Returns whether it rebuilt.
+    """
+    missing = session.query(exists().where(
+        CustomerJourney.journey_id == journey_id,
+        CustomerJourney.funnel_node_id.is_(None),
+        exists().where(Event.customer_journey_id == CustomerJourney.id),
+    )).scalar()
+    if missing:
+        rebuild_funnel_tree(session, journey_id)
+    return bool(missing)
+
+
+def fetch_funnel_tree_nodes(session: Session, journey_id: int, max_depth: Optional[int] = None,
+                            min_count: int = 1) -> List[FunnelTreeNode]:
+    """The template's nodes, root first, down to `max_depth` and with at least `min_count` clicks."""
+    q = session.query(FunnelTreeNode).filter(FunnelTreeNode.journey_id == journey_id)
+    if max_depth is not None:
+        q = q.filter(FunnelTreeNode.depth <= max_depth)
+    q = q.filter((FunnelTreeNode.parent_id.is_(None)) | (FunnelTreeNode.count >= min_count))
+    return q.order_by(FunnelTreeNode.depth, FunnelTreeNode.id).all()
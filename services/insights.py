@@ -1,18 +1,45 @@
 # services/insights.py
 import datetime
 import json
+from config import Config
 from models.customer_journey import Insights
-from services.aggregators import build_summary_for_account
-from services.ai_client import generate_ai_insights
+from services.summary_cache import get_account_summary
+from services.ai_client import generate_ai_insights, get_default_client, insights_cache_key, MODEL
+from services.llm_client import run_concurrently
 
-def generate_insights(session, account_id: int):
+
+def find_cached_insight(session, account_id: int, input_hash: str, max_age_hours: int):
+    """Latest non-empty Insights row for the same input hash, if younger than max_age_hours."""
+    if not max_age_hours:
+        return None
+    since = datetime.datetime.utcnow() - datetime.timedelta(hours=max_age_hours)
+    return (
+        session.query(Insights)
+        .filter(
+            Insights.account_id == account_id,
+            Insights.input_hash == input_hash,
+            Insights.created_at >= since,
+            Insights.insights.isnot(None),
+            Insights.insights != "",
+        )
+        .order_by(Insights.created_at.desc())
+        .first()
+    )
+
+
+def _prepare_insight(session, account_id: int, max_age_hours: int):
     """
-    Generate insights for a given account.
-    Uses DB session explicitly (like your other services).
+    Return (cached_insight, None, None) when an up-to-date insight exists, otherwise
+    (None, summary, new_insight) with a pending Insights row saved for the summary.
     """
+    # Step 1: summary from the per-account cache (rebuilt only if stale)
+    summary = get_account_summary(session, account_id)
+    input_hash = insights_cache_key(summary)
 
-    # Step 1: build summary from DB
-    summary = build_summary_for_account(session, account_id)
+    cached = find_cached_insight(session, account_id, input_hash, max_age_hours)
+    if cached:
+        print(f"[DEBUG] Reusing insights {cached.id} for account {account_id} (summary unchanged)")
+        return cached, None, None
 
     # Serialize summary to JSON string
     summary_json = json.dumps(summary)
@@ -22,14 +49,42 @@ def generate_insights(session, account_id: int):
         account_id=account_id,
         summary=summary_json,
         insights="",
+        input_hash=input_hash,
+        model=MODEL,
         updated_at=datetime.datetime.utcnow(),
     )
     session.add(insight)
     session.commit()
     session.refresh(insight)
+    return None, summary, insight
+
+
+def _discard_insight(session, insight):
+    """Drop the pending row of a failed LLM call, so it never becomes the account's latest insight."""
+    session.delete(insight)
+
+
+def generate_insights(session, account_id: int, client=None, max_age_hours: int = None):
+    """
+    Generate insights for a given account.
+    Uses DB session explicitly (like your other services).
+    If the summary, model and prompts are unchanged since a recent run, the previous
+    Insights row is returned and the LLM is not called.
+    """
+    if max_age_hours is None:
+        max_age_hours = Config.INSIGHTS_CACHE_TTL_HOURS
+
+    cached, summary, insight = _prepare_insight(session, account_id, max_age_hours)
+    if cached:
+        return cached
 
     # Step 3: call AI client
-    ai_html = generate_ai_insights(summary)
+    try:
+        ai_html = generate_ai_insights(summary, client=client)
+    except Exception:
+        _discard_insight(session, insight)
+        session.commit()
+        raise
 
     # Step 4: update record with AI insights
     insight.insights = ai_html
@@ -37,3 +92,38 @@ def generate_insights(session, account_id: int):
     session.refresh(insight)
 
     return insight
+
+
+def generate_insights_for_accounts(session, account_ids, client=None, max_age_hours: int = None, max_workers: int = None):
+    """
+    Generate insights for many accounts with the LLM calls overlapping.
+    DB work (summaries, cache lookups, saving) stays on the calling thread; only the
+    network calls fan out, at most `max_workers` (Config.LLM_MAX_CONCURRENCY) at a time.
+    Returns {account_id: Insights or None if the call failed}.
+    """
+    if max_age_hours is None:
+        max_age_hours = Config.INSIGHTS_CACHE_TTL_HOURS
+    client = client or get_default_client()
+
+    results = {}
+    pending = []
+    for account_id in account_ids:
+        cached, summary, insight = _prepare_insight(session, account_id, max_age_hours)
+        if cached:
+            results[account_id] = cached
+        else:
+            pending.append((account_id, summary, insight))
+
+    calls = run_concurrently(lambda item: generate_ai_insights(item[1], client=client), pending, max_workers)
+
+    for (account_id, _summary, insight), ai_html, error in calls:
+        if error:
+            print(f"[ERROR] Insights generation failed for account {account_id}: {error}")
+            _discard_insight(session, insight)
+            results[account_id] = None
+            continue
+        insight.insights = ai_html
+        results[account_id] = insight
+
+    session.commit()
+    return results
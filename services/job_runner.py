@@ -10,6 +10,9 @@ from services.event_usage import process_event_usage
 from services.form_usage import detect_and_save_form_usage
 from services.process_friction import process_friction
 from services.process_journeys import process_journey_metrics
+from services.summary_cache import invalidate_account_summary, refresh_account_summary
+from services.raw_event_archive import archive_raw_events
+from services.raw_event_partitions import maintain_raw_event_partitions
 
 logger = logging.getLogger(__name__)
 def run_jobs(account_ids=None):
@@ -26,6 +29,7 @@ def run_jobs(account_ids=None):
 
     for account in accounts:
         logger.info(f"➡️ Processing account {account.id}")
+        invalidate_account_summary(db.session, account.id)
         process_raw_events(db.session, account_id=account.id) # looks for user journeys
         evaluate_journey_failures(db.session, account_id=account.id, timeout_minutes=30)
         process_page_usage(db.session, account_id=account.id)
@@ -33,5 +37,9 @@ def run_jobs(account_ids=None):
         detect_and_save_form_usage(db.session, account_id=account.id)
         process_friction(db.session, account_id=account.id)
         process_journey_metrics(db.session, account_id=account.id)
+        refresh_account_summary(db.session, account.id)
+
+    archive_raw_events(db.session, [account.id for account in accounts])
+    maintain_raw_event_partitions(db.session)
 
     logger.info("✅ All jobs completed successfully.")
@@ -0,0 +1,355 @@
+# services/journey_recompute.py
+# Recompute mode for journey matching, for when a template's steps were edited: the template's
+# CustomerJourneys and Events that started in a time range are rebuilt by replaying the account's
+# RawEvents (the archive plus the hot table) through process_raw_events' matching rules
+# (a JourneyMatcher), in event time order, a day at a time. The replay is written to shadow tables
+# (CustomerJourneyRecompute / EventRecompute), committed a chunk at a time, and swapped into the
+# live tables in one transaction, so readers see either the old journeys or the new ones.
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import func, insert, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+from models import (CustomerJourney, CustomerJourneyRecompute, Event, EventRecompute, Journey,
+                    JourneyDropOff, JourneyProgress, JourneyRecompute, JourneyStatusEnum, RawEvent,
+                    StageWatermark)
+from models.customer_journey import CompletionType
+from repositories.interning import InternPool
+from repositories.sketches import replace_sketches
+from services.event_processor import intern_event_strings
+from services.event_processor_sharded import JourneyMatcher, journey_template, load_templates
+from services.funnel_tree import rebuild_funnel_tree
+from services.raw_event_archive import archived_days, iter_archived_events
+from services.summary_cache import invalidate_account_summary
+
+CHUNK_SIZE = 5000                 # events matched / shadow rows written per commit
+REPLAY_WINDOW = timedelta(days=1)  # events held in memory at once: one window of event time
+
+REPLAY_COLUMNS = ["id", "distinct_id", "session_id", "current_url", "elements_chain", "x_path",
+                  "event_type", "timestamp", "ingested_at"]
+ReplayEvent = namedtuple("ReplayEvent", REPLAY_COLUMNS)
+
+Bound = Tuple[datetime, str]  # (ingestedAt, id) of a RawEvent
+
+
+def _in_range(run: JourneyRecompute, timestamp: datetime) -> bool:
+    return ((run.range_start is None or timestamp >= run.range_start)
+            and (run.range_end is None or timestamp < run.range_end))
+
+
+class _Replay:
+    """Matches replayed events and writes the run's template's journeys to the shadow tables."""
+
+    def __init__(self, session: Session, run: JourneyRecompute):
+        self.session = session
+        self.run = run
+        # Every active template is matched (they compete for a person's clicks, as in
+        # process_raw_events), the run's one even if it is not active; only its journeys are kept
+        templates = [t for t in load_templates(session) if t[0] != run.journey_id]
+        template = journey_template(session.get(Journey, run.journey_id))
+        self.total_steps = len(template[2])
+        self.matcher = JourneyMatcher(sorted(templates + [template], key=lambda t: t[0]))
+        self.intern_pool = InternPool(session, run.account_id)
+        self.shadow_ids = {}  # matcher key -> CustomerJourneyRecompute id, for the run's open journeys
+        self.session_starts = {}  # session id -> time of its first event
+
+    def feed(self, events: List[ReplayEvent]):
+        """Match the events (in the order given) and write their part of the run. Does not commit."""
+        session, run = self.session, self.run
+        for event in events:
+            first = self.session_starts.get(event.session_id)
+            if first is None or event.timestamp < first:
+                self.session_starts[event.session_id] = event.timestamp
+        result = self.matcher.match([(position, e.id, e.distinct_id, e.current_url, e.elements_chain,
+                                      e.x_path, e.event_type) for position, e in enumerate(events)])
+
+        # Journeys of the run's template that start in the range; the matcher still follows the
+        # others (a person is in a template at most once at a time) but they are not written
+        started = []
+        for key, position, journey_id in result.new_journeys:
+            event = events[position]
+            if journey_id != run.journey_id or not _in_range(run, event.timestamp):
+                continue
+            started.append((key, CustomerJourneyRecompute(
+                recompute_id=run.id,
+                session_id=event.session_id,
+                person_id=event.distinct_id,
+                status=JourneyStatusEnum.IN_PROGRESS.name,
+                start_time=event.timestamp,
+                end_time=event.timestamp,
+                session_start_time=self.session_starts[event.session_id],
+                total_steps=self.total_steps,
+                current_step_index=1,
+            )))
+        if started:
+            session.add_all(row for _, row in started)
+            session.flush()
+            self.shadow_ids.update((key, row.id) for key, row in started)
+            run.journeys_rebuilt += len(started)
+
+        recorded = [(events[position], self.shadow_ids[key], is_match)
+                    for position, key, is_match in result.events if key in self.shadow_ids]
+        string_ids = intern_event_strings(self.intern_pool, (event for event, _, _ in recorded))
+        shadow_events = []
+        for (event, shadow_id, is_match), ids in zip(recorded, string_ids):
+            shadow_events.append({
+                "recompute_id": run.id,
+                "customer_journey_recompute_id": shadow_id,
+                "account_id": run.account_id,
+                "person_id": event.distinct_id,
+                "session_id": event.session_id,
+                "event_type": event.event_type,
+                "url": event.current_url,
+                "x_path": event.x_path,
+                **ids,
+                "timestamp": event.timestamp,
+                "is_match": is_match,
+            })
+        if shadow_events:
+            session.execute(insert(EventRecompute), shadow_events)
+
+        updates = []
+        for key, state in result.journeys.items():
+            shadow_id = self.shadow_ids.get(key)
+            if shadow_id is None:
+                continue
+            values = {"id": shadow_id, "current_step_index": state["current_step_index"]}
+            if state["completed"]:
+                completion_type = CompletionType.INDIRECT if state["indirect"] else CompletionType.DIRECT
+                values.update(status=JourneyStatusEnum.COMPLETED.name, completion_type=completion_type.name,
+                              end_time=events[state["position"]].timestamp)
+                del self.shadow_ids[key]  # no more events for it
+            updates.append(values)
+        if updates:
+            session.execute(update(CustomerJourneyRecompute), updates)  # bulk UPDATE by primary key
+        run.events_replayed += len(events)
+
+
+def _hot_events(session: Session, account_id: int, *criteria) -> List[ReplayEvent]:
+    rows = (session.query(*(getattr(RawEvent, name) for name in REPLAY_COLUMNS))
+            .filter(RawEvent.account_id == account_id, RawEvent.timestamp.isnot(None), *criteria)
+            .all())
+    return [ReplayEvent(*row) for row in rows]
+
+
+def _replay_order(events: List[ReplayEvent]) -> List[ReplayEvent]:
+    # Event time order; ties in arrival order, as process_raw_events sorts its batch
+    return sorted(events, key=lambda e: (e.timestamp, e.ingested_at, e.id))
+
+
+def _earliest_event(session: Session, account_id: int) -> Optional[datetime]:
+    days = archived_days(account_id)
+    hot = session.query(func.min(RawEvent.timestamp)).filter(RawEvent.account_id == account_id).scalar()
+    candidates = [datetime.strptime(days[0], "%Y-%m-%d")] if days else []
+    return min(candidates + ([hot] if hot else []), default=None)
+
+
+def _replay_windows(session: Session, run: JourneyRecompute, bound: Bound) -> Iterator[List[ReplayEvent]]:
+    """
+    The events to replay, a REPLAY_WINDOW of event time at a time in replay order: the archive
+    and the hot RawEvents the ideal_path stage has processed (up to `bound`). The replay starts
+    at the first event, not the range start, so that journeys still open at the range start keep
+    a person from starting another, and runs to the last one, as journeys can end after the range.
+    """
+    in_bound = tuple_(RawEvent.ingested_at, RawEvent.id) <= tuple_(*bound)
+    last_hot = (session.query(func.max(RawEvent.timestamp))
+                .filter(RawEvent.account_id == run.account_id, in_bound).scalar())
+    days = archived_days(run.account_id)
+    last_archived = datetime.strptime(days[-1], "%Y-%m-%d") + timedelta(days=1) if days else None
+    days = set(days)
+    end = max(filter(None, (last_hot, last_archived)), default=None)
+    start = _earliest_event(session, run.account_id)
+    if start is None or end is None:
+        return
+
+    window_start = start
+    while window_start <= end:
+        window_end = window_start + REPLAY_WINDOW
+        events = {e.id: e for e in _hot_events(session, run.account_id, in_bound,
+                                               RawEvent.timestamp >= window_start,
+                                               RawEvent.timestamp < window_end)}
+        window_days = {f"{window_start:%Y-%m-%d}", f"{window_end - timedelta(microseconds=1):%Y-%m-%d}"}
+        archived = iter_archived_events(run.account_id, window_start, window_end, columns=REPLAY_COLUMNS) \
+            if window_days & days else ()
+        for frame in archived:
+            frame = frame[frame["timestamp"] < window_end]
+            for row in frame.itertuples(index=False):
+                # an event can briefly be in both if archiving was interrupted
+                events.setdefault(row.id, ReplayEvent(*(getattr(row, name) for name in REPLAY_COLUMNS)))
+        if events:
+            yield _replay_order(list(events.values()))
+        window_start = window_end
+
+
+def _catch_up_events(session: Session, run: JourneyRecompute, after: Optional[Bound], bound: Bound) -> List[ReplayEvent]:
+    """Events the ideal_path stage processed since the replay read up to `after`, as it batches them."""
+    criteria = [tuple_(RawEvent.ingested_at, RawEvent.id) <= tuple_(*bound)]
+    if after is not None:
+        criteria.append(tuple_(RawEvent.ingested_at, RawEvent.id) > tuple_(*after))
+    return _replay_order(_hot_events(session, run.account_id, *criteria))
+
+
+def _locked_watermark(session: Session, account_id: int) -> Optional[Bound]:
+    """The ideal_path watermark, locked until the transaction ends (process_raw_events waits to advance it)."""
+    watermark = (session.query(StageWatermark)
+                 .filter_by(account_id=account_id, stage="ideal_path")
+                 .with_for_update()
+                 .first())
+    return (watermark.last_ingested_at, watermark.last_event_id) if watermark else None
+
+
+def _delete_shadow_rows(session: Session, run_id: int):
+    session.query(EventRecompute).filter_by(recompute_id=run_id).delete(synchronize_session=False)
+    session.query(CustomerJourneyRecompute).filter_by(recompute_id=run_id).delete(synchronize_session=False)
+
+
+def _swap(session: Session, run: JourneyRecompute):
+    """Replace the live journeys of the run's template and range with its shadow ones. Does not commit."""
+    live = select(CustomerJourney.id).where(CustomerJourney.journey_id == run.journey_id)
+    if run.range_start is not None:
+        live = live.where(CustomerJourney.start_time >= run.range_start)
+    if run.range_end is not None:
+        live = live.where(CustomerJourney.start_time < run.range_end)
+    for model in (JourneyDropOff, JourneyProgress, Event):
+        session.query(model).filter(model.customer_journey_id.in_(live)).delete(synchronize_session=False)
+    session.query(CustomerJourney).filter(CustomerJourney.id.in_(live)).delete(synchronize_session=False)
+
+    last_id = 0
+    while True:
+        rows = (session.query(CustomerJourneyRecompute)
+                .filter(CustomerJourneyRecompute.recompute_id == run.id, CustomerJourneyRecompute.id > last_id)
+                .order_by(CustomerJourneyRecompute.id)
+                .limit(CHUNK_SIZE)
+                .all())
+        if not rows:
+            break
+        journeys = [CustomerJourney(
+            account_id=run.account_id,
+            session_id=row.session_id,
+            person_id=row.person_id,
+            journey_id=run.journey_id,
+            status=JourneyStatusEnum[row.status],
+            completion_type=CompletionType[row.completion_type] if row.completion_type else None,
+            start_time=row.start_time,
+            end_time=row.end_time,
+            session_start_time=row.session_start_time,
+            total_steps=row.total_steps,
+            current_step_index=row.current_step_index,
+        ) for row in rows]
+        session.add_all(journeys)
+        session.flush()
+        session.execute(update(CustomerJourneyRecompute),
+                        [{"id": row.id, "live_id": cj.id} for row, cj in zip(rows, journeys)])
+        last_id = rows[-1].id
+
+    # Events are copied in the database, not through Python
+    session.execute(insert(Event).from_select(
+        ["accountId", "personId", "sessionId", "eventType", "url", "pageTitle", "element", "xPath",
+         "timestamp", "customerJourneyId", "is_match", "urlId", "xPathId", "elementsChainId"],
+        select(EventRecompute.account_id, EventRecompute.person_id, EventRecompute.session_id,
+               EventRecompute.event_type, EventRecompute.url, literal(""), literal(""),
+               EventRecompute.x_path, EventRecompute.timestamp, CustomerJourneyRecompute.live_id,
+               EventRecompute.is_match, EventRecompute.url_id, EventRecompute.x_path_id,
+               EventRecompute.elements_chain_id)
+        .join(CustomerJourneyRecompute,
+              CustomerJourneyRecompute.id == EventRecompute.customer_journey_recompute_id)
+        .where(EventRecompute.recompute_id == run.id)
+        .order_by(EventRecompute.id)
+    ))
+
+    # Derived state: the funnel tree is rebuilt here; duration sketches are rebuilt by the next
+    # metrics run (process_journey_metrics) from the journeys; failed journeys get their drop-offs
+    # when the failure sweep marks them
+    rebuild_funnel_tree(session, run.journey_id)
+    replace_sketches(session, run.account_id, run.journey_id, {})
+    invalidate_account_summary(session, run.account_id)
+    _delete_shadow_rows(session, run.id)
+
+
+def start_recompute(session: Session, account_id: int, journey_id: int,
+                    range_start: Optional[datetime] = None, range_end: Optional[datetime] = None) -> JourneyRecompute:
+    """
+    Check the request and record a RUNNING run for it (commits). Raises ValueError for an unknown
+    journey, an empty range or an account without events; nothing is recorded then.
+    """
+    journey = session.get(Journey, journey_id)
+    if journey is None or journey.account_id != account_id:
+        raise ValueError(f"Journey {journey_id} not found for account {account_id}")
+    if range_start is not None and range_end is not None and range_start >= range_end:
+        raise ValueError("range start must be before range end")
+
+    # Journeys older than the first event kept (archive or hot table) cannot be rebuilt: leave them
+    earliest = _earliest_event(session, account_id)
+    if earliest is None:
+        raise ValueError(f"Account {account_id} has no events to replay")
+    if range_start is None or range_start < earliest:
+        range_start = earliest
+
+    run = JourneyRecompute(account_id=account_id, journey_id=journey_id, range_start=range_start,
+                           range_end=range_end, status="RUNNING")
+    session.add(run)
+    session.commit()
+    return run
+
+
+def run_recompute(session: Session, run: JourneyRecompute) -> JourneyRecompute:
+    """
+    Replay the account's events for a run of start_recompute and swap the rebuilt journeys in
+    (commits as it goes; the live journeys only change in the final transaction). On failure
+    the run is left FAILED, with its error, and the exception re-raised.
+    Only the events the ideal_path stage has processed are replayed; later ones are left to it.
+    """
+    run_id, account_id = run.id, run.account_id
+    print(f"[INFO] Recompute {run_id}: replaying journey {run.journey_id} of account {account_id} "
+          f"from {run.range_start} to {run.range_end or 'now'}")
+
+    try:
+        replay = _Replay(session, run)
+        bound = _locked_watermark(session, account_id)
+        session.commit()
+        if bound is not None:
+            for events in _replay_windows(session, run, bound):
+                for i in range(0, len(events), CHUNK_SIZE):
+                    replay.feed(events[i:i + CHUNK_SIZE])
+                    session.commit()
+
+        # Catch up with what the pipeline matched meanwhile, then swap with the watermark locked
+        while True:
+            current = _locked_watermark(session, account_id)
+            if current == bound:
+                break
+            session.commit()
+            events = _catch_up_events(session, run, bound, current)
+            for i in range(0, len(events), CHUNK_SIZE):
+                replay.feed(events[i:i + CHUNK_SIZE])
+            bound = current
+            session.commit()
+
+        if bound is not None:
+            run.last_ingested_at, run.last_event_id = bound
+        _swap(session, run)
+        run.status = "SWAPPED"
+        run.swapped_at = datetime.utcnow()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        run = session.get(JourneyRecompute, run_id)
+        _delete_shadow_rows(session, run_id)
+        run.status = "FAILED"
+        run.error = str(e)
+        session.commit()
+        print(f"[ERROR] Recompute {run_id} failed: {e}")
+        raise
+
+    print(f"[SUCCESS] Recompute {run_id}: {run.journeys_rebuilt} journeys rebuilt from {run.events_replayed} events")
+    return run
+
+
+def recompute_journeys(session: Session, account_id: int, journey_id: int,
+                       range_start: Optional[datetime] = None, range_end: Optional[datetime] = None) -> JourneyRecompute:
+    """
+    Rebuild the template's CustomerJourneys (and their Events) that start in
+    [range_start, range_end) by replaying the account's events, then swap them in; see
+    start_recompute and run_recompute. Returns the run.
+    """
+    return run_recompute(session, start_recompute(session, account_id, journey_id, range_start, range_end))
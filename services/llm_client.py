@@ -0,0 +1,127 @@
+# services/llm_client.py
+# Shared client for the OpenAI-compatible LLM API (Groq): one pooled HTTP session,
+# per-call timeouts, retries with jittered backoff and bounded-concurrency fan-out.
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMClient:
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_retries=None,
+                 backoff_seconds=0.5, max_backoff_seconds=8.0, pool_size=None):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.base_url = (base_url or Config.LLM_BASE_URL).rstrip("/")
+        self.timeout = timeout if timeout is not None else Config.LLM_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else Config.LLM_MAX_RETRIES
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        # Keep-alive connections are reused across calls and threads
+        pool_size = pool_size or max(Config.LLM_MAX_CONCURRENCY, 1)
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+    def _headers(self):
+        if not self.api_key:
+            raise LLMError("Missing GROQ_API_KEY environment variable")
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                time.sleep(min(float(retry_after), self.max_backoff_seconds))
+                return
+            except ValueError:
+                pass
+        # Full jitter: uniform(0, base * 2^attempt), capped
+        cap = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+        time.sleep(random.uniform(0, cap))
+
+    def post_json(self, path: str, payload: dict) -> dict:
+        """POST a JSON payload, retrying timeouts, connection errors and 429/5xx responses."""
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        headers = self._headers()
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.http.post(url, headers=headers, json=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()
+                last_error = LLMError(f"API request failed: {response.status_code}")
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise last_error
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+
+            if attempt < self.max_retries:
+                logger.warning(f"LLM call to {url} failed ({last_error}), retry {attempt + 1}/{self.max_retries}")
+                self._sleep_before_retry(attempt, response)
+
+        raise LLMError(f"LLM call failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def chat(self, messages, model, temperature=0.5, max_tokens=1200, **extra) -> str:
+        """Chat completion; returns the first choice's content."""
+        result = self.post_json("/chat/completions", {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **extra,
+        })
+        return result["choices"][0]["message"]["content"]
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client, so every caller shares one connection pool."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+        return _shared_client
+
+
+def run_concurrently(fn, items, max_workers=None):
+    """
+    Call fn(item) for every item on a bounded thread pool.
+    Returns [(item, result, error)] in input order; one failure does not stop the others.
+    fn must not touch the DB session (sessions are not thread-safe).
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = max(1, min(max_workers or Config.LLM_MAX_CONCURRENCY, len(items)))
+
+    def _call(item):
+        try:
+            return item, fn(item), None
+        except Exception as e:
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_call, items))
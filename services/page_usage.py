@@ -1,8 +1,114 @@
 # services/page_usage.py
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 import pandas as pd
-from models.customer_journey import RawEvent, PageUsage
+from models.customer_journey import RawEvent, PageUsage, PageSessionState
 from models import Account
+from repositories.usage_rollups import upsert_page_usage_buckets, prune_hourly_buckets
+from repositories.watermarks import pending_events, advance_watermark
+
+BUCKET_FREQUENCIES = {"hour": "h", "day": "D"}
+
+MAX_DWELL_SECONDS = 300
+# Open pages older than this (relative to the newest event in the batch) are dropped;
+# their dwell would be clipped to MAX_DWELL_SECONDS anyway.
+OPEN_PAGE_TTL = timedelta(hours=24)
+
+
+def write_page_usage_buckets(session, account_id, df, counted_visits):
+    """
+    Add the batch to the hourly/daily PageUsageBucket rollups.
+    Dwell is attributed to the bucket the page was opened in; a visit is a distinct session
+    on the page within the bucket. Carried pages add dwell but no visit.
+    `counted_visits` maps (distinct_id, session_id) to the {(granularity, bucket_start, pathname)}
+    visits earlier batches already counted for the session; those are skipped, and the batch's
+    new visits are added to it.
+    """
+    rollup = df.dropna(subset=['pathname'])
+    visits = rollup[~rollup['carried']]
+
+    for granularity, freq in BUCKET_FREQUENCIES.items():
+        totals = defaultdict(lambda: [0.0, 0])  # (pathname, bucket_start) -> [time, visits]
+        dwell = rollup.groupby(['pathname', rollup['timestamp'].dt.floor(freq)])['time_spent'].sum()
+        for (pathname, start), time_spent in dwell.items():
+            totals[(pathname, start.to_pydatetime())][0] = time_spent
+
+        batch_visits = (visits.assign(bucket_start=visits['timestamp'].dt.floor(freq))
+                        .drop_duplicates(subset=['distinct_id', 'session_id', 'pathname', 'bucket_start']))
+        for distinct_id, session_id, pathname, start in zip(batch_visits['distinct_id'], batch_visits['session_id'],
+                                                            batch_visits['pathname'], batch_visits['bucket_start']):
+            start = start.to_pydatetime()
+            counted = counted_visits.setdefault((distinct_id, session_id), set())
+            if (granularity, start, pathname) in counted:
+                continue
+            counted.add((granularity, start, pathname))
+            totals[(pathname, start)][1] += 1
+
+        upsert_page_usage_buckets(session, account_id, granularity, [{
+            'pathname': pathname,
+            'bucket_start': start,
+            'total_time': time_spent,
+            'total_visits': visit_count,
+        } for (pathname, start), (time_spent, visit_count) in totals.items()])
+
+    prune_hourly_buckets(session, account_id)
+
+
+def load_counted_visits(state):
+    """The visits already counted for a PageSessionState, as {(granularity, bucket_start, pathname)}."""
+    return {(granularity, datetime.fromisoformat(start), pathname)
+            for granularity, start, pathname in (state.counted_visits or [])}
+
+
+def dump_counted_visits(counted, last_seen):
+    """
+    JSON form of a session's counted visits. Buckets that started more than OPEN_PAGE_TTL before
+    the session's last event are dropped: the session's state does not outlive that either.
+    """
+    cutoff = last_seen - OPEN_PAGE_TTL
+    return sorted([granularity, start.isoformat(), pathname]
+                  for granularity, start, pathname in counted if start >= cutoff)
+
+
+def load_open_pages(session, account_id):
+    """Return {(distinct_id, session_id): PageSessionState} for an account."""
+    states = session.query(PageSessionState).filter_by(account_id=account_id).all()
+    return {(s.distinct_id, s.session_id): s for s in states}
+
+
+def save_open_pages(session, account_id, df, open_pages, counted_visits):
+    """
+    Persist the last page of every session in the batch so the next batch can close it, with
+    the session's counted visits (see write_page_usage_buckets).
+    `df` must be sorted by distinct_id, session_id, timestamp.
+    """
+    last_rows = df.dropna(subset=['distinct_id', 'session_id']).groupby(['distinct_id', 'session_id']).tail(1)
+
+    for row in last_rows.itertuples(index=False):
+        key = (row.distinct_id, row.session_id)
+        state = open_pages.get(key)
+        if state is None:
+            state = PageSessionState(
+                account_id=account_id,
+                distinct_id=row.distinct_id,
+                session_id=row.session_id,
+            )
+            session.add(state)
+            open_pages[key] = state
+        last_seen = max(filter(None, (state.timestamp, row.timestamp)))
+        state.counted_visits = dump_counted_visits(counted_visits.get(key, ()), last_seen)
+        state.updated_at = datetime.now()
+        if state.timestamp and state.timestamp > row.timestamp:
+            continue  # late event, keep the newer open page
+        state.pathname = row.pathname
+        state.timestamp = row.timestamp
+
+    if not df.empty:
+        cutoff = df['timestamp'].max() - OPEN_PAGE_TTL
+        session.query(PageSessionState).filter(
+            PageSessionState.account_id == account_id,
+            PageSessionState.timestamp < cutoff
+        ).delete(synchronize_session=False)
 
 def process_page_usage(session, account_id=None):
     """
@@ -23,33 +129,58 @@ def process_page_usage(session, account_id=None):
         account_id = account.id
         print(f"[DEBUG] Processing page usage for account {account_id}")
 
-        # Step 1: Load unprocessed raw events ordered by user+session+time
-        unprocessed_events = (
-            session.query(
-                RawEvent.id,
-                RawEvent.distinct_id,
-                RawEvent.session_id,
-                RawEvent.pathname,
-                RawEvent.timestamp
-            )
-            .filter_by(processed_page_time=False, account_id=account_id)
-            .order_by(RawEvent.distinct_id, RawEvent.session_id, RawEvent.timestamp)
-            .all()
-        )
+        # Step 1: Load the events after this stage's watermark
+        unprocessed_events = pending_events(
+            session, account_id, "page_time",
+            RawEvent.id,
+            RawEvent.distinct_id,
+            RawEvent.session_id,
+            RawEvent.pathname,
+            RawEvent.timestamp,
+            RawEvent.ingested_at,
+        ).all()
 
         if not unprocessed_events:
             results[account_id] = {"message": "No valid events with pathname", "pages": 0}
             continue
 
-        # Step 2: Convert to DataFrame
-        df = pd.DataFrame(unprocessed_events, columns=['id', 'distinct_id', 'session_id', 'pathname', 'timestamp'])
-        df.sort_values(by=['distinct_id', 'session_id', 'timestamp'], inplace=True)
+        # Step 2: Convert to DataFrame (re-sorted by user+session+time below)
+        df = pd.DataFrame(unprocessed_events, columns=['id', 'distinct_id', 'session_id', 'pathname', 'timestamp', 'ingested_at'])
+        df = df.drop(columns=['ingested_at'])
+        df['carried'] = False
+
+        # Stitch the open page of each continuing session (last page of the previous batch)
+        # in front of this batch, so its dwell is closed by the session's next event.
+        open_pages = load_open_pages(session, account_id)
+        batch_sessions = set(zip(df['distinct_id'], df['session_id']))
+        carried = pd.DataFrame([{
+            'id': None,
+            'distinct_id': state.distinct_id,
+            'session_id': state.session_id,
+            'pathname': state.pathname,
+            'timestamp': state.timestamp,
+            'carried': True,
+        } for key, state in open_pages.items() if key in batch_sessions],
+            columns=['id', 'distinct_id', 'session_id', 'pathname', 'timestamp', 'carried'])
+        if not carried.empty:
+            df = pd.concat([carried, df], ignore_index=True)
+
+        # carried rows sort first on equal timestamps
+        df.sort_values(by=['distinct_id', 'session_id', 'timestamp', 'carried'],
+                       ascending=[True, True, True, False], inplace=True, kind='stable')
         df['next_timestamp'] = df.groupby(['distinct_id', 'session_id'])['timestamp'].shift(-1)
         df['time_spent'] = (df['next_timestamp'] - df['timestamp']).dt.total_seconds()
-        df['time_spent'] = df['time_spent'].clip(upper=300)
+        df['time_spent'] = df['time_spent'].clip(lower=0, upper=MAX_DWELL_SECONDS)
+
+        # The visit of a carried page was already counted by the previous batch; only its dwell is new.
+        carried_time = df[df['carried']].groupby('pathname')['time_spent'].sum().to_dict()
+        batch_df = df[~df['carried']]
+
+        counted_visits = {key: load_counted_visits(state) for key, state in open_pages.items() if key in batch_sessions}
+        write_page_usage_buckets(session, account_id, df, counted_visits)
 
         # Step 3: Aggregations
-        session_stats = df.groupby(['distinct_id', 'session_id', 'pathname'])['time_spent'].sum().reset_index()
+        session_stats = batch_df.groupby(['distinct_id', 'session_id', 'pathname'])['time_spent'].sum().reset_index()
         user_stats = session_stats.groupby(['distinct_id', 'pathname'])['time_spent'].sum().reset_index()
         usage_stats = user_stats.groupby('pathname')['time_spent'].agg(['mean', 'count']).reset_index()
         usage_stats.rename(columns={'mean': 'avg_time_spent', 'count': 'total_visits'}, inplace=True)
@@ -63,10 +194,11 @@ def process_page_usage(session, account_id=None):
             pathname = row['pathname']
             avg_time_spent = row['avg_time_spent']
             visits = row['total_visits']
+            extra_time = carried_time.pop(pathname, 0.0)
 
             if pathname in existing_page_dict:
                 existing_page = existing_page_dict[pathname]
-                total_time = (existing_page.avg_time_spent * existing_page.total_visits) + (avg_time_spent * visits)
+                total_time = (existing_page.avg_time_spent or 0) * existing_page.total_visits + (avg_time_spent * visits) + extra_time
                 total_visits = existing_page.total_visits + visits
                 updated_avg_time_spent = total_time / total_visits
 
@@ -77,21 +209,28 @@ def process_page_usage(session, account_id=None):
                 page_usage_data.append({
                     'account_id': account_id,
                     'pathname': pathname,
-                    'avg_time_spent': avg_time_spent,
+                    'avg_time_spent': (avg_time_spent * visits + extra_time) / visits,
                     'total_visits': visits,
                     'updated_at': datetime.now()
                 })
 
+        # Carried dwell on pages that were not visited again in this batch
+        for pathname, extra_time in carried_time.items():
+            existing_page = existing_page_dict.get(pathname)
+            if not existing_page or not existing_page.total_visits or not extra_time:
+                continue
+            total_time = (existing_page.avg_time_spent or 0) * existing_page.total_visits + extra_time
+            existing_page.avg_time_spent = total_time / existing_page.total_visits
+            existing_page.updated_at = datetime.now()
+
         if page_usage_data:
             session.bulk_insert_mappings(PageUsage, page_usage_data)
 
+        save_open_pages(session, account_id, batch_df, open_pages, counted_visits)
+
         # Mark events as processed
-        event_ids = [event.id for event in unprocessed_events]
-        if event_ids:
-            session.query(RawEvent).filter(RawEvent.id.in_(event_ids)).update(
-                {RawEvent.processed_page_time: True},
-                synchronize_session=False
-            )
+        last_event = unprocessed_events[-1]
+        advance_watermark(session, account_id, "page_time", last_event.ingested_at, last_event.id)
 
         session.commit()
 
@@ -2,6 +2,7 @@ from flask import jsonify, Blueprint, request
 import datetime
 from models.customer_journey import RawEvent, JourneyFriction, FrictionType
 from services.friction.detectors.navigation import detect_navigation_issues
+from services.raw_event_archive import read_event_history
 from db import db
 from sqlalchemy.orm import Session
 
@@ -26,12 +27,10 @@ def load_raw_events(session: Session, account_id: int, start_time=None, end_time
     return query.order_by(RawEvent.distinct_id, RawEvent.session_id, RawEvent.timestamp).all()
 
 def save_friction_points(session: Session, friction_points: list[dict]):
-    """Save detected friction points to the database and update processed_friction flag"""
+    """Save detected friction points to the database"""
     if not friction_points:
         return
 
-    processed_event_ids = []
-
     for point in friction_points:
         # Check if similar friction point already exists
         existing = session.query(JourneyFriction).filter_by(
@@ -60,19 +59,21 @@ def save_friction_points(session: Session, friction_points: list[dict]):
             )
             session.add(new_friction)
 
-        processed_event_ids.append(point['id'])
-
     session.commit()
 
-    if processed_event_ids:
-        session.query(RawEvent).filter(RawEvent.id.in_(processed_event_ids)).update(
-            {"processed_friction": True}, synchronize_session=False
-        )
-        session.commit()
-
-def process_friction(session: Session, account_id: int, start_time=None, end_time=None):
-    """Process friction points for an account (optionally time-bounded)."""
-    raw_events = load_raw_events(session, account_id, start_time, end_time)
+def load_event_history(session: Session, account_id: int, start_time=None, end_time=None):
+    """Like load_raw_events, but also reads events already moved to the Parquet archive (for recomputes)"""
+    history = read_event_history(session, account_id, start_time, end_time,
+                                 columns=["id", "account_id", "distinct_id", "session_id", "pathname", "timestamp"])
+    history = history.sort_values(["distinct_id", "session_id", "timestamp"], kind="stable")
+    return [event._replace(timestamp=event.timestamp.to_pydatetime()) for event in history.itertuples(index=False)]
+
+def process_friction(session: Session, account_id: int, start_time=None, end_time=None, include_archive=False):
+    """Process friction points for an account (optionally time-bounded, optionally over archived events too)."""
+    if include_archive:
+        raw_events = load_event_history(session, account_id, start_time, end_time)
+    else:
+        raw_events = load_raw_events(session, account_id, start_time, end_time)
 
     friction_points = []
     friction_points += detect_navigation_issues(raw_events)
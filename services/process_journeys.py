@@ -1,76 +1,53 @@
 from collections import defaultdict
 from sqlalchemy.orm import Session
 from models import JourneyStatusEnum, CompletionType
-from repositories.journeys import fetch_journeys, group_customer_journeys_by_journey_id
-from repositories.events import fetch_steps_for_journey
+from repositories.journeys import fetch_completion_stats, fetch_journey_accounts, fetch_template_customer_journeys
+from repositories.events import fetch_ideal_path
 from repositories.analytics import upsert_journey_analytics
 from repositories.friction import upsert_friction
-from calculators.completion import (
-    calculate_completion_rate, calculate_completed_journeys, calculate_completion_times
-)
-from calculators.indirect import (
-    calculate_indirect_completion_rate, extract_frequent_alternatives
-)
+from calculators.completion import calculate_completion_metrics_from_stats
+from calculators.indirect import extract_frequent_alt_clicks, extract_frequent_detours
 from calculators.repeats import calculate_repeated_behavior_all_journeys
-from calculators.dropoffs import calculate_drop_off_distribution
-from calculators.insights import generate_step_insights_from_ideal_path
+from calculators.dropoffs import calculate_drop_off_distribution_from_table
+from calculators.event_frame import build_event_frame
+from calculators.insights import generate_step_insights_from_frame
 from models.customer_journey import FrictionType
-
-def get_event_sequence_for_customer(session, journey):
-    # keep your original; consider moving to repositories/events later
-    from models import Event
-    events = (session.query(Event)
-              .filter(Event.customer_journey_id == journey.id)
-              .order_by(Event.timestamp).all())
-    return [{
-        "url": e.url,
-        "element": e.elements_chain,
-        "xPath": e.x_path,
-        "timestamp": int(e.timestamp.timestamp() * 1000),
-        "is_match": e.is_match,
-        "session_id": e.session_id,
-        "event_id": e.id
-    } for e in events]
+from services.event_processor_failed import record_missing_drop_offs
+from services.duration_sketches import sketch_percentiles, sync_duration_sketches
+from services.funnel_tree import ensure_funnel_tree
 
 def get_admin_path_for_journey(session, journey_id: int):
-    steps = fetch_steps_for_journey(session, journey_id)
-    return [{
-        "step": s.index,
-        "name": s.name,
-        "url": s.url,
-        "element": s.elements_chain,
-        "xPath": s.x_path,
-        "timestamp": s.created_at
-    } for s in steps]
+    return fetch_ideal_path(session, journey_id)
 
 def process_journey_metrics(session: Session, account_id: int):
-    journeys = fetch_journeys(session, account_id)
-    if not journeys:
+    # Status counts per journey, from one GROUP BY over CustomerJourney
+    completion_stats = fetch_completion_stats(session, account_id)
+    if not completion_stats:
         print(f"[DEBUG] No journeys found for account {account_id or 'ALL'}")
         return {}
 
-    journey_groups = group_customer_journeys_by_journey_id(journeys)
+    # Drop-offs are recorded when journeys fail; attribute any failed journey that missed that
+    record_missing_drop_offs(session, account_id)
 
-    if account_id is None:
-        account_id = journeys[0].account_id
+    journey_accounts = fetch_journey_accounts(session, list(completion_stats))
 
-    # 2) Aggregate metrics
-    completion_rates = calculate_completion_rate(journey_groups)
-    total_completed   = calculate_completed_journeys(journey_groups)
-    completion_times  = calculate_completion_times(journey_groups)
-    indirect_rates    = calculate_indirect_completion_rate(journey_groups)
+    # 1) Aggregate metrics
+    completion_rates, total_completed, indirect_rates = calculate_completion_metrics_from_stats(completion_stats)
 
-    # 3) Per journey
-    for journey_id, customer_journeys in journey_groups.items():
-        completed_journeys = [j for j in customer_journeys if j.status == JourneyStatusEnum.COMPLETED]
-        total_users        = len(customer_journeys)
+    # 2) Per journey, over the events of that journey's customer journeys only
+    for journey_id in sorted(completion_stats):
+        journey_account_id = account_id or journey_accounts[journey_id]
+        customer_journeys  = fetch_template_customer_journeys(session, journey_id)
+        frame              = build_event_frame(session, customer_journeys)
+        in_journey         = frame.journey_mask(template_id=journey_id)
+        stats              = completion_stats[journey_id]
+        total_users        = stats["total"]
         total_completions  = total_completed.get(journey_id, 0)
         completion_rate    = completion_rates.get(journey_id, 0)
-        completion_time    = completion_times.get(journey_id, 0)
         indirect_rate      = indirect_rates.get(journey_id, 0)
 
         # repeated
-        repeated_events_by_journey = calculate_repeated_behavior_all_journeys(customer_journeys, session)
+        repeated_events_by_journey = calculate_repeated_behavior_all_journeys(customer_journeys, session, frame=frame)
         aggregated_repeats = defaultdict(lambda: {"volume": 0, "total_users": total_users})
         for _, events in repeated_events_by_journey.items():
             for element_details, url, session_id, _ in events:
@@ -88,15 +65,22 @@ def process_journey_metrics(session: Session, account_id: int):
                 friction_rate=(data["volume"] / total_users) * 100 if total_users else 0,
                 total_users=total_users,
                 volume=data["volume"],
-                account_id=account_id,
+                account_id=journey_account_id,
             )
 
         # drop-offs
         ideal_path = get_admin_path_for_journey(session, journey_id)
-        _, _, drop_off_events = calculate_drop_off_distribution(customer_journeys, session, ideal_path)
-        drop_off_counts = defaultdict(int)
-        for element_details, url, session_id in drop_off_events:
-            drop_off_counts[(element_details, url, session_id)] += 1
+        _, _, drop_off_counts = calculate_drop_off_distribution_from_table(session, journey_id, ideal_path)
+
+        # funnel tree: the event pipeline maintains it; replay journeys that predate it
+        if ensure_funnel_tree(session, journey_id):
+            print(f"[INFO] Rebuilt funnel tree for journey {journey_id}")
+
+        # completion / step time percentiles
+        sketches = sync_duration_sketches(session, journey_account_id, journey_id, frame, in_journey,
+                                          expected=stats.get("timed_completed"))
+        completion_percentiles, step_percentiles = sketch_percentiles(sketches, ideal_path)
+        completion_time = completion_percentiles["p50"] if completion_percentiles else 0
 
         for (element_details, url, session_id), volume in drop_off_counts.items():
             upsert_friction(
@@ -110,23 +94,23 @@ def process_journey_metrics(session: Session, account_id: int):
                 friction_rate=(volume / total_users) * 100 if total_users else 0,
                 total_users=total_users,
                 volume=volume,
-                account_id=account_id,
+                account_id=journey_account_id,
             )
 
         # insights
-        direct_completed = [j for j in completed_journeys if j.completion_type == CompletionType.DIRECT]
-        completed_sequences = [
-            seq for j in direct_completed if (seq := get_event_sequence_for_customer(session, j))
-        ]
+        direct_completed = in_journey & frame.journey_mask(status=JourneyStatusEnum.COMPLETED,
+                                                           completion_type=CompletionType.DIRECT)
 
-        step_insights, delayed_events = generate_step_insights_from_ideal_path(
+        step_insights, delayed_events = generate_step_insights_from_frame(
             ideal_path_steps=ideal_path,
-            completed_journeys=completed_sequences,
+            frame=frame,
+            journey_mask=direct_completed,
             threshold=10,
             repeated_events={(ed, url): data["volume"] / total_users if total_users else 0
                              for (ed, url, _sid), data in aggregated_repeats.items()},
             drop_off_events={(ed, url): volume / total_users if total_users else 0
-                             for (ed, url, _sid), volume in drop_off_counts.items()}
+                             for (ed, url, _sid), volume in drop_off_counts.items()},
+            step_percentiles=step_percentiles,
         )
 
         for element_details, url, session_id, delay_ms in delayed_events:
@@ -141,26 +125,30 @@ def process_journey_metrics(session: Session, account_id: int):
                 friction_rate=(delay_ms / total_users) * 100 if total_users else 0,
                 total_users=total_users,
                 volume=delay_ms,
-                account_id=account_id,
+                account_id=journey_account_id,
             )
 
-        # indirect alt paths
-        indirect_completed = [j for j in completed_journeys if j.completion_type == CompletionType.INDIRECT]
-        frequent_alt_paths = extract_frequent_alternatives(indirect_completed, session)
+        # indirect alt paths: off-path clicks per url, and frequent ordered detours between ideal steps
+        indirect_completed = in_journey & frame.journey_mask(status=JourneyStatusEnum.COMPLETED,
+                                                             completion_type=CompletionType.INDIRECT)
+        frequent_alt_paths = extract_frequent_alt_clicks(frame, indirect_completed, ideal_path)
+        frequent_detours = extract_frequent_detours(frame, indirect_completed, ideal_path)
 
         upsert_journey_analytics(
             session=session,
             journey_id=str(journey_id),
-            account_id=account_id,
+            account_id=journey_account_id,
             completion_rate=completion_rate,
             total_completions=total_completions,
             total_users=total_users,
             indirect_rate=indirect_rate,
             completion_time_ms=completion_time,
+            completion_time_percentiles=completion_percentiles,
             total_steps=0,
             drop_off_distribution={},
             friction_score=0,
             frequent_alt_paths=frequent_alt_paths,
+            frequent_detours=frequent_detours,
             step_insights=step_insights,
         )
 
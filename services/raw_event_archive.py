@@ -0,0 +1,203 @@
+# services/raw_event_archive.py
+# Moves processed RawEvents older than RAW_EVENT_ARCHIVE_AFTER_DAYS out of Postgres into
+# zstd-compressed Parquet files, laid out as <root>/account_id=<id>/day=<YYYY-MM-DD>/<file>.parquet
+# (day of the event timestamp). The readers below give calculators column-projected access to the
+# archive, or to the archive plus the hot table, for full recomputes and backfills.
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from config import Config
+from models import RawEvent, StageWatermark
+from repositories.watermarks import STAGES
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 50_000
+
+# Archived columns (RawEvent attribute names); account_id and day come from the directory names
+ARCHIVE_COLUMNS = [
+    "id", "distinct_id", "session_id", "event", "event_type", "pathname",
+    "current_url", "elements_chain", "x_path", "timestamp", "ingested_at",
+]
+ARCHIVE_SCHEMA = pa.schema([
+    (name, pa.timestamp("us") if name in ("timestamp", "ingested_at") else pa.string())
+    for name in ARCHIVE_COLUMNS
+])
+PARTITIONING = ds.partitioning(
+    pa.schema([("account_id", pa.int64()), ("day", pa.string())]), flavor="hive"
+)
+
+
+def archive_root(root: Optional[str] = None) -> str:
+    return root or Config.RAW_EVENT_ARCHIVE_DIR
+
+
+def _slowest_watermark(session: Session, account_id: int):
+    """(ingestedAt, id) every stage has processed up to, or None if some stage has not started."""
+    watermarks = session.query(StageWatermark).filter_by(account_id=account_id).all()
+    if {w.stage for w in watermarks} < set(STAGES):
+        return None
+    return min((w.last_ingested_at, w.last_event_id) for w in watermarks)
+
+
+def _write_day(root: str, account_id: int, day: str, frame: pd.DataFrame):
+    directory = os.path.join(root, f"account_id={account_id}", f"day={day}")
+    os.makedirs(directory, exist_ok=True)
+
+    # Named after its content: a batch re-archived after a crash overwrites instead of duplicating
+    digest = hashlib.sha1("\0".join(frame["id"]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(directory, f"part-{digest}.parquet")
+    table = pa.Table.from_pandas(frame[ARCHIVE_COLUMNS], schema=ARCHIVE_SCHEMA, preserve_index=False)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def archive_account(session: Session, account_id: int, older_than_days: Optional[int] = None,
+                    root: Optional[str] = None, now: Optional[datetime] = None,
+                    batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move the account's events that every stage has processed and that arrived more than
+    `older_than_days` ago into the archive. Returns the number of events archived.
+    """
+    older_than_days = Config.RAW_EVENT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    if older_than_days <= 0:
+        return 0
+    slowest = _slowest_watermark(session, account_id)
+    if slowest is None:
+        return 0
+
+    root = archive_root(root)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    archived = 0
+
+    while True:
+        rows = (session.query(*(getattr(RawEvent, name) for name in ARCHIVE_COLUMNS))
+                .filter(RawEvent.account_id == account_id,
+                        RawEvent.ingested_at < cutoff,
+                        tuple_(RawEvent.ingested_at, RawEvent.id) <= tuple_(*slowest))
+                .order_by(RawEvent.ingested_at, RawEvent.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+
+        frame = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS)
+        days = frame["timestamp"].fillna(frame["ingested_at"]).dt.strftime("%Y-%m-%d")
+        for day, day_frame in frame.groupby(days):
+            _write_day(root, account_id, day, day_frame)
+
+        # Files are in place before the rows go
+        session.query(RawEvent).filter(RawEvent.id.in_(frame["id"].tolist())).delete(synchronize_session=False)
+        session.commit()
+        archived += len(frame)
+
+    if archived:
+        logger.info(f"Archived {archived} raw events of account {account_id} to {root}")
+    return archived
+
+
+def archive_raw_events(session: Session, account_ids: Optional[List[int]] = None, **kwargs) -> dict:
+    """archive_account() for the given accounts (default: every account with events). Returns {account_id: count}."""
+    if account_ids is None:
+        account_ids = [a for (a,) in session.query(RawEvent.account_id).distinct().all()]
+    return {account_id: archive_account(session, account_id, **kwargs) for account_id in account_ids}
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _archive_filter(account_id: int, start: Optional[datetime], end: Optional[datetime]):
+    expression = ds.field("account_id") == account_id
+    if start is not None:
+        expression &= ds.field("day") >= start.strftime("%Y-%m-%d")
+        expression &= ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us"))
+    if end is not None:
+        expression &= ds.field("day") <= end.strftime("%Y-%m-%d")
+        expression &= ds.field("timestamp") <= pa.scalar(end, pa.timestamp("us"))
+    return expression
+
+
+def _archive_dataset(root: str):
+    if not os.path.isdir(root):
+        return None
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING, exclude_invalid_files=True)
+    # without files the dataset only has the partition columns, and filters on the others fail
+    return dataset if dataset.files else None
+
+
+def archived_days(account_id: int, root: Optional[str] = None) -> List[str]:
+    """Days (YYYY-MM-DD) the account has archived events for, in order, from the directory names."""
+    directory = os.path.join(archive_root(root), f"account_id={account_id}")
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[len("day="):] for name in os.listdir(directory) if name.startswith("day="))
+
+
+def iter_archived_events(account_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         columns: Optional[List[str]] = None, root: Optional[str] = None,
+                         batch_size: int = ARCHIVE_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream archived events of one account as DataFrames, optionally bounded by event timestamp
+    (inclusive). Only `columns` are read from disk; day directories outside the range are skipped.
+    """
+    dataset = _archive_dataset(archive_root(root))
+    if dataset is None:
+        return
+    start, end = _naive_utc(start), _naive_utc(end)
+    scanner = dataset.scanner(columns=columns, filter=_archive_filter(account_id, start, end), batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_archived_events(account_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         columns: Optional[List[str]] = None, root: Optional[str] = None) -> pd.DataFrame:
+    """All archived events of one account matching the range, as one DataFrame."""
+    frames = list(iter_archived_events(account_id, start, end, columns=columns, root=root))
+    if not frames:
+        return pd.DataFrame(columns=columns or ["account_id", "day"] + ARCHIVE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_event_history(session: Session, account_id: int, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, columns: Optional[List[str]] = None,
+                       root: Optional[str] = None) -> pd.DataFrame:
+    """
+    Full event history of one account: the archive plus the rows still in RawEvent, sorted by
+    timestamp. `columns` are RawEvent attribute names (ARCHIVE_COLUMNS plus account_id).
+    """
+    columns = list(columns or ["account_id"] + ARCHIVE_COLUMNS)
+    start, end = _naive_utc(start), _naive_utc(end)
+
+    archived = read_archived_events(account_id, start, end, columns=columns, root=root)
+
+    query = (session.query(*(getattr(RawEvent, name) for name in columns))
+             .filter(RawEvent.account_id == account_id))
+    if start is not None:
+        query = query.filter(RawEvent.timestamp >= start)
+    if end is not None:
+        query = query.filter(RawEvent.timestamp <= end)
+    hot = pd.DataFrame(query.all(), columns=columns)
+
+    frames = [frame for frame in (archived, hot) if not frame.empty]
+    if not frames:
+        return hot
+    history = pd.concat(frames, ignore_index=True)
+    if "id" in history.columns:
+        # an event can briefly exist in both if archiving was interrupted before its delete committed
+        history = history.drop_duplicates(subset="id", keep="last")
+    if "timestamp" in history.columns:
+        history = history.sort_values("timestamp", kind="stable")
+    return history.reset_index(drop=True)
@@ -0,0 +1,152 @@
+# services/raw_event_partitions.py
+# RawEvent is range-partitioned by month of "ingestedAt" (migrations/0009_raw_event_partitions.sql).
+# This job keeps partitions created ahead of time and drops old months once every pipeline stage
+# has processed them. On a non-partitioned table (SQLite for local runs) the same month ranges are
+# emulated: retention deletes the month's rows instead of dropping a partition.
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.orm import Session
+from config import Config
+from models import RawEvent, RawEventId, StageWatermark
+from repositories.watermarks import STAGES
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_AHEAD = 2  # months
+PARTITION_NAME_RE = re.compile(r'^RawEvent_p(\d{4})_(\d{2})$')
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    year, month = divmod(ts.month - 1 + months, 12)
+    return month_start(ts).replace(year=ts.year + year, month=month + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"RawEvent_p{start:%Y_%m}"
+
+
+def is_partitioned(session: Session) -> bool:
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    relkind = session.execute(text("SELECT relkind FROM pg_class WHERE relname = 'RawEvent'")).scalar()
+    return relkind == "p"
+
+
+def ensure_partitions(session: Session, now: Optional[datetime] = None, ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """Create the monthly partitions from the current month to `ahead` months out. Returns the new ones."""
+    if not is_partitioned(session):
+        return []
+
+    existing = {name for name, _, _ in list_months(session)}
+    current = month_start(now or datetime.utcnow())
+    created = []
+    for offset in range(ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        if name in existing:
+            continue
+        session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "RawEvent" '
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"
+        ))
+        created.append(name)
+    session.commit()
+    return created
+
+
+def list_months(session: Session) -> List[Tuple[str, datetime, datetime]]:
+    """(name, start, end) of every month of RawEvent data: the partitions, or the emulated months."""
+    if is_partitioned(session):
+        names = session.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'RawEvent'"
+        )).scalars().all()
+        starts = []
+        for name in names:
+            match = PARTITION_NAME_RE.match(name)
+            if match:  # skips RawEvent_default
+                starts.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+    else:
+        first, last = session.query(func.min(RawEvent.ingested_at), func.max(RawEvent.ingested_at)).one()
+        starts = []
+        if first is not None:
+            start = month_start(first)
+            while start <= last:
+                starts.append(start)
+                start = add_months(start, 1)
+
+    return [(partition_name(start), start, add_months(start, 1)) for start in sorted(starts)]
+
+
+def month_fully_processed(session: Session, start: datetime, end: datetime) -> bool:
+    """True if every stage's watermark of every account with events in [start, end) is past them."""
+    in_month = (RawEvent.ingested_at >= start, RawEvent.ingested_at < end)
+    account_ids = [a for (a,) in session.query(RawEvent.account_id).filter(*in_month).distinct().all()]
+
+    for account_id in account_ids:
+        watermarks = {w.stage: w for w in session.query(StageWatermark).filter_by(account_id=account_id).all()}
+        if any(stage not in watermarks for stage in STAGES):
+            return False
+        slowest = min((w.last_ingested_at, w.last_event_id) for w in watermarks.values())
+        pending = (session.query(RawEvent.id)
+                   .filter(RawEvent.account_id == account_id, *in_month,
+                           tuple_(RawEvent.ingested_at, RawEvent.id) > tuple_(*slowest))
+                   .first())
+        if pending:
+            return False
+    return True
+
+
+def apply_retention(session: Session, retention_days: Optional[int] = None, now: Optional[datetime] = None) -> List[str]:
+    """
+    Drop the months that ended more than `retention_days` ago and are fully processed.
+    Returns the dropped month names.
+    """
+    retention_days = Config.RAW_EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    partitioned = is_partitioned(session)
+    dropped = []
+
+    for name, start, end in list_months(session):
+        if end > cutoff:
+            break
+        if not month_fully_processed(session, start, end):
+            logger.info(f"Keeping {name}: not fully processed yet")
+            continue
+
+        if partitioned:
+            session.execute(text(f'ALTER TABLE "RawEvent" DETACH PARTITION "{name}"'))
+            session.execute(text(f'DROP TABLE "{name}"'))
+            deleted = True
+        else:
+            deleted = session.query(RawEvent).filter(
+                RawEvent.ingested_at >= start, RawEvent.ingested_at < end
+            ).delete(synchronize_session=False)
+        # the month's ids can no longer be redelivered in practice; stop guarding them
+        session.query(RawEventId).filter(
+            RawEventId.ingested_at >= start, RawEventId.ingested_at < end
+        ).delete(synchronize_session=False)
+        session.commit()
+        if deleted:
+            dropped.append(name)
+
+    return dropped
+
+
+def maintain_raw_event_partitions(session: Session, now: Optional[datetime] = None):
+    created = ensure_partitions(session, now=now)
+    dropped = apply_retention(session, now=now)
+    logger.info(f"RawEvent partitions: created {created or 'none'}, dropped {dropped or 'none'}")
+    return {"created": created, "dropped": dropped}
@@ -0,0 +1,65 @@
+# services/summary_cache.py
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Account, AccountSummary
+from services.aggregators import build_summary_for_account
+
+
+def _get_or_create(session: Session, account_id: int) -> AccountSummary:
+    row = session.query(AccountSummary).filter_by(account_id=account_id).first()
+    if row is None:
+        row = AccountSummary(account_id=account_id, data_version=0)
+        try:
+            with session.begin_nested():
+                session.add(row)
+        except IntegrityError:
+            # created concurrently
+            row = session.query(AccountSummary).filter_by(account_id=account_id).one()
+    return row
+
+
+def invalidate_account_summary(session: Session, account_id: int) -> int:
+    """
+    Mark the cached summary as stale by bumping the account's data version.
+    Call it before writing data the summary is built from. Returns the new version.
+    """
+    row = _get_or_create(session, account_id)
+    # incremented in SQL, so concurrent invalidations cannot lose a bump
+    session.execute(update(AccountSummary)
+                    .where(AccountSummary.id == row.id)
+                    .values(data_version=AccountSummary.data_version + 1)
+                    .execution_options(synchronize_session=False))
+    session.commit()
+    return row.data_version
+
+
+def invalidate_account_summaries(session: Session, account_ids: Optional[Iterable[int]] = None):
+    """invalidate_account_summary() for the given accounts (default: every account)."""
+    if account_ids is None:
+        account_ids = [account_id for (account_id,) in session.query(Account.id).all()]
+    for account_id in account_ids:
+        invalidate_account_summary(session, account_id)
+
+
+def refresh_account_summary(session: Session, account_id: int) -> dict:
+    """Rebuild the summary from the usage tables and store it for the current data version."""
+    row = _get_or_create(session, account_id)
+    version = row.data_version
+    summary = build_summary_for_account(session, account_id)
+
+    row.summary = summary
+    row.summary_version = version
+    row.computed_at = datetime.utcnow()
+    session.commit()
+    return summary
+
+
+def get_account_summary(session: Session, account_id: int) -> dict:
+    """Return the cached summary, rebuilding it only if it was invalidated (or never built)."""
+    row = session.query(AccountSummary).filter_by(account_id=account_id).first()
+    if row is not None and row.summary is not None and row.summary_version == row.data_version:
+        return row.summary
+    return refresh_account_summary(session, account_id)
@@ -0,0 +1,180 @@
+# services/usage_backfill.py
+# One-off backfill of the PageUsageBucket / EventsUsageBucket rollups from the event history
+# (the Parquet archive plus RawEvent), for accounts whose events were processed before the
+# rollups existed. The buckets are rebuilt from scratch, a day of events at a time, from the
+# events each stage has already processed (up to its watermark); later events are left to the
+# page and event usage stages as usual.
+#
+#   python -m services.usage_backfill --accounts 1,2
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import EventsUsageBucket, PageSessionState, PageUsageBucket, RawEvent, StageWatermark
+from repositories.usage_rollups import GRANULARITIES, bucket_start, prune_hourly_buckets, upsert_events_usage_buckets
+from services.page_usage import MAX_DWELL_SECONDS, OPEN_PAGE_TTL, dump_counted_visits, write_page_usage_buckets
+from services.raw_event_archive import archived_days, read_event_history
+from utils.element_chain_utils import elements_chain_to_xpath
+
+HISTORY_COLUMNS = ["id", "distinct_id", "session_id", "pathname", "event_type", "elements_chain",
+                   "timestamp", "ingested_at"]
+
+
+def _locked_watermarks(session: Session, account_id: int) -> Dict[str, StageWatermark]:
+    """The page_time and event_usage watermarks, locked until the transaction ends."""
+    watermarks = (session.query(StageWatermark)
+                  .filter(StageWatermark.account_id == account_id,
+                          StageWatermark.stage.in_(("page_time", "event_usage")))
+                  .with_for_update()
+                  .all())
+    return {w.stage: w for w in watermarks}
+
+
+def _processed_by(frame: pd.DataFrame, watermark: Optional[StageWatermark]) -> pd.DataFrame:
+    """The rows of `frame` at or before the stage's watermark."""
+    if watermark is None:
+        return frame.iloc[0:0]
+    at, event_id = watermark.last_ingested_at, watermark.last_event_id
+    return frame[(frame["ingested_at"] < at) | ((frame["ingested_at"] == at) & (frame["id"] <= event_id))]
+
+
+def _history_days(session: Session, account_id: int) -> List[datetime]:
+    """Every day from the account's first event to its last, archived or in RawEvent."""
+    days = archived_days(account_id)
+    first, last = (session.query(func.min(RawEvent.timestamp), func.max(RawEvent.timestamp))
+                   .filter(RawEvent.account_id == account_id).one())
+    bounds = [datetime.strptime(day, "%Y-%m-%d") for day in (days[:1] + days[-1:])]
+    bounds += [bucket_start(ts, "day") for ts in (first, last) if ts is not None]
+    if not bounds:
+        return []
+    day, end = min(bounds), max(bounds)
+    result = []
+    while day <= end:
+        result.append(day)
+        day += timedelta(days=1)
+    return result
+
+
+class _PageBackfill:
+    """The page usage stage's rollup writes over consecutive days, with its open pages carried in memory."""
+
+    def __init__(self, session: Session, account_id: int):
+        self.session = session
+        self.account_id = account_id
+        self.open_pages = {}     # (distinct_id, session_id) -> (pathname, timestamp)
+        self.counted_visits = {}
+
+    def add_day(self, events: pd.DataFrame):
+        df = events[["distinct_id", "session_id", "pathname", "timestamp"]].assign(carried=False)
+        batch_sessions = set(zip(df["distinct_id"], df["session_id"]))
+        carried = pd.DataFrame([{
+            "distinct_id": distinct_id, "session_id": session_id,
+            "pathname": pathname, "timestamp": timestamp, "carried": True,
+        } for (distinct_id, session_id), (pathname, timestamp) in self.open_pages.items()
+            if (distinct_id, session_id) in batch_sessions],
+            columns=["distinct_id", "session_id", "pathname", "timestamp", "carried"])
+        if not carried.empty:
+            df = pd.concat([carried, df], ignore_index=True)
+
+        # as process_page_usage does
+        df = df.sort_values(by=["distinct_id", "session_id", "timestamp", "carried"],
+                            ascending=[True, True, True, False], kind="stable")
+        next_timestamp = df.groupby(["distinct_id", "session_id"])["timestamp"].shift(-1)
+        df["time_spent"] = (next_timestamp - df["timestamp"]).dt.total_seconds().clip(lower=0, upper=MAX_DWELL_SECONDS)
+        write_page_usage_buckets(self.session, self.account_id, df, self.counted_visits)
+
+        last_rows = df[~df["carried"]].dropna(subset=["distinct_id", "session_id"]) \
+            .groupby(["distinct_id", "session_id"]).tail(1)
+        for row in last_rows.itertuples(index=False):
+            self.open_pages[(row.distinct_id, row.session_id)] = (row.pathname, row.timestamp.to_pydatetime())
+        cutoff = df["timestamp"].max() - OPEN_PAGE_TTL
+        for key in [key for key, (_, timestamp) in self.open_pages.items() if timestamp < cutoff]:
+            del self.open_pages[key]
+            self.counted_visits.pop(key, None)
+
+    def save_counted_visits(self):
+        """Hand the counted visits of the still open sessions to their PageSessionState."""
+        states = self.session.query(PageSessionState).filter_by(account_id=self.account_id).all()
+        for state in states:
+            key = (state.distinct_id, state.session_id)
+            state.counted_visits = dump_counted_visits(self.counted_visits.get(key, ()), state.timestamp)
+
+
+def _add_event_day(session: Session, account_id: int, events: pd.DataFrame, xpaths: Dict[str, str]):
+    """The event usage stage's rollup writes for a day of events."""
+    bucket_counts = {granularity: defaultdict(int) for granularity in GRANULARITIES}
+    events = events.dropna(subset=["pathname", "event_type", "elements_chain", "timestamp"])
+    for pathname, event_type, elements_chain, timestamp in zip(events["pathname"], events["event_type"],
+                                                               events["elements_chain"], events["timestamp"]):
+        if not pathname or not event_type or not elements_chain:
+            continue
+        if elements_chain not in xpaths:
+            xpaths[elements_chain] = elements_chain_to_xpath(elements_chain)
+        for granularity, counts in bucket_counts.items():
+            start = bucket_start(timestamp.to_pydatetime(), granularity)
+            counts[(pathname, event_type, xpaths[elements_chain], start)] += 1
+    for granularity, counts in bucket_counts.items():
+        upsert_events_usage_buckets(session, account_id, granularity, counts)
+
+
+def backfill_usage_buckets(session: Session, account_id: int) -> dict:
+    """
+    Rebuild the account's usage rollups from its event history. Does not commit; the stages'
+    watermarks stay locked until the caller does, so the usage stages cannot run meanwhile.
+    Returns the number of events added to the page and event rollups.
+    """
+    watermarks = _locked_watermarks(session, account_id)
+    session.query(PageUsageBucket).filter_by(account_id=account_id).delete(synchronize_session=False)
+    session.query(EventsUsageBucket).filter_by(account_id=account_id).delete(synchronize_session=False)
+
+    pages = _PageBackfill(session, account_id)
+    xpaths = {}
+    stats = {"page_events": 0, "usage_events": 0}
+    for day in _history_days(session, account_id):
+        history = read_event_history(session, account_id, day, day + timedelta(days=1) - timedelta(microseconds=1),
+                                     columns=HISTORY_COLUMNS)
+        if history.empty:
+            continue
+        history["timestamp"] = pd.to_datetime(history["timestamp"])
+
+        page_events = _processed_by(history, watermarks.get("page_time"))
+        if not page_events.empty:
+            pages.add_day(page_events)
+            stats["page_events"] += len(page_events)
+
+        usage_events = _processed_by(history, watermarks.get("event_usage"))
+        if not usage_events.empty:
+            _add_event_day(session, account_id, usage_events, xpaths)
+            stats["usage_events"] += len(usage_events)
+        session.flush()
+
+    pages.save_counted_visits()
+    prune_hourly_buckets(session, account_id)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+    from db import db
+    from models import Account
+
+    parser = argparse.ArgumentParser(description="Backfill the usage rollups from the event history.")
+    parser.add_argument("--accounts", type=str, help="Comma-separated list of account IDs (default: all)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.accounts:
+            account_ids = [int(x) for x in args.accounts.split(",")]
+        else:
+            account_ids = [account.id for account in db.session.query(Account).all()]
+        for account_id in account_ids:
+            try:
+                stats = backfill_usage_buckets(db.session, account_id)
+                db.session.commit()
+                print(f"[SUCCESS] Backfilled usage rollups for account {account_id}: {stats}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[ERROR] Usage rollup backfill failed for account {account_id}: {e}")
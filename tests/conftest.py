@@ -0,0 +1,89 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+import pytest
+from flask import Flask
+from config import Config
+from db import db
+import models  # noqa: F401  registers every table on db.metadata
+from models import Account, CustomerJourney, Event, FunnelTreeNode
+from repositories import interning
+from repositories.interning import load_strings
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    """An empty Parquet archive of raw events per test."""
+    path = tmp_path / "raw_events"
+    monkeypatch.setattr(Config, "RAW_EVENT_ARCHIVE_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def app():
+    """A Flask app on a fresh in-memory SQLite database with every table created."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    interning._PROCESS_CACHE.clear()  # ids of another test's database
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def session(app):
+    return db.session
+
+
+@pytest.fixture
+def account(session):
+    account = Account(id=1, name="test", api_key="test_api_key")
+    session.add(account)
+    session.commit()
+    return account
+
+
+@pytest.fixture
+def matching_snapshot():
+    """
+    A function returning the matching results in the database, without ids: the customer
+    journeys, their events (interned strings resolved) and the funnel tree nodes (by path).
+    """
+    def snapshot(session):
+        journeys = session.query(CustomerJourney).all()
+        keys = {cj.id: (cj.person_id, cj.journey_id, cj.start_time) for cj in journeys}
+        events = session.query(Event).filter(Event.customer_journey_id.in_(list(keys))).all() if keys else []
+        strings = load_strings(session, [i for e in events for i in (e.url_id, e.x_path_id, e.elements_chain_id)])
+        nodes = {node.id: node for node in session.query(FunnelTreeNode)}
+
+        def node_path(node):
+            return () if node.parent_id is None else node_path(nodes[node.parent_id]) + (node.elements_chain,)
+
+        return {
+            "journeys": sorted((cj.person_id, cj.journey_id, cj.status.value,
+                                cj.completion_type and cj.completion_type.value, cj.current_step_index,
+                                cj.start_time, cj.end_time, cj.session_start_time, cj.total_steps)
+                               for cj in journeys),
+            "events": sorted((e.timestamp, e.person_id, keys[e.customer_journey_id], e.is_match, e.event_type,
+                              strings[e.url_id], strings[e.x_path_id], strings[e.elements_chain_id])
+                             for e in events),
+            "funnel_tree": sorted((node.journey_id, node_path(node), node.count, node.time_count,
+                                   node.anomaly_count, round(node.time_sum, 6)) for node in nodes.values()),
+        }
+    return snapshot
+
+
+@pytest.fixture
+def paths_routes(monkeypatch):
+    """routes/paths.py without the routes package __init__ (which pulls in the S3 upload routes)."""
+    package = types.ModuleType("routes")
+    package.__path__ = [str(Path(__file__).resolve().parents[1] / "routes")]
+    monkeypatch.setitem(sys.modules, "routes", package)
+    monkeypatch.delitem(sys.modules, "routes.paths", raising=False)
+    monkeypatch.delitem(sys.modules, "routes.journey_analysis", raising=False)
+    return importlib.import_module("routes.paths")
@@ -0,0 +1,79 @@
+import json
+from models import ButtonClassification
+from services.button_classifier import classify_elements
+from utils.element_chain_utils import get_comparison_key
+
+SAVE = 'button.btn.bg-blue-500:text="Save"attr__type="submit"attr__id="save";form.editor'
+SAVE_RESTYLED = 'button.btn.bg-blue-700.hover:text="Save"attr__type="submit"attr__id="save";form.editor'
+CANCEL = 'button.btn:text="Cancel"attr__type="button"attr__id="cancel";form.editor'
+SEARCH = 'input.search:attr__type="search"attr__name="q";div.header'
+
+
+class FakeClassifierClient:
+    """Answers every batch with the labels of `labels_by_text`, by each element's text."""
+
+    def __init__(self, labels_by_text, on_call=None):
+        self.labels_by_text = labels_by_text
+        self.on_call = on_call
+        self.batches = []
+
+    def chat(self, messages, **kwargs):
+        elements = json.loads(messages[-1]["content"])
+        self.batches.append(elements)
+        if self.on_call:
+            self.on_call()
+        return json.dumps({"labels": [self.labels_by_text.get(e["text"], "nonsense") for e in elements]})
+
+
+def test_classifies_each_distinct_element_once(session, account):
+    client = FakeClassifierClient({"Save": "submit", "Cancel": "cancel"})
+
+    labels = classify_elements(session, account.id, [SAVE, SAVE_RESTYLED, CANCEL, SAVE], client=client)
+
+    assert labels == {SAVE: "submit", SAVE_RESTYLED: "submit", CANCEL: "cancel"}
+    assert len(client.batches) == 1
+    assert len(client.batches[0]) == 2
+
+
+def test_cached_labels_skip_the_llm(session, account):
+    client = FakeClassifierClient({"Save": "submit", "Cancel": "cancel"})
+    classify_elements(session, account.id, [SAVE, CANCEL], client=client)
+
+    labels = classify_elements(session, account.id, [SAVE_RESTYLED, CANCEL], client=client)
+
+    assert labels == {SAVE_RESTYLED: "submit", CANCEL: "cancel"}
+    assert len(client.batches) == 1
+    assert session.query(ButtonClassification).count() == 2
+
+
+def test_unknown_labels_are_not_cached(session, account):
+    client = FakeClassifierClient({"Save": "submit"})
+
+    labels = classify_elements(session, account.id, [SAVE, SEARCH], client=client)
+
+    assert labels == {SAVE: "submit", SEARCH: "unknown"}
+    assert [row.label for row in session.query(ButtonClassification)] == ["submit"]
+
+
+def test_batches_are_bounded(session, account):
+    chains = [f'button:text="B{i}"attr__id="b{i}"' for i in range(7)]
+    client = FakeClassifierClient({f"B{i}": "other" for i in range(7)})
+
+    classify_elements(session, account.id, chains, client=client, batch_size=3)
+
+    assert [len(batch) for batch in client.batches] == [3, 3, 1]
+
+
+def test_concurrent_insert_keeps_the_rest_of_the_batch(session, account):
+    def classified_elsewhere():
+        # another run stores the Save button while this one waits for the LLM
+        session.add(ButtonClassification(account_id=account.id, comparison_key=get_comparison_key(SAVE), label="submit"))
+        session.commit()
+
+    client = FakeClassifierClient({"Save": "submit", "Cancel": "cancel"}, on_call=classified_elsewhere)
+
+    labels = classify_elements(session, account.id, [SAVE, CANCEL], client=client)
+
+    assert labels == {SAVE: "submit", CANCEL: "cancel"}
+    stored = {row.comparison_key: row.label for row in session.query(ButtonClassification)}
+    assert stored == {get_comparison_key(SAVE): "submit", get_comparison_key(CANCEL): "cancel"}
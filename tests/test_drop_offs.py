@@ -0,0 +1,62 @@
+import json
+from datetime import datetime, timedelta
+from models import CustomerJourney, Event, Journey, JourneyDropOff, JourneyLiveStatus, JourneyStatusEnum, Step
+import services.event_processor_failed as event_processor_failed
+from repositories.dropoffs import fetch_unattributed_failures
+from services.process_journeys import process_journey_metrics
+
+T0 = datetime(2025, 1, 15)
+
+
+def add_template(session, account_id, journey_id, steps):
+    session.add(Journey(id=journey_id, account_id=account_id, name=f"j{journey_id}", user_id=1, start_url="/",
+                        status=JourneyLiveStatus.ACTIVE, first_step=json.dumps({"url": "/a", "xpath": "//a"})))
+    for index, name in enumerate(steps):
+        step = Step(account_id=account_id, journey_id=journey_id, url=f"/{name}", page_title="", event_type="click",
+                    name=name, element="button", elements_chain=f"button:text=\"{name}\"", x_path=f"//{name}",
+                    screen_path="", index=index)
+        step.created_at = T0 + timedelta(seconds=index)
+        session.add(step)
+
+
+def add_failed_journey(session, account_id, journey_id, person, current_step_index):
+    cj = CustomerJourney(account_id=account_id, journey_id=journey_id, session_id=f"s-{person}", person_id=person,
+                         status=JourneyStatusEnum.FAILED, current_step_index=current_step_index,
+                         start_time=T0, end_time=T0 + timedelta(minutes=1), session_start_time=T0,
+                         total_steps=3)
+    session.add(cj)
+    session.flush()
+    session.add(Event(account_id=account_id, person_id=person, page_title="", element="", event_type="click",
+                      url="/a", x_path="//a", elements_chain="button", customer_journey_id=cj.id,
+                      session_id=cj.session_id, timestamp=T0, is_match=True))
+    return cj
+
+
+def test_second_metrics_run_attributes_nothing(session, account, monkeypatch):
+    add_template(session, account.id, 1, ["a", "b", "c"])
+    add_template(session, account.id, 2, [])  # no ideal steps (yet)
+    attributable = add_failed_journey(session, account.id, 1, "p1", 1)
+    no_step = add_failed_journey(session, account.id, 1, "p2", 0)
+    add_failed_journey(session, account.id, 2, "p3", 1)
+    # older rows have no current step (the column default only applies to new ones)
+    session.query(CustomerJourney).filter_by(id=no_step.id).update({"current_step_index": None})
+    session.commit()
+
+    loaded = []
+    fetch_customer_journeys = event_processor_failed.fetch_customer_journeys
+
+    def recording(session, ids, *args, **kwargs):
+        loaded.append(sorted(ids))
+        return fetch_customer_journeys(session, ids, *args, **kwargs)
+    monkeypatch.setattr(event_processor_failed, "fetch_customer_journeys", recording)
+
+    process_journey_metrics(session, account.id)
+    session.commit()
+    assert loaded == [[attributable.id]]
+    assert [d.customer_journey_id for d in session.query(JourneyDropOff)] == [attributable.id]
+
+    process_journey_metrics(session, account.id)
+    session.commit()
+    assert loaded[1:] == [[]]
+    assert fetch_unattributed_failures(session, account.id) == []
+    assert session.query(JourneyDropOff).count() == 1
@@ -0,0 +1,83 @@
+from itertools import groupby
+import pytest
+from benchmarks.synthetic_events import Workload, WorkloadConfig, insert_events
+from services.event_processor import process_raw_events
+
+# No late arrivals: the materialized tree takes a journey's clicks as they are matched, the
+# computed one sorts them by time
+WORKLOAD = WorkloadConfig(seed=3, persons=40, days=2, templates=2, late_share=0.0)
+
+
+@pytest.fixture
+def client(app, session, account, paths_routes):
+    workload = Workload(WORKLOAD)
+    journey_ids = workload.create_journeys(session, account.id)
+    session.commit()
+    events = sorted(workload.iter_events(), key=lambda event: event["ingested_at"])
+    for _, day in groupby(events, key=lambda event: event["ingested_at"].date()):
+        insert_events(session, account.id, list(day))
+        process_raw_events(session, account.id, workers=1)
+    app.register_blueprint(paths_routes.paths_blueprint, url_prefix="/api/paths")
+    client = app.test_client()
+    client.journey_ids = journey_ids
+    return client
+
+
+def shape(tree):
+    """The tree without node ids and anomaly times, which the two sources do not share."""
+    return {
+        "url": tree["url"],
+        "elements_chain": tree["elements_chain"],
+        "xpath": tree.get("xpath"),
+        "pageTitle": tree.get("pageTitle"),
+        "ideal": tree.get("ideal", False),
+        "count": tree["count"],
+        "avg_time": round(tree["avg_time"], 3),  # summed in a different order
+        "anomaly_count": tree["anomaly_count"],
+        "children": {key: shape(child) for key, child in tree["children"].items()},
+    }
+
+
+def depth(tree):
+    return 1 + max((depth(child) for child in tree["children"].values()), default=0)
+
+
+@pytest.mark.parametrize("pruning", ["", "max_depth=2", "min_count=3", "max_depth=3&min_count=2"])
+def test_materialized_tree_matches_the_computed_one(client, pruning):
+    for journey_id in client.journey_ids:
+        materialized = client.get(f"/api/paths/build_funnel_tree/{journey_id}?{pruning}")
+        computed = client.get(f"/api/paths/build_funnel_tree/{journey_id}?sample=1&{pruning}")  # windowed
+
+        assert materialized.status_code == computed.status_code == 200
+        assert materialized.json["children"]
+        assert shape(materialized.json) == shape(computed.json)
+
+
+def test_pruning_drops_deep_and_rare_nodes(client):
+    journey_id = client.journey_ids[0]
+    full = client.get(f"/api/paths/build_funnel_tree/{journey_id}").json
+
+    shallow = client.get(f"/api/paths/build_funnel_tree/{journey_id}?max_depth=2").json
+    frequent = client.get(f"/api/paths/build_funnel_tree/{journey_id}?min_count=3").json
+
+    assert depth(full) > 3 and depth(shallow) == 3  # the root and two clicks
+    counts = []
+
+    def collect(tree):
+        for child in tree["children"].values():
+            counts.append(child["count"])
+            collect(child)
+    collect(frequent)
+    assert counts and min(counts) >= 3
+    assert shape(frequent) != shape(full)
+
+
+def test_journey_serves_the_materialized_tree(client):
+    journey_id = client.journey_ids[1]
+
+    response = client.get(f"/api/paths/journey/{journey_id}")
+
+    assert response.status_code == 200
+    materialized = client.get(f"/api/paths/build_funnel_tree/{journey_id}").json
+    computed = client.get(f"/api/paths/journey/{journey_id}?sample=1").json["funnel_tree"]
+    assert shape(response.json["funnel_tree"]) == shape(materialized) == shape(computed)
@@ -0,0 +1,76 @@
+import datetime
+from models import AccountSummary
+from models.customer_journey import Insights
+from services.ai_client import StubChatClient
+from services.insights import generate_insights, generate_insights_for_accounts
+
+SUMMARY = {"topFields": [{"action": "click //button", "count": 3, "page": "/"}], "pageUsage": []}
+
+
+def store_summary(session, account_id, summary, version=1):
+    """A current cached summary, so get_account_summary does not rebuild it (that SQL is Postgres-only)."""
+    row = session.query(AccountSummary).filter_by(account_id=account_id).first()
+    if row is None:
+        row = AccountSummary(account_id=account_id)
+        session.add(row)
+    row.summary, row.data_version, row.summary_version = summary, version, version
+    session.commit()
+
+
+def test_unchanged_summary_reuses_cached_html(session, account):
+    store_summary(session, account.id, SUMMARY)
+    client = StubChatClient(html="<h2>First</h2>")
+
+    first = generate_insights(session, account.id, client=client, max_age_hours=24)
+    client.html = "<h2>Second</h2>"
+    second = generate_insights(session, account.id, client=client, max_age_hours=24)
+
+    assert len(client.calls) == 1
+    assert second.id == first.id
+    assert second.insights == "<h2>First</h2>"
+    assert session.query(Insights).count() == 1
+
+
+def test_changed_summary_regenerates(session, account):
+    store_summary(session, account.id, SUMMARY)
+    client = StubChatClient()
+    generate_insights(session, account.id, client=client, max_age_hours=24)
+
+    store_summary(session, account.id, {**SUMMARY, "pageUsage": [{"page": "/", "visits": 1}]}, version=2)
+    generate_insights(session, account.id, client=client, max_age_hours=24)
+
+    assert len(client.calls) == 2
+
+
+def test_expired_ttl_regenerates(session, account):
+    store_summary(session, account.id, SUMMARY)
+    client = StubChatClient(html="<h2>Old</h2>")
+    old = generate_insights(session, account.id, client=client, max_age_hours=24)
+    old.created_at = datetime.datetime.utcnow() - datetime.timedelta(hours=25)
+    session.commit()
+
+    client.html = "<h2>New</h2>"
+    new = generate_insights(session, account.id, client=client, max_age_hours=24)
+
+    assert len(client.calls) == 2
+    assert new.id != old.id
+    assert new.insights == "<h2>New</h2>"
+
+
+def test_zero_ttl_disables_the_cache(session, account):
+    store_summary(session, account.id, SUMMARY)
+    client = StubChatClient()
+    generate_insights(session, account.id, client=client, max_age_hours=0)
+    generate_insights(session, account.id, client=client, max_age_hours=0)
+
+    assert len(client.calls) == 2
+
+
+def test_batch_reuses_cached_html(session, account):
+    store_summary(session, account.id, SUMMARY)
+    client = StubChatClient()
+    first = generate_insights_for_accounts(session, [account.id], client=client, max_age_hours=24)
+    second = generate_insights_for_accounts(session, [account.id], client=client, max_age_hours=24)
+
+    assert len(client.calls) == 1
+    assert second[account.id].id == first[account.id].id
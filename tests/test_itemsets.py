@@ -0,0 +1,45 @@
+import random
+from itertools import combinations
+import pytest
+from calculators.itemsets import mine_frequent_itemsets
+
+
+def brute_force_itemsets(transactions, min_support, max_len):
+    """{itemset: count} of every itemset (sorted tuple) up to max_len with the given support."""
+    sets = [set(t) for t in transactions]
+    vocabulary = sorted(set().union(*sets))
+    found = {}
+    for length in range(1, max_len + 1):
+        for itemset in combinations(vocabulary, length):
+            count = sum(1 for s in sets if s.issuperset(itemset))
+            if count / len(sets) >= min_support:
+                found[itemset] = count
+    return found
+
+
+def random_transactions(seed, n):
+    rng = random.Random(seed)
+    items = [f"/page{i}|click{j}" for i in range(6) for j in range(2)]
+    weights = [1 / (k + 1) for k in range(len(items))]  # a few items in most transactions
+    return [rng.choices(items, weights=weights, k=rng.randint(1, 8)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("min_support", [0.01, 0.05, 0.2])
+def test_itemsets_match_brute_force(seed, min_support):
+    transactions = random_transactions(seed, 400)
+
+    mined = mine_frequent_itemsets(transactions, min_support, max_len=4)
+
+    assert {items: count for items, count, _ in mined} == brute_force_itemsets(transactions, min_support, 4)
+    assert all(support == count / len(transactions) for _, count, support in mined)
+    assert [len(items) for items, _, _ in mined] == sorted(len(items) for items, _, _ in mined)
+
+
+def test_support_boundary_is_inclusive():
+    transactions = [["a", "b"]] * 3 + [["a"]] * 7  # {"b"} has a support of exactly 0.3
+
+    mined = {items: count for items, count, _ in mine_frequent_itemsets(transactions, 0.3)}
+
+    assert mined == {("a",): 10, ("b",): 3, ("a", "b"): 3}
+    assert mine_frequent_itemsets([], 0.1) == []
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from itertools import groupby
+import pytest
+from benchmarks.synthetic_events import Workload, WorkloadConfig, insert_events
+from models import CustomerJourney, CustomerJourneyRecompute, EventRecompute, JourneyRecompute
+from services.event_processor import process_raw_events
+from services.journey_recompute import recompute_journeys
+
+# No late arrivals: the live matcher takes events in arrival batches and the replay in event time,
+# which only agree when no event arrives after a later one of the same person has been matched
+WORKLOAD = WorkloadConfig(seed=9, persons=60, days=3, templates=3, late_share=0.0)
+
+
+@pytest.fixture
+def matched(session, account):
+    """The workload matched by process_raw_events a day of arrivals at a time; returns the template ids."""
+    workload = Workload(WORKLOAD)
+    journey_ids = workload.create_journeys(session, account.id)
+    session.commit()
+    events = sorted(workload.iter_events(), key=lambda event: event["ingested_at"])
+    for _, day in groupby(events, key=lambda event: event["ingested_at"].date()):
+        insert_events(session, account.id, list(day))
+        process_raw_events(session, account.id, workers=1)
+    return journey_ids
+
+
+def assert_no_shadow_rows(session):
+    assert session.query(CustomerJourneyRecompute).count() == 0
+    assert session.query(EventRecompute).count() == 0
+
+
+def test_recompute_rebuilds_the_same_journeys(session, account, matched, matching_snapshot):
+    before = matching_snapshot(session)
+    assert len(before["journeys"]) > 50
+
+    for journey_id in matched:
+        run = recompute_journeys(session, account.id, journey_id)
+        assert run.status == "SWAPPED"
+        assert run.journeys_rebuilt == sum(1 for j in before["journeys"] if j[1] == journey_id)
+
+    after = matching_snapshot(session)
+    for part in before:
+        assert after[part] == before[part], part
+    assert_no_shadow_rows(session)
+
+
+def test_recompute_of_a_range_leaves_the_other_journeys_alone(session, account, matched, matching_snapshot):
+    journey_id = matched[0]
+    start = WORKLOAD.start + timedelta(days=1)
+    end = start + timedelta(days=1)
+
+    def outside_range():
+        return sorted((cj.id, cj.journey_id, cj.start_time, cj.status, cj.current_step_index, cj.end_time)
+                      for cj in session.query(CustomerJourney)
+                      if cj.journey_id != journey_id or not start <= cj.start_time < end)
+
+    untouched = outside_range()
+    inside = [cj.id for cj in session.query(CustomerJourney).filter(CustomerJourney.journey_id == journey_id,
+                                                                   CustomerJourney.start_time >= start,
+                                                                   CustomerJourney.start_time < end)]
+    before = matching_snapshot(session)
+    assert inside
+
+    run = recompute_journeys(session, account.id, journey_id, start, end)
+
+    assert (run.status, run.range_start, run.range_end) == ("SWAPPED", start, end)
+    assert run.journeys_rebuilt == len(inside)
+    assert outside_range() == untouched
+    assert session.query(CustomerJourney).filter(CustomerJourney.id.in_(inside)).count() == 0  # replaced
+    assert matching_snapshot(session) == before
+    assert_no_shadow_rows(session)
+    assert session.query(JourneyRecompute).count() == 1
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytest
+from models import CustomerJourney, Event, JourneyStatusEnum
+from repositories.journeys import iter_customer_journey_chunks
+
+T0 = datetime(2025, 1, 15)
+
+
+@pytest.fixture
+def journeys(session, account):
+    """25 customer journeys of template 1, an hour apart, each with three events (out of insertion order)."""
+    rows = []
+    for i in range(25):
+        start = T0 + timedelta(hours=i)
+        cj = CustomerJourney(account_id=account.id, journey_id=1, session_id=f"s{i}", person_id=f"p{i}",
+                             status=JourneyStatusEnum.COMPLETED, current_step_index=3, start_time=start,
+                             end_time=start, session_start_time=start, total_steps=3)
+        session.add(cj)
+        session.flush()
+        for second in (2, 0, 1):
+            session.add(Event(account_id=account.id, person_id=cj.person_id, page_title="", element="",
+                              event_type="click", url=f"/page{second}", x_path="", elements_chain=f"e{second}",
+                              customer_journey_id=cj.id, session_id=cj.session_id,
+                              timestamp=start + timedelta(seconds=second)))
+        rows.append(cj)
+    session.add(CustomerJourney(account_id=account.id, journey_id=2, session_id="other", person_id="p0",
+                                status=JourneyStatusEnum.COMPLETED, current_step_index=3, start_time=T0,
+                                end_time=T0, session_start_time=T0, total_steps=3))
+    session.commit()
+    return rows
+
+
+@pytest.mark.parametrize("query", ["start=yesterday", "end=2025-13-01", "sample=0", "sample=1.5", "sample=x",
+                                   "limit=0", "limit=-3", "limit=many"])
+def test_bad_windows_are_rejected(app, paths_routes, query):
+    app.register_blueprint(paths_routes.paths_blueprint, url_prefix="/api/paths")
+    client = app.test_client()
+
+    for route in ("journey", "build_funnel_tree"):
+        response = client.get(f"/api/paths/{route}/1?{query}")
+
+        assert response.status_code == 400
+        assert response.json["error"].startswith("Invalid journey window")
+
+
+def test_parse_journey_window(paths_routes):
+    parse = paths_routes.parse_journey_window
+
+    assert parse({}) == {"start": None, "end": None, "sample": 1.0, "limit": paths_routes.DEFAULT_JOURNEY_LIMIT}
+    # a bare end date takes in that whole day, a datetime is kept as it is
+    assert parse({"start": "2025-01-15", "end": "2025-01-16"})["end"] == datetime(2025, 1, 16, 23, 59, 59, 999999)
+    assert parse({"end": "2025-01-16T12:00:00"})["end"] == datetime(2025, 1, 16, 12)
+    assert parse({"start": "2025-01-15"})["start"] == T0
+    assert parse({"limit": "50", "sample": "0.5"})["limit"] == 50
+    assert parse({"limit": str(10 ** 9)})["limit"] == paths_routes.MAX_JOURNEY_LIMIT
+
+
+@pytest.mark.parametrize("chunk_size, limit, sizes", [(7, None, [7, 7, 7, 4]), (5, None, [5] * 5),
+                                                      (7, 10, [7, 3]), (7, 14, [7, 7]), (30, 3, [3])])
+def test_chunks_follow_the_ids_down(session, journeys, chunk_size, limit, sizes):
+    chunks = list(iter_customer_journey_chunks(session, 1, limit=limit, chunk_size=chunk_size))
+
+    assert [len(rows) for rows, _ in chunks] == sizes
+    ids = [row.id for rows, _ in chunks for row in rows]
+    assert ids == sorted((cj.id for cj in journeys), reverse=True)[:sum(sizes)]  # newest first, none twice
+    for rows, events in chunks:
+        assert sorted(events) == sorted(row.id for row in rows)  # only the chunk's own journeys
+        for row in rows:
+            assert [e["elements_chain"] for e in events[row.id]] == ["e0", "e1", "e2"]
+
+
+def test_chunks_of_a_window(session, journeys):
+    start, end = T0 + timedelta(hours=5), T0 + timedelta(hours=14)
+
+    chunks = list(iter_customer_journey_chunks(session, 1, start, end, chunk_size=4))
+
+    assert [len(rows) for rows, _ in chunks] == [4, 4, 2]
+    assert sorted(row.start_time for rows, _ in chunks for row in rows) == \
+        [start + timedelta(hours=h) for h in range(10)]  # both ends included
+    assert list(iter_customer_journey_chunks(session, 3)) == []
+
+
+def test_truncated_when_the_limit_leaves_journeys_out(session, journeys, paths_routes):
+    window = paths_routes.get_journey_data(1, limit=10)["window"]
+    assert (window["journeys_analyzed"], window["journeys_matching"], window["truncated"]) == (10, 25, True)
+
+    data = paths_routes.get_journey_data(1, end=T0 + timedelta(hours=9), limit=10)
+    assert len(data["user_journeys"]) == 10
+    assert (data["window"]["journeys_matching"], data["window"]["truncated"]) == (10, False)
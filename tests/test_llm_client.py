@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from config import Config
+from models import AccountSummary
+from models.customer_journey import Insights
+from services.insights import generate_insights, generate_insights_for_accounts
+from services.llm_client import LLMClient, LLMError, run_concurrently
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible /chat/completions on localhost. Replies are taken from `script`
+    ((status, headers) per request, then 200s); each reply is delayed by `delay` seconds.
+    """
+
+    def __init__(self, script=(), delay=0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.requests = []   # (time received, parsed body)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests.append((time.monotonic(), body))
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    status, headers = fake.script.pop(0) if fake.script else (200, {})
+                time.sleep(fake.delay)
+                with fake.lock:
+                    fake.in_flight -= 1
+
+                payload = {"choices": [{"message": {"content": f"<p>{body['messages'][-1]['content']}</p>"}}]} \
+                    if status == 200 else {"error": "scripted failure"}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(script=(), delay=0.0):
+        server = FakeLLMServer(script, delay)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def chat(client, text="hi"):
+    return client.chat([{"role": "user", "content": text}], model="test-model")
+
+
+def test_base_url_comes_from_config(fake_server, monkeypatch):
+    server = fake_server()
+    monkeypatch.setattr(Config, "LLM_BASE_URL", server.url)
+
+    assert chat(LLMClient(api_key="test")) == "<p>hi</p>"
+    assert server.requests[0][1]["model"] == "test-model"
+
+
+def test_retries_server_errors(fake_server):
+    server = fake_server([(503, {}), (500, {})])
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=3, backoff_seconds=0.01)
+
+    assert chat(client) == "<p>hi</p>"
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_max_retries(fake_server):
+    server = fake_server([(503, {})] * 5)
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=2, backoff_seconds=0.01)
+
+    with pytest.raises(LLMError):
+        chat(client)
+    assert len(server.requests) == 3
+
+
+def test_does_not_retry_client_errors(fake_server):
+    server = fake_server([(400, {})])
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=3, backoff_seconds=0.01)
+
+    with pytest.raises(LLMError):
+        chat(client)
+    assert len(server.requests) == 1
+
+
+def test_honours_retry_after(fake_server):
+    server = fake_server([(429, {"Retry-After": "0.3"})])
+    # the jittered backoff alone would wait at most 10ms
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=1, backoff_seconds=0.01)
+
+    assert chat(client) == "<p>hi</p>"
+    (first, _), (second, _) = server.requests
+    assert second - first >= 0.3
+
+
+def test_retry_after_is_capped(fake_server):
+    server = fake_server([(429, {"Retry-After": "120"})])
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=1, max_backoff_seconds=0.2)
+
+    started = time.monotonic()
+    assert chat(client) == "<p>hi</p>"
+    assert time.monotonic() - started < 5
+
+
+def test_fan_out_is_bounded(fake_server):
+    server = fake_server(delay=0.1)
+    client = LLMClient(api_key="test", base_url=server.url)
+
+    calls = run_concurrently(lambda text: chat(client, text), [str(i) for i in range(8)], max_workers=3)
+
+    assert [result for _, result, _ in calls] == [f"<p>{i}</p>" for i in range(8)]
+    assert all(error is None for _, _, error in calls)
+    assert server.max_in_flight == 3
+
+
+def test_failed_insight_is_not_saved(session, account, fake_server):
+    session.add(AccountSummary(account_id=account.id, summary={"pages": []}, data_version=1, summary_version=1))
+    session.commit()
+    server = fake_server([(400, {})] * 2)
+    client = LLMClient(api_key="test", base_url=server.url, max_retries=0)
+
+    assert generate_insights_for_accounts(session, [account.id], client=client) == {account.id: None}
+    with pytest.raises(LLMError):
+        generate_insights(session, account.id, client=client)
+    assert session.query(Insights).count() == 0
+
+    insight = generate_insights(session, account.id, client=client)
+    assert insight.insights.startswith("<p>")
+    assert session.query(Insights).count() == 1
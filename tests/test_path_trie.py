@@ -0,0 +1,81 @@
+import random
+from utils.path_trie import PathTrie
+
+
+def add_path(trie, path, ideal=False):
+    """Record a path of (key, elapsed) steps from the root."""
+    node = trie.root
+    node.record()
+    for key, elapsed in path:
+        node = trie.add(node, key, url=key[0], xpath=key[1], ideal=ideal)
+        node.record(elapsed, anomaly=elapsed is not None and elapsed > 30)
+
+
+def summary(trie):
+    """{path of keys: (count, time_sum, time_count, anomaly_count, ideal)} of every node."""
+    paths, result = {}, {}
+    for _, parent, node in trie.walk():
+        path = paths[id(node)] = () if parent is None else paths[id(parent)] + (node.key,)
+        result[path] = (node.count, round(node.time_sum, 6), node.time_count, node.anomaly_count, node.ideal)
+    return result
+
+
+def random_paths(rng, n):
+    keys = [(f"/page{i}", f"//button[{j}]") for i in range(3) for j in range(2)]
+    return [[(rng.choice(keys), rng.choice([None, rng.uniform(0, 60)])) for _ in range(rng.randint(0, 5))]
+            for _ in range(n)]
+
+
+def test_add_and_find_intern_keys():
+    trie = PathTrie()
+    a = trie.add(trie.root, ("/a", "//x"), url="/a")
+    b = trie.add(a, ("/a", "//x"))
+    assert trie.add(trie.root, ("/a", "//x"), url="/other") is a  # found, attrs of the first add kept
+    assert a.url == "/a" and b is not a
+
+    assert trie.find(trie.root, ("/a", "//x")) is a
+    assert trie.find(a, ("/a", "//x")) is b
+    assert trie.find(b, ("/a", "//x")) is None
+    assert trie.find(trie.root, ("/b", "//x")) is None
+    assert trie.size == 3
+    assert list(trie.root.children) == list(a.children) == [trie.key_id(("/a", "//x"))] == [0]
+
+
+def test_record_aggregates():
+    node = PathTrie().root
+    node.record()
+    node.record(2.0)
+    node.record(4.0, anomaly=True)
+
+    assert (node.count, node.time_sum, node.time_count, node.anomaly_count) == (3, 6.0, 2, 1)
+    assert node.avg_time == 3.0
+    assert PathTrie().root.avg_time == 0
+
+
+def test_walk_yields_parents_first_in_insertion_order():
+    trie = PathTrie()
+    for path in (["a", "b"], ["c"], ["a", "d", "e"], ["a", "b", "f"]):
+        node = trie.root
+        for key in path:
+            node = trie.add(node, key)
+
+    assert [(depth, parent and parent.key, node.key) for depth, parent, node in trie.walk()] == [
+        (0, None, None), (1, None, "a"), (2, "a", "b"), (3, "b", "f"), (2, "a", "d"), (3, "d", "e"), (1, None, "c"),
+    ]
+
+
+def test_merge_adds_up_counts_times_and_the_ideal_flag():
+    rng = random.Random(4)
+    paths = random_paths(rng, 200)
+    ideal = paths[:3]
+
+    left, right, everything = PathTrie(), PathTrie(), PathTrie()
+    for i, path in enumerate(paths):
+        add_path(left if i % 3 else right, path, ideal=path in ideal)
+        add_path(everything, path, ideal=path in ideal)
+    left.merge(right)
+
+    merged = summary(left)
+    assert merged == summary(everything)
+    assert 0 < sum(ideal for *_, ideal in merged.values()) < len(merged)
+    assert left.size == everything.size == len(summary(everything))
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from models import RawEvent, RawEventId
+from repositories.raw_events import claim_raw_event_id
+from repositories.watermarks import STAGES, advance_watermark
+from services.raw_event_partitions import apply_retention
+
+T0 = datetime(2025, 1, 15)
+
+
+def ingest(session, account_id, event_id, ingested_at):
+    """What the ingest route does with an event."""
+    if not claim_raw_event_id(session, event_id, account_id, ingested_at):
+        return False
+    session.add(RawEvent(id=event_id, account_id=account_id, distinct_id="u", ingested_at=ingested_at))
+    session.commit()
+    return True
+
+
+def test_redelivered_event_is_stored_once(session, account):
+    assert ingest(session, account.id, "e1", T0)
+    # a redelivery arrives later, so its (id, ingestedAt) key alone would not conflict
+    assert not ingest(session, account.id, "e1", T0 + timedelta(minutes=5))
+    assert ingest(session, account.id, "e2", T0 + timedelta(minutes=5))
+
+    assert sorted(id for (id,) in session.query(RawEvent.id)) == ["e1", "e2"]
+    assert session.query(RawEventId).count() == 2
+
+
+def test_rejected_duplicate_keeps_the_session_usable(session, account):
+    session.add(RawEvent(id="other", account_id=account.id, ingested_at=T0))
+    assert claim_raw_event_id(session, "e1", account.id, T0)
+    assert not claim_raw_event_id(session, "e1", account.id, T0)
+    session.commit()
+
+    assert session.query(RawEvent).count() == 1
+
+
+def test_retention_drops_the_ids_with_their_month(session, account):
+    ingest(session, account.id, "old", datetime(2024, 1, 10))
+    ingest(session, account.id, "new", datetime(2025, 6, 10))
+    for stage in STAGES:
+        advance_watermark(session, account.id, stage, datetime(2025, 6, 10), "new")
+    session.commit()
+
+    dropped = apply_retention(session, retention_days=30, now=datetime(2025, 6, 20))
+
+    assert dropped == ["RawEvent_p2024_01"]
+    assert [id for (id,) in session.query(RawEventId.id)] == ["new"]
@@ -0,0 +1,51 @@
+import importlib.util
+import json
+from datetime import datetime
+from pathlib import Path
+import pytest
+from models import Journey, JourneyLiveStatus, JourneyRecompute, RawEvent
+import services.journey_recompute as journey_recompute
+
+T0 = datetime(2025, 1, 15)
+
+
+def load_process_routes():
+    """routes/process_routes.py on its own (the routes package pulls in the S3 upload routes)."""
+    path = Path(__file__).resolve().parents[1] / "routes" / "process_routes.py"
+    spec = importlib.util.spec_from_file_location("process_routes_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def client(app, session, account):
+    session.add(Journey(id=1, account_id=account.id, name="checkout", user_id=1, start_url="/",
+                        status=JourneyLiveStatus.ACTIVE, first_step=json.dumps({"url": "/a", "xpath": "//a"})))
+    session.add(RawEvent(id="e1", account_id=account.id, distinct_id="u", event_type="click",
+                         timestamp=T0, ingested_at=T0))
+    session.commit()
+    app.register_blueprint(load_process_routes().process_blueprint, url_prefix="/api/process")
+    return app.test_client()
+
+
+@pytest.mark.parametrize("body", [{}, {"journey_id": "x"}, {"journey_id": 1, "start": "yesterday"},
+                                  {"journey_id": 2}, {"journey_id": 1, "start": "2025-02-01", "end": "2025-01-01"}])
+def test_invalid_request_is_rejected_without_a_run(client, session, body):
+    response = client.post("/api/process/1/recompute", json=body)
+
+    assert response.status_code == 400
+    assert session.query(JourneyRecompute).count() == 0
+
+
+def test_failed_replay_returns_the_failed_run(client, session, monkeypatch):
+    def broken_replay(session, run):
+        raise ValueError("replay broke")
+    monkeypatch.setattr(journey_recompute, "_Replay", broken_replay)
+
+    response = client.post("/api/process/1/recompute", json={"journey_id": 1})
+
+    assert response.status_code == 500
+    run = session.get(JourneyRecompute, response.json["recompute_id"])
+    assert response.json["status"] == run.status == "FAILED"
+    assert run.error == "replay broke"
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from calculators.event_frame import build_event_frame
+from calculators.repeats import detect_repeated_behavior, detect_repeated_behavior_from_frame
+from models import CustomerJourney, Event, JourneyStatusEnum
+
+T0 = datetime(2025, 1, 15)
+URLS = ["/cart", "/orders/*", "/settings"]
+# The chains compare_elements takes as equal one way: the first's key/value pairs are a subset of the others'
+ELEMENTS = ['button:attr__id="buy"', 'button:attr__id="buy"text="Buy"', 'button:attr__id="buy"text="Buy now"',
+            'a:attr__id="next"', "//button[@id='buy']", "//a[@id='next']", ""]
+
+
+def add_journey(session, account_id, person, events):
+    cj = CustomerJourney(account_id=account_id, journey_id=1, session_id=f"s-{person}", person_id=person,
+                         status=JourneyStatusEnum.IN_PROGRESS, current_step_index=1,
+                         start_time=T0, end_time=T0, session_start_time=T0, total_steps=3)
+    session.add(cj)
+    session.flush()
+    for i, (url, element) in enumerate(events):
+        session.add(Event(account_id=account_id, person_id=person, page_title="", element="", event_type="click",
+                          url=url, x_path=element, elements_chain="", customer_journey_id=cj.id,
+                          session_id=f"s-{person}-{i // 6}", timestamp=T0 + timedelta(seconds=i), is_match=False))
+    return cj
+
+
+def random_events(rng):
+    """Runs of one click, some long enough to count, some continued by a chain with more pairs."""
+    events = []
+    for _ in range(rng.randint(0, 5)):
+        url, element = rng.choice(URLS), rng.choice(ELEMENTS)
+        for _ in range(rng.choice([1, 2, 3, 4, 6])):
+            events.append((url, element))
+            if rng.random() < 0.2:
+                events.append((url, rng.choice(ELEMENTS)))
+    return events
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_frame_repeats_match_the_event_scan(session, account, seed):
+    rng = random.Random(seed)
+    journeys = [add_journey(session, account.id, f"p{i}", random_events(rng)) for i in range(60)]
+    session.commit()
+    last_ideal_steps = [rng.choice([0, 1, 3, 8]) for _ in journeys]
+    threshold = rng.choice([1, 2, 3])
+    frame = build_event_frame(session, journeys)
+
+    for scanned in (None, last_ideal_steps):
+        repeated = detect_repeated_behavior_from_frame(frame, range(len(journeys)), scanned, threshold)
+
+        expected = {row: detect_repeated_behavior(session, cj.id, step, threshold)
+                    for row, (cj, step) in enumerate(zip(journeys, scanned or [None] * len(journeys)))}
+        assert repeated == {row: reps for row, reps in expected.items() if reps}
+
+
+def test_runs_broken_by_a_subset_chain_and_runs_at_the_end(session, account):
+    buy, buy_text = ('/cart', 'button:attr__id="buy"'), ('/cart', 'button:attr__id="buy"text="Buy"')
+    subset = add_journey(session, account.id, "p1", [buy, buy_text, buy, buy, ("/settings", "")])
+    tail = add_journey(session, account.id, "p2", [("/settings", ""), buy_text, buy_text, buy_text])
+    session.commit()
+    frame = build_event_frame(session, [subset, tail])
+
+    repeated = detect_repeated_behavior_from_frame(frame, [0, 1], threshold=2)
+
+    # compare_elements takes buy_text as a repeat of buy, so the first run does not end there
+    assert repeated == {0: [('button:attr__id="buy"', "/cart", "s-p1-0", 3)],
+                        1: [('button:attr__id="buy"text="Buy"', "/cart", "s-p2-0", 2)]}
+    assert repeated[0] == detect_repeated_behavior(session, subset.id, threshold=2)
+    assert repeated[1] == detect_repeated_behavior(session, tail.id, threshold=2)
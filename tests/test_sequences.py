@@ -0,0 +1,49 @@
+import random
+from itertools import product
+import pytest
+from calculators.sequences import mine_sequential_patterns
+
+
+def contains(sequence, pattern) -> bool:
+    """Is `pattern` a (not necessarily contiguous) subsequence of `sequence`?"""
+    remaining = iter(sequence)
+    return all(item in remaining for item in pattern)
+
+
+def brute_force_patterns(sequences, min_count, max_len, n_items):
+    """{pattern: count} of every pattern up to max_len contained in at least min_count sequences."""
+    found = {}
+    for length in range(1, max_len + 1):
+        for pattern in product(range(n_items), repeat=length):
+            count = sum(1 for sequence in sequences if contains(sequence, pattern))
+            if count >= min_count:
+                found[pattern] = count
+    return found
+
+
+def random_sequences(seed, n, n_items):
+    rng = random.Random(seed)
+    return [[rng.randrange(n_items) for _ in range(rng.randint(0, 7))] for _ in range(n)]
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("min_count", [10, 40, 120])
+def test_patterns_match_brute_force(seed, min_count):
+    sequences = random_sequences(seed, 300, n_items=6)
+
+    mined = mine_sequential_patterns(sequences, min_count, max_len=3, max_patterns=10 ** 6)
+
+    assert dict(mined) == brute_force_patterns(sequences, min_count, 3, n_items=6)
+    # by length, then most frequent first
+    assert mined == sorted(mined, key=lambda entry: (len(entry[0]), -entry[1], entry[0]))
+
+
+def test_max_patterns_keeps_the_most_frequent_of_each_length():
+    sequences = random_sequences(7, 300, n_items=6)
+    everything = mine_sequential_patterns(sequences, 10, max_len=3, max_patterns=10 ** 6)
+
+    capped = mine_sequential_patterns(sequences, 10, max_len=3, max_patterns=20)
+
+    singles = [entry for entry in everything if len(entry[0]) == 1]
+    pairs = [entry for entry in everything if len(entry[0]) == 2]
+    assert capped == singles + pairs[:20 - len(singles)]
@@ -0,0 +1,45 @@
+from db import db
+from models import Account
+from benchmarks.synthetic_events import Workload, WorkloadConfig, insert_events
+from config import Config
+from repositories import interning
+import services.event_processor_sharded as event_processor_sharded
+from services.event_processor import process_raw_events
+
+WORKLOAD = WorkloadConfig(seed=5, persons=80, days=2, templates=3)
+
+
+def match_workload(workers: int, snapshot) -> dict:
+    """Match the workload one day at a time on a fresh database; the matching_snapshot of the result."""
+    db.drop_all()
+    db.create_all()
+    interning._PROCESS_CACHE.clear()  # ids of the previous database
+    session = db.session
+    session.add(Account(id=1, name="test", api_key="test_api_key"))
+    workload = Workload(WORKLOAD)
+    workload.create_journeys(session, 1)
+    session.commit()
+
+    for day in range(WORKLOAD.days):
+        insert_events(session, 1, workload.iter_day(day))
+        process_raw_events(session, 1, workers=workers)
+    return snapshot(session)
+
+
+def test_sharded_matching_matches_serial_matching(app, monkeypatch, matching_snapshot):
+    sharded_runs = []
+    match_sharded = event_processor_sharded.process_raw_events_sharded
+
+    def recording(*args, **kwargs):
+        sharded_runs.append(match_sharded(*args, **kwargs))
+        return sharded_runs[-1]
+    monkeypatch.setattr(event_processor_sharded, "process_raw_events_sharded", recording)
+    monkeypatch.setattr(Config, "EVENT_MATCHING_SHARD_MIN_EVENTS", 0)
+
+    serial = match_workload(1, matching_snapshot)
+    sharded = match_workload(3, matching_snapshot)
+
+    assert sharded_runs == [True] * WORKLOAD.days
+    assert len(serial["journeys"]) > 50 and len(serial["events"]) > 200
+    for part in serial:
+        assert sharded[part] == serial[part], part
@@ -0,0 +1,80 @@
+import random
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from calculators.event_frame import JourneyEventFrame, StringPool
+from calculators.insights import generate_step_insights_from_frame, generate_step_insights_from_ideal_path
+from models import JourneyStatusEnum
+
+BASE = "https://app.example.com"
+URLS = [f"{BASE}/cart", f"{BASE}/orders/17", f"{BASE}/orders/18?tab=2", f"{BASE}/settings", ""]
+# XPaths compare exactly, elements chains by their key/value pairs, "" only to an element without any
+ELEMENTS = ["//button[@id='buy']", "//a[@id='next']", 'button:text="Buy"attr__id="buy"', 'button:text="Buy"',
+            'a:attr__id="next"', ""]
+
+
+def random_ideal_path(rng):
+    steps = []
+    for index in range(rng.randint(1, 5)):
+        steps.append({"step": index + 1, "name": f"s{index}", "url": rng.choice(URLS[:-1]),
+                      "xPath": rng.choice(ELEMENTS), "element": rng.choice(ELEMENTS), "timestamp": index * 4000})
+    return steps
+
+
+def random_journeys(rng, n):
+    journeys = []
+    for j in range(n):
+        t = rng.randrange(10 ** 6)
+        events = []
+        for _ in range(rng.randint(0, 8)):
+            t += rng.choice([-3000, 0, 500, 4000, 90000])  # some out of order, some slow
+            events.append({"url": rng.choice(URLS), "xPath": rng.choice(ELEMENTS), "timestamp": t,
+                           "is_match": rng.random() < 0.7, "session_id": rng.choice([f"s{j}", f"s{j}b", ""])})
+        journeys.append(events)
+    return journeys
+
+
+def to_frame(journeys):
+    strings = StringPool()
+    events = [e for journey in journeys for e in journey]
+    offsets = np.zeros(len(journeys) + 1, dtype=np.int64)
+    np.cumsum([len(journey) for journey in journeys], out=offsets[1:])
+    rows = [SimpleNamespace(id=i, journey_id=1, status=JourneyStatusEnum.COMPLETED, completion_type=None,
+                            current_step_index=0) for i in range(len(journeys))]
+    return JourneyEventFrame(
+        rows,
+        offsets=offsets,
+        timestamp_ms=np.array([e["timestamp"] for e in events], dtype=np.int64),
+        url_id=strings.intern_many(e["url"] for e in events),
+        xpath_id=strings.intern_many(e["xPath"] for e in events),
+        session_id=strings.intern_many(e["session_id"] for e in events),
+        is_match=np.array([e["is_match"] for e in events], dtype=bool),
+        strings=strings,
+    )
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_frame_insights_match_the_scalar_ones(seed):
+    rng = random.Random(seed)
+    ideal_path = random_ideal_path(rng)
+    journeys = random_journeys(rng, 40)
+    frame = to_frame(journeys)
+    mask = np.array([rng.random() < 0.8 for _ in journeys], dtype=bool)
+
+    expected = generate_step_insights_from_ideal_path(
+        ideal_path, [journey for journey, keep in zip(journeys, mask) if keep], threshold=2, debug=False)
+
+    assert generate_step_insights_from_frame(ideal_path, frame, mask, threshold=2) == expected
+
+
+def test_steps_without_an_xpath_match_events_without_one():
+    ideal_path = [{"step": 1, "name": "a", "url": f"{BASE}/cart", "xPath": "", "element": "", "timestamp": 0},
+                  {"step": 2, "name": "b", "url": f"{BASE}/settings", "xPath": "", "element": "", "timestamp": 1000}]
+    journeys = [[{"url": f"{BASE}/cart", "xPath": "", "timestamp": 0, "is_match": True, "session_id": "s"},
+                 {"url": f"{BASE}/settings", "xPath": "", "timestamp": 5000, "is_match": True, "session_id": "s"}]]
+
+    insights, delayed = generate_step_insights_from_frame(ideal_path, to_frame(journeys), np.ones(1, dtype=bool), 2)
+
+    assert insights["step_2"]["avg_time_ms"] == 5000
+    assert delayed == [("", f"{BASE}/settings", "s", 5000.0)]
+    assert (insights, delayed) == generate_step_insights_from_ideal_path(ideal_path, journeys, 2, debug=False)
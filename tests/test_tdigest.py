@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from calculators.tdigest import TDigest
+
+QUANTILES = (0.01, 0.1, 0.5, 0.9, 0.99)
+RANK_TOLERANCE = 0.005
+
+
+def rank(values: np.ndarray, estimate: float) -> float:
+    """Share of `values` below the estimate (the midpoint of ties)."""
+    return (np.searchsorted(values, estimate, "left") + np.searchsorted(values, estimate, "right")) / 2 / len(values)
+
+
+def assert_close_in_rank(digest: TDigest, values: np.ndarray):
+    values = np.sort(values)
+    for q in QUANTILES:
+        assert abs(rank(values, digest.quantile(q)) - q) <= RANK_TOLERANCE, q
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_quantiles_match_the_sorted_values(seed):
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([rng.lognormal(10, 1, 20_000), rng.uniform(0, 5e5, 5_000)])
+    rng.shuffle(values)
+
+    digest = TDigest()
+    for chunk in np.array_split(values, 37):
+        digest.add_many(chunk)
+
+    assert digest.count == len(values)
+    assert len(digest.to_dict()["means"]) <= 2 * digest.compression
+    assert digest.quantile(0.0) == values.min() and digest.quantile(1.0) == values.max()
+    assert_close_in_rank(digest, values)
+
+
+def test_small_inputs_are_exact():
+    values = [5.0, 1.0, 3.0]
+    digest = TDigest()
+    digest.add_many(values)
+
+    assert digest.quantile(0.5) == np.quantile(values, 0.5)
+    assert TDigest().quantile(0.5) is None
+    assert TDigest().percentiles() == {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+
+
+def test_merged_and_serialized_digests_match_one_digest_of_everything():
+    rng = np.random.default_rng(11)
+    parts = [rng.exponential(60_000, n) for n in (3_000, 10, 7_000, 500)]
+
+    merged = TDigest()
+    for part in parts:
+        digest = TDigest()
+        digest.add_many(part)
+        merged.merge(TDigest.from_dict(digest.to_dict()))
+
+    everything = np.concatenate(parts)
+    assert merged.count == len(everything)
+    assert_close_in_rank(merged, everything)
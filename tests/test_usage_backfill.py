@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+import pytest
+from benchmarks.synthetic_events import Workload, WorkloadConfig, insert_events
+from models import EventsUsageBucket, PageUsageBucket, RawEvent
+from repositories.usage_rollups import HOURLY_RETENTION, query_page_usage_window, window_start
+from repositories.watermarks import get_watermark, advance_watermark
+from services.event_usage import process_event_usage
+from services.page_usage import process_page_usage
+from services.raw_event_archive import archive_account, archived_days
+from services.usage_backfill import backfill_usage_buckets
+
+TODAY = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+# Recent enough to keep the hourly buckets; no late arrivals, which the usage stages take in
+# arrival order and the backfill in event time
+WORKLOAD = WorkloadConfig(seed=2, persons=30, days=3, templates=2, start=TODAY - timedelta(days=3), late_share=0.0)
+
+
+def buckets(session):
+    """{(granularity, bucket start, pathname): (time, visits)} and {(..., event type, xpath): events}."""
+    pages = {(b.granularity, b.bucket_start, b.pathname): (round(b.total_time, 6), b.total_visits)
+             for b in session.query(PageUsageBucket)}
+    events = {(b.granularity, b.bucket_start, b.pathname, b.event_type, b.x_path): b.total_events
+              for b in session.query(EventsUsageBucket)}
+    return pages, events
+
+
+@pytest.fixture
+def processed(session, account):
+    """The workload through the page and event usage stages a day of arrivals at a time; their buckets."""
+    events = sorted(Workload(WORKLOAD).iter_events(), key=lambda event: event["ingested_at"])
+    for _, day in groupby(events, key=lambda event: event["ingested_at"].date()):
+        insert_events(session, account.id, list(day))
+        process_page_usage(session, account.id)
+        process_event_usage(session, account.id)
+        session.commit()
+    return buckets(session)
+
+
+def test_backfill_matches_the_usage_stages(session, account, processed):
+    pages, events = processed
+    assert len(pages) > 50 and len(events) > 50
+    # the matching stages are not under test; let the archive take the older days
+    page_time = get_watermark(session, account.id, "page_time")
+    for stage in ("ideal_path", "form_usage"):
+        advance_watermark(session, account.id, stage, page_time.last_ingested_at, page_time.last_event_id)
+    session.commit()
+    assert archive_account(session, account.id, older_than_days=2) > 0
+    assert archived_days(account.id) and session.query(RawEvent).count() > 0
+
+    stats = backfill_usage_buckets(session, account.id)
+    session.commit()
+
+    assert stats["page_events"] == stats["usage_events"] > 0
+    assert buckets(session) == (pages, events)
+
+    backfill_usage_buckets(session, account.id)  # rebuilt, not added on top
+    session.commit()
+    assert buckets(session) == (pages, events)
+
+
+def test_backfill_leaves_unprocessed_events_to_the_stages(session, account, processed):
+    later = [dict(event, id=f"later-{i}", ingested_at=datetime.utcnow() - timedelta(minutes=5))
+             for i, event in enumerate(Workload(WORKLOAD).iter_day(0))]
+    insert_events(session, account.id, later[:40])
+
+    backfill_usage_buckets(session, account.id)
+    session.commit()
+    assert buckets(session) == processed
+
+    process_event_usage(session, account.id)
+    session.commit()
+    assert sum(buckets(session)[1].values()) > sum(processed[1].values())
+
+
+def test_old_hourly_buckets_are_pruned(session, account):
+    old, recent = datetime.utcnow() - HOURLY_RETENTION - timedelta(days=2), datetime.utcnow() - timedelta(hours=3)
+    for i, ts in enumerate([old, old + timedelta(seconds=20), recent, recent + timedelta(seconds=20)]):
+        session.add(RawEvent(id=f"e{i}", account_id=account.id, distinct_id="u", session_id="s", pathname="/cart",
+                             event_type="click", elements_chain='button:text="Buy"', timestamp=ts,
+                             ingested_at=ts + timedelta(seconds=1)))
+    session.commit()
+    for stage in ("page_time", "event_usage"):
+        advance_watermark(session, account.id, stage, recent + timedelta(seconds=21), "e3")
+    session.commit()
+
+    backfill_usage_buckets(session, account.id)
+    session.commit()
+
+    for model in (PageUsageBucket, EventsUsageBucket):
+        kept = {(b.granularity, b.bucket_start) for b in session.query(model)}
+        assert kept == {("day", old.replace(hour=0, minute=0, second=0, microsecond=0)),
+                        ("day", recent.replace(hour=0, minute=0, second=0, microsecond=0)),
+                        ("hour", recent.replace(minute=0, second=0, microsecond=0))}
+
+
+def test_windows_read_hourly_buckets_up_to_two_days(session, account, processed):
+    now = datetime(2025, 1, 15, 13, 45)
+    assert window_start(1, now) == ("hour", datetime(2025, 1, 14, 13))
+    assert window_start(2, now) == ("hour", datetime(2025, 1, 13, 13))
+    assert window_start(3, now) == ("day", datetime(2025, 1, 12))
+
+    pages, _ = processed
+    for days in (2, 7):
+        granularity, since = window_start(days)
+        expected = {}
+        for (bucket_granularity, start, pathname), (_, visits) in pages.items():
+            if bucket_granularity == granularity and start >= since:
+                expected[pathname] = expected.get(pathname, 0) + visits
+        assert expected
+        rows = query_page_usage_window(session, account.id, days, limit=100)
+        assert {row.pathname: row.visits for row in rows} == expected
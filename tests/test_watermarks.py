@@ -0,0 +1,93 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from models import RawEvent
+from repositories.watermarks import SETTLE_DELAY, advance_watermark, get_watermark, pending_events, reset_watermark
+
+T0 = datetime(2025, 1, 15)
+NOW = T0 + timedelta(hours=1)
+
+
+def add_event(session, account_id, event_id, ingested_at):
+    session.add(RawEvent(id=event_id, account_id=account_id, distinct_id="u", ingested_at=ingested_at))
+
+
+def pending_ids(session, account_id, stage, now=NOW):
+    return [event_id for _, event_id in
+            pending_events(session, account_id, stage, RawEvent.ingested_at, RawEvent.id, now=now)]
+
+
+def run_stage(session, account_id, stage, now=NOW):
+    """What a stage does: take its pending events and advance past the last one."""
+    rows = pending_events(session, account_id, stage, RawEvent.ingested_at, RawEvent.id, now=now).all()
+    if rows:
+        advance_watermark(session, account_id, stage, *rows[-1])
+    session.commit()
+    return [event_id for _, event_id in rows]
+
+
+def test_pending_events_follow_the_watermark(session, account):
+    for event_id, minute in [("b", 1), ("a", 1), ("c", 2), ("d", 3)]:
+        add_event(session, account.id, event_id, T0 + timedelta(minutes=minute))
+    session.commit()
+
+    assert pending_ids(session, account.id, "page_time") == ["a", "b", "c", "d"]
+
+    advance_watermark(session, account.id, "page_time", T0 + timedelta(minutes=1), "a")
+    session.commit()
+    # "b" shares its ingestedAt with the watermark but sorts after it
+    assert pending_ids(session, account.id, "page_time") == ["b", "c", "d"]
+    assert pending_ids(session, account.id, "event_usage") == ["a", "b", "c", "d"]
+
+
+def test_unsettled_events_wait_for_the_next_run(session, account):
+    add_event(session, account.id, "settled", NOW - SETTLE_DELAY)
+    add_event(session, account.id, "fresh", NOW - SETTLE_DELAY + timedelta(seconds=1))
+    session.commit()
+
+    assert run_stage(session, account.id, "ideal_path") == ["settled"]
+    assert run_stage(session, account.id, "ideal_path", now=NOW + timedelta(seconds=1)) == ["fresh"]
+
+
+def test_watermark_never_moves_back(session, account):
+    advance_watermark(session, account.id, "form_usage", T0 + timedelta(minutes=5), "m")
+    advance_watermark(session, account.id, "form_usage", T0 + timedelta(minutes=4), "z")
+    advance_watermark(session, account.id, "form_usage", T0 + timedelta(minutes=5), "a")
+    session.commit()
+
+    watermark = get_watermark(session, account.id, "form_usage")
+    assert (watermark.last_ingested_at, watermark.last_event_id) == (T0 + timedelta(minutes=5), "m")
+
+    with pytest.raises(ValueError):
+        advance_watermark(session, account.id, "no_such_stage", T0, "a")
+
+
+def test_every_event_is_processed_exactly_once(session, account):
+    rng = random.Random(3)
+    processed, ingested = [], []
+    clock = T0
+    for batch in range(30):
+        # arrivals are stamped with the time they come in; many share a timestamp, ids in no particular order
+        for _ in range(rng.randint(0, 8)):
+            clock += timedelta(seconds=rng.choice([0, 0, 1, 20]))
+            event_id = f"e{rng.randrange(10 ** 6):06d}-{batch}"
+            add_event(session, account.id, event_id, clock)
+            ingested.append(event_id)
+        session.commit()
+        processed += run_stage(session, account.id, "ideal_path", now=clock)
+    processed += run_stage(session, account.id, "ideal_path", now=clock + SETTLE_DELAY)
+
+    assert sorted(processed) == sorted(ingested)
+    assert len(processed) == len(set(processed))
+
+
+def test_reset_makes_the_stage_start_over(session, account):
+    for i in range(3):
+        add_event(session, account.id, f"e{i}", T0 + timedelta(minutes=i))
+    session.commit()
+    run_stage(session, account.id, "event_usage")
+
+    assert reset_watermark(session, account.id, "event_usage") == 3
+    session.commit()
+    assert pending_ids(session, account.id, "event_usage") == ["e0", "e1", "e2"]
+    assert reset_watermark(session, account.id, "event_usage") == 0
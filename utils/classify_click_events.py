@@ -1,41 +1,42 @@
-import os
 import json
-import requests
-from dotenv import load_dotenv
+from services.llm_client import get_llm_client
 
-load_dotenv()
+CLASSIFIER_MODEL = "llama-3.1-8b-instant"
+BUTTON_LABELS = ["navigation", "submit", "cancel", "create", "edit", "delete", "search", "filter", "toggle", "other"]
 
-GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+BATCH_SYSTEM_PROMPT = (
+    "You classify UI elements that users clicked in a web app. "
+    f"For each element pick exactly one label from: {', '.join(BUTTON_LABELS)}. "
+    'Answer with a JSON object {"labels": [...]} holding one label per element, in input order.'
+)
 
 
-def classify_button(data):
-    """Classify button click events using GROQ API"""
+def classify_buttons_batch(payloads, client=None):
+    """
+    Classify many elements in one LLM request.
+    `payloads` are parse_element_chain.payload_for_classifier() dicts; returns one label per payload
+    ('unknown' where the model's answer is missing or not a known label).
+    """
+    if not payloads:
+        return []
 
-    if not GROQ_API_KEY:
-        raise Exception("GROQ_API_KEY not found in environment variables")
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # Your classification logic here
-    # This is a placeholder - implement your actual classification logic
+    client = client or get_llm_client()
+    elements = [{"index": i, **payload} for i, payload in enumerate(payloads)]
 
     try:
-        # Make API call to GROQ
-        # Replace with your actual API endpoint and payload
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",  # Replace with actual endpoint
-            headers=headers,
-            json=data
+        content = client.chat(
+            [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(elements)},
+            ],
+            model=CLASSIFIER_MODEL,
+            temperature=0,
+            max_tokens=20 * len(payloads) + 50,
+            response_format={"type": "json_object"},
         )
-
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('label', 'unknown')
-        else:
-            raise Exception(f"API request failed: {response.status_code}")
-
+        labels = json.loads(content).get("labels", [])
     except Exception as e:
-        raise Exception(f"Classification failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Classification failed: {str(e)}")
+
+    labels = [label if label in BUTTON_LABELS else "unknown" for label in labels[:len(payloads)]]
+    return labels + ["unknown"] * (len(payloads) - len(labels))
@@ -0,0 +1,92 @@
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class TrieNode:
+    """One step of a path trie: what was clicked, and how often / how fast it was reached."""
+    __slots__ = ("key", "id", "url", "xpath", "elements_chain", "page_title", "ideal",
+                 "count", "time_sum", "time_count", "anomaly_count", "children")
+
+    def __init__(self, key=None, id=None, url=None, xpath=None, elements_chain=None, page_title=None, ideal=False):
+        self.key = key
+        self.id = id
+        self.url = url
+        self.xpath = xpath
+        self.elements_chain = elements_chain
+        self.page_title = page_title
+        self.ideal = ideal
+        self.count = 0
+        self.time_sum = 0.0
+        self.time_count = 0
+        self.anomaly_count = 0
+        self.children: Dict[int, "TrieNode"] = {}  # interned key id -> child
+
+    def record(self, elapsed: Optional[float] = None, anomaly: bool = False):
+        """One more path through this node, `elapsed` seconds after the previous step (None for a first step)."""
+        self.count += 1
+        if elapsed is not None:
+            self.time_sum += elapsed
+            self.time_count += 1
+        if anomaly:
+            self.anomaly_count += 1
+
+    @property
+    def avg_time(self) -> float:
+        return self.time_sum / self.time_count if self.time_count else 0
+
+
+class PathTrie:
+    """
+    Prefix tree of click paths. Children are indexed by an interned id of their key (by default
+    (url, xpath); any hashable works, e.g. the elements chain for funnel trees), so building a
+    trie is O(number of steps) and each node only holds small ints to reach its children.
+    """
+
+    def __init__(self, **root_attrs):
+        self.root = TrieNode(**root_attrs)
+        self.size = 1
+        self._key_ids: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+
+    def key_id(self, key: Hashable) -> int:
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = len(self._keys)
+            self._keys.append(key)
+        return key_id
+
+    def find(self, parent: TrieNode, key: Hashable) -> Optional[TrieNode]:
+        key_id = self._key_ids.get(key)
+        return None if key_id is None else parent.children.get(key_id)
+
+    def add(self, parent: TrieNode, key: Hashable, **attrs) -> TrieNode:
+        """The parent's child for `key`, created with `attrs` if missing."""
+        key_id = self.key_id(key)
+        child = parent.children.get(key_id)
+        if child is None:
+            child = parent.children[key_id] = TrieNode(self._keys[key_id], **attrs)
+            self.size += 1
+        return child
+
+    def merge(self, other: "PathTrie"):
+        """Add the paths and aggregates of `other` into this trie."""
+        stack = [(self.root, other.root)]
+        while stack:
+            node, other_node = stack.pop()
+            node.count += other_node.count
+            node.time_sum += other_node.time_sum
+            node.time_count += other_node.time_count
+            node.anomaly_count += other_node.anomaly_count
+            node.ideal = node.ideal or other_node.ideal
+            for other_child in other_node.children.values():
+                child = self.add(node, other_child.key, id=other_child.id, url=other_child.url,
+                                 xpath=other_child.xpath, elements_chain=other_child.elements_chain,
+                                 page_title=other_child.page_title, ideal=other_child.ideal)
+                stack.append((child, other_child))
+
+    def walk(self) -> Iterator[Tuple[int, Optional[TrieNode], TrieNode]]:
+        """(depth, parent, node) of every node, parents before their children, in insertion order."""
+        stack = [(0, None, self.root)]
+        while stack:
+            depth, parent, node = stack.pop()
+            yield depth, parent, node
+            stack.extend((depth + 1, node, child) for child in reversed(list(node.children.values())))
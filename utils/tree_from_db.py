@@ -1,55 +1,34 @@
-from collections import defaultdict
+from utils.path_trie import PathTrie
 
 
 def build_tree(customer_journeys, ideal_steps):
-    tree = {
-        "url": "Start",
-        "xpath": None,
-        "count": 1,
-        "ideal": False,
-        "children": []
-    }
-
-    url_map = {"Start": tree}  # Keeps track of nodes for nesting
+    trie = PathTrie(url="Start")
+    trie.root.count = 1
+    ideal_xpaths = {url: {step["xpath"] for step in steps} for url, steps in ideal_steps.items()}
 
     for journey_id, pages in customer_journeys.items():
-        parent_node = tree  # Start from root
-
         for url, interactions in pages.items():
-            # Check if this URL is already in the tree
-            if url not in url_map:
-                new_node = {
-                    "url": url,
-                    "xpath": None,
-                    "count": 0,
-                    "ideal": False,
-                    "children": []
-                }
-                parent_node["children"].append(new_node)
-                url_map[url] = new_node
-
-            page_node = url_map[url]
-            page_node["count"] += 1  # Increment visit count
+            # One node per URL, under the root
+            page_node = trie.add(trie.root, (url, None), url=url)
+            page_node.record()  # Increment visit count
 
             for interaction in interactions:
                 xpath = interaction["xpath"]
+                action_node = trie.add(page_node, (url, xpath), url=url, xpath=xpath,
+                                       ideal=xpath in ideal_xpaths.get(url, ()))
+                action_node.record()
 
-                # Check if this action already exists
-                existing_action = next((child for child in page_node["children"] if child["xpath"] == xpath), None)
+    return tree_to_dict(trie.root)
 
-                if existing_action:
-                    existing_action["count"] += 1
-                else:
-                    new_action = {
-                        "url": url,
-                        "xpath": xpath,
-                        "count": 1,
-                        "ideal": xpath in [step["xpath"] for step in ideal_steps.get(url, [])],
-                        "children": []
-                    }
-                    page_node["children"].append(new_action)
 
-    return tree
+def tree_to_dict(node):
+    return {
+        "url": node.url,
+        "xpath": node.xpath,
+        "count": node.count,
+        "ideal": node.ideal,
+        "children": [tree_to_dict(child) for child in node.children.values()]
+    }
 
 
 # Mock data
@@ -91,10 +70,11 @@ mock_db_data = {
     }
 }
 
-# Build tree
-tree_structure = build_tree(mock_db_data["customer_journeys"], mock_db_data["ideal_steps"])
+if __name__ == "__main__":
+    import json
 
-# Print tree
-import json
+    # Build tree
+    tree_structure = build_tree(mock_db_data["customer_journeys"], mock_db_data["ideal_steps"])
 
-print(json.dumps(tree_structure, indent=2))
+    # Print tree
+    print(json.dumps(tree_structure, indent=2))